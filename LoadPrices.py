@@ -84,10 +84,27 @@ def get_yahoo_indices(*args):
         API.show_box(str(e), "Web error")
 
 
+def get_yahoo_all(*args):
+    get = Yahoo(API)
+    try:
+        get.get_many([
+            {'mode': 'stock', 'sheet': 'Sheet1', 'keyrange': 'A1:A200',
+             'datacols': ['B', 'C']},
+            {'mode': 'fx', 'sheet': 'Sheet1', 'keyrange': 'E1:G200',
+             'datacols': ['F']},
+            {'mode': 'index', 'sheet': 'Sheet1', 'keyrange': 'H1:H200',
+             'datacols': ['I', 'J']},
+        ])
+        API.show_box("Processing finished", "Status")
+    except Warning as e:
+        API.show_box(str(e), "Web error")
+
+
 g_exportedScripts = (
     get_yahoo_stocks,
     get_yahoo_fx,
     get_yahoo_indices,
+    get_yahoo_all,
 )
 
 ###########################################################################
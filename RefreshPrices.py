@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+###########################################################################
+# Refresh Yahoo prices in .ods/.xlsx workbooks from the command line, eg.,
+# from cron, without LibreOffice:
+#
+#   python3 RefreshPrices.py -m stock -k A1:A200 -d B,C book1.ods book2.xlsx
+#
+# see `python3 RefreshPrices.py --help`
+###########################################################################
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'pythonpath'))
+
+from sites.refresh import main
+
+if __name__ == '__main__':
+    sys.exit(main())
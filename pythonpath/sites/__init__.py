@@ -1 +1,3 @@
 from sites.yahoo import Yahoo
+from sites.quotecache import QuoteCache
+from sites.negcache import NegativeCache
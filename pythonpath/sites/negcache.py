@@ -0,0 +1,148 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: sites.negcache")
+
+import os
+import json
+import time
+import tempfile
+import threading
+
+from util.fileio import atomic_replace
+
+
+class NegativeCache(object):
+    """
+    Thread-safe cache of tickers Yahoo does not price: unknown symbols,
+    which are missing from the result, and symbols such as AAT.L that
+    come back without a regularMarketPrice. Such tickers are left out of
+    query URLs until they expire, ttl seconds after they were added, so
+    words that merely look like tickers stop costing requests.
+
+    Entries are kept in memory and, if path is given, persisted there as
+    JSON of ticker to expiry time, loaded on first use and written by
+    save().
+
+    Constructor
+      NegativeCache(path=None, ttl=TTL, clock=time.time)
+
+    Operators
+      len(NegativeCache)  returns number of entries, including expired.
+      ticker in NegativeCache
+                          returns True if ticker is cached and unexpired.
+
+    Methods
+      partition(tickers)  returns (list of cached tickers, list of the
+                          others), counting the cached ones as skipped.
+      add(tickers)        caches tickers for ttl seconds.
+      discard(ticker)     drops ticker, eg., once it has been priced.
+      save()              writes unexpired entries to path, if changed.
+      clear()             drops all entries.
+      stats()             returns dict of counters: skipped, requests
+                          (query URLs saved, as noted by the caller).
+      saved_requests(n)   adds n to the requests saved.
+    """
+
+    TTL = 7 * 86400
+
+    def __init__(self, path=None, ttl=TTL, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = None  # ticker => expiry, loaded on first use
+        self.dirty = False
+        self.skipped = 0
+        self.requests = 0
+
+    def partition(self, tickers):
+        now = self.clock()
+        cached, others = [], []
+        with self.lock:
+            entries = self._entries()
+            for ticker in tickers:
+                if entries.get(ticker, 0) > now:
+                    cached.append(ticker)
+                else:
+                    others.append(ticker)
+            self.skipped += len(cached)
+        if cached:
+            Logger.debug('negative cache: skip %s' % ','.join(cached))
+        return cached, others
+
+    def add(self, tickers):
+        expiry = self.clock() + self.ttl
+        with self.lock:
+            entries = self._entries()
+            for ticker in tickers:
+                entries[ticker] = expiry
+                self.dirty = True
+
+    def discard(self, ticker):
+        with self.lock:
+            if self._entries().pop(ticker, None) is not None:
+                self.dirty = True
+
+    def save(self):
+        if self.path is None:
+            return
+        now = self.clock()
+        with self.lock:
+            if not self.dirty:
+                return
+            data = dict((t, e) for (t, e) in self._entries().items()
+                        if e > now)
+            self.dirty = False
+        folder = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        fd, tmp = tempfile.mkstemp(dir=folder)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, sort_keys=True)
+            atomic_replace(tmp, self.path)
+        except:
+            os.remove(tmp)
+            raise
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            self.dirty = True
+
+    def stats(self):
+        with self.lock:
+            return {'skipped': self.skipped, 'requests': self.requests}
+
+    def saved_requests(self, n):
+        with self.lock:
+            self.requests += n
+
+    def __contains__(self, ticker):
+        with self.lock:
+            return self._entries().get(ticker, 0) > self.clock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self._entries())
+
+    def _entries(self):
+        if self.entries is None:
+            self.entries = self._load()
+        return self.entries
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return dict((str(t), float(e)) for (t, e) in data.items())
+        except (IOError, OSError, ValueError, AttributeError) as e:
+            Logger.warning('negative cache: ignoring %s: %s'
+                           % (self.path, str(e)))
+            return {}
+
+
+# process-wide cache shared across macro invocations, in memory only
+NEGATIVE = NegativeCache()
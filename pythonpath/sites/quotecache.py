@@ -0,0 +1,127 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: sites.quotecache")
+
+import time
+import calendar
+import threading
+from collections import OrderedDict
+
+
+class QuoteCache(object):
+    """
+    Thread-safe LRU cache of quote fields by ticker, shared by all Yahoo
+    instances through the module level CACHE so that repeated macro calls
+    reuse recently fetched quotes.
+
+    Each entry is a dict of quote field to value. An entry expires ttl
+    seconds after it was stored while its market is open or about to open.
+    A quote whose marketState is closed after the session ('CLOSED',
+    'POSTPOST') cannot change before the next session, so it is kept until
+    the next weekday midnight in the exchange's time zone, given by
+    gmtOffSetMilliseconds. Pre-open states ('PREPRE', 'PRE') come before
+    that day's session, so they only get the ttl.
+
+    Constructor
+      QuoteCache(ttl=TTL, maxsize=MAX_SIZE, clock=time.time)
+
+    Operators
+      len(QuoteCache)  returns number of entries, including stale ones.
+
+    Methods
+      get(ticker, names, stale=False)
+                            returns list of values for names, or None if
+                            ticker is missing, lacks a name or is stale
+                            and stale is False.
+      put(ticker, quote)    stores dict of field to value for ticker.
+      lookup(tickers, names, stale=False)
+                            returns (dict of ticker to values, list of
+                            tickers to fetch).
+      store(names, data)    stores each ticker's list of values in a
+                            dict of ticker to values ordered as names.
+      clear()               drops all entries.
+    """
+
+    TTL = 60
+    MAX_SIZE = 10000
+
+    # extra quote fields needed to decide expiry
+    FIELDS = ['marketState', 'gmtOffSetMilliseconds']
+
+    CLOSED_STATES = ['POSTPOST', 'CLOSED']
+
+    def __init__(self, ttl=TTL, maxsize=MAX_SIZE, clock=time.time):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # ticker => (expiry, quote)
+
+    def get(self, ticker, names, stale=False):
+        now = self.clock()
+        with self.lock:
+            try:
+                expiry, quote = self.entries[ticker]
+            except KeyError:
+                return None
+            if expiry <= now and not stale:
+                return None
+            self.entries.pop(ticker)
+            self.entries[ticker] = (expiry, quote)  # most recently used
+        try:
+            return [quote[name] for name in names]
+        except KeyError:
+            return None
+
+    def put(self, ticker, quote):
+        expiry = self._expiry(quote, self.clock())
+        with self.lock:
+            self.entries.pop(ticker, None)
+            self.entries[ticker] = (expiry, dict(quote))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def lookup(self, tickers, names, stale=False):
+        hits, misses = {}, []
+        for ticker in tickers:
+            values = self.get(ticker, names, stale)
+            if values is None:
+                misses.append(ticker)
+            else:
+                hits[ticker] = values
+        Logger.debug('quote cache: %d hits, %d misses'
+                     % (len(hits), len(misses)))
+        return hits, misses
+
+    def store(self, names, data):
+        for ticker, values in data.items():
+            self.put(ticker, dict(zip(names, values)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _expiry(self, quote, now):
+        if quote.get('marketState') not in self.CLOSED_STATES:
+            return now + self.ttl
+        return max(now + self.ttl, self._next_session(quote, now))
+
+    def _next_session(self, quote, now):
+        try:
+            offset = int(quote.get('gmtOffSetMilliseconds')) / 1000.0
+        except (TypeError, ValueError):
+            offset = 0
+        # midnight after now in exchange local time, skipping the weekend
+        local = time.gmtime(now + offset)
+        midnight = calendar.timegm(local[:3] + (0, 0, 0)) + 86400
+        weekday = (local.tm_wday + 1) % 7
+        if weekday >= 5:
+            midnight += 86400 * (7 - weekday)
+        return midnight - offset
+
+
+# process-wide cache shared across macro invocations
+CACHE = QuoteCache()
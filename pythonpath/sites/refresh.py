@@ -0,0 +1,212 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: sites.refresh")
+
+###########################################################################
+# Command-line batch refresh of Yahoo prices in workbook files, without
+# an office suite; run as RefreshPrices.py.
+###########################################################################
+
+import os
+import sys
+import time
+import argparse
+
+from sites.yahoo import Yahoo
+from sites.negcache import NegativeCache
+from web.cassette import Cassette
+from spreadsheet import CellRange
+from spreadsheet.api.factory import spreadsheet_api
+
+# spreadsheet_api backend by file extension
+BACKENDS = {
+    '.ods': 'odsfile',
+    '.xlsx': 'xlsx',
+}
+
+# persisted across runs, unlike the in-memory cache of the macros
+NEGATIVE_CACHE = os.path.join('~', '.cache', 'tickers', 'negative.json')
+
+
+def open_workbook(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in BACKENDS:
+        raise AttributeError("unsupported workbook type '%s'" % path)
+    return spreadsheet_api(BACKENDS[ext], path=path)
+
+
+def refresh(paths, mode, sheet, keyrange, datacols, fields=None, yahoo=None):
+    """
+    Refresh datacols in each workbook from its tickers in keyrange, with
+    a single fetch of the tickers of all workbooks, each one once.
+
+    Returns list of (phase, seconds, detail) for the phases 'read',
+    'fetch' and 'write'.
+
+    Raises
+      AttributeError  for an unsupported workbook or unknown mode.
+      Warning         if any web fetch fails; the datacols of every
+                      workbook are then cleared and saved.
+    """
+    yahoo = Yahoo() if yahoo is None else yahoo
+    timings = []
+
+    start = time.time()
+    jobs = [yahoo.prepare(mode, sheet, keyrange, datacols, fields,
+                          doc=open_workbook(path))
+            for path in paths]
+    tickers = set()
+    for job in jobs:
+        tickers.update(job.keyticker.tickers())
+    timings.append(('read', time.time() - start,
+                    '%d workbooks, %d tickers' % (len(jobs), len(tickers))))
+
+    start = time.time()
+    before = _negative_stats(yahoo)
+    try:
+        pricedicts = yahoo.fetch(jobs)
+    except Warning:
+        for job in jobs:
+            yahoo.populate(job, None)
+        raise
+    detail = '%d quotes' % len(tickers)
+    after = _negative_stats(yahoo)
+    if after is not None:
+        detail += ', %d skipped (%d requests saved)' % (
+            after['skipped'] - before['skipped'],
+            after['requests'] - before['requests'])
+    timings.append(('fetch', time.time() - start, detail))
+
+    start = time.time()
+    for job, pricedict in zip(jobs, pricedicts):
+        yahoo.populate(job, pricedict)
+    timings.append(('write', time.time() - start,
+                    '%d workbooks' % len(jobs)))
+    return timings
+
+
+def _negative_stats(yahoo):
+    negative = getattr(yahoo, 'negative', None)
+    return None if negative is None else negative.stats()
+
+
+def _sheet(text):
+    if not text:
+        raise argparse.ArgumentTypeError('sheet name is empty')
+    return text
+
+
+def _keyrange(text):
+    try:
+        CellRange(text)
+    except TypeError as e:
+        raise argparse.ArgumentTypeError("bad range '%s': %s" % (text, e))
+    return text
+
+
+def _datacols(text):
+    columns = text.split(',')
+    for column in columns:
+        if not column.isalpha():
+            raise argparse.ArgumentTypeError("bad column '%s'" % column)
+    return columns
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='RefreshPrices.py',
+        description='Refresh Yahoo prices in .ods and .xlsx workbooks.')
+    parser.add_argument('workbooks', nargs='+', metavar='WORKBOOK',
+                        help='.ods or .xlsx file, updated in place')
+    parser.add_argument('-m', '--mode', default='stock',
+                        choices=['stock', 'fx', 'index'],
+                        help='type of ticker (default: %(default)s)')
+    parser.add_argument('-s', '--sheet', default='Sheet1', type=_sheet,
+                        help='sheet name (default: %(default)s)')
+    parser.add_argument('-k', '--keyrange', default='A1:A200', type=_keyrange,
+                        help='ticker column range (default: %(default)s)')
+    parser.add_argument('-d', '--datacols', default='B,C', type=_datacols,
+                        help='comma separated data columns '
+                             '(default: %(default)s)')
+    parser.add_argument('-f', '--fields', default=None,
+                        help='comma separated Yahoo quote fields, one per '
+                             'data column (default: price,currency)')
+    parser.add_argument('-w', '--workers', type=int,
+                        default=Yahoo.MAX_WORKERS,
+                        help='concurrent queries (default: %(default)s)')
+    parser.add_argument('-b', '--batchsize', type=int,
+                        default=Yahoo.BATCH_SIZE,
+                        help='tickers per query (default: %(default)s)')
+    parser.add_argument('-e', '--engine', default='threads',
+                        choices=Yahoo.ENGINES,
+                        help='concurrent fetch engine (default: %(default)s)')
+    parser.add_argument('--negative-cache', default=NEGATIVE_CACHE,
+                        metavar='FILE',
+                        help='file of tickers Yahoo does not price, skipped '
+                             'until they expire (default: %(default)s)')
+    parser.add_argument('--negative-ttl', type=float,
+                        default=NegativeCache.TTL / 86400.0, metavar='DAYS',
+                        help='days a ticker stays in the negative cache '
+                             '(default: %(default)s)')
+    parser.add_argument('--no-negative-cache', dest='negative_cache',
+                        action='store_const', const=None,
+                        help='request every ticker')
+    tape = parser.add_mutually_exclusive_group()
+    tape.add_argument('--record', metavar='CASSETTE',
+                      help='save the web exchanges to CASSETTE')
+    tape.add_argument('--replay', metavar='CASSETTE',
+                      help='serve the web exchanges from CASSETTE, offline; '
+                           'the negative cache is not read or saved')
+    parser.add_argument('--replay-latency', type=float, default=0,
+                        metavar='FACTOR',
+                        help='simulate FACTOR times the recorded fetch '
+                             'times when replaying (default: %(default)s)')
+    parser.add_argument('--url-base', default=None, metavar='URL',
+                        help='query URL up to the query string, eg., a '
+                             'local test server (default: Yahoo)')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='log debugging output to stderr')
+    return parser.parse_args(argv)
+
+
+def main(argv=None, out=sys.stdout):
+    args = parse_args(argv)
+    if args.verbose:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)5s %(message)s'))
+        Logger.addHandler(handler)
+        Logger.setLevel(logging.DEBUG)
+
+    fields = args.fields.split(',') if args.fields else None
+    negative = None
+    if args.replay is not None:
+        negative = NegativeCache(ttl=args.negative_ttl * 86400)
+    elif args.negative_cache is not None:
+        negative = NegativeCache(os.path.expanduser(args.negative_cache),
+                                 ttl=args.negative_ttl * 86400)
+    cassette = None
+    try:
+        if args.record is not None:
+            cassette = Cassette(args.record, Cassette.RECORD)
+        elif args.replay is not None:
+            cassette = Cassette(args.replay, latency=args.replay_latency)
+        yahoo = Yahoo(batchsize=args.batchsize, workers=args.workers,
+                      negative=negative, engine=args.engine,
+                      cassette=cassette, url_base=args.url_base)
+        timings = refresh(args.workbooks, args.mode, args.sheet,
+                          args.keyrange, args.datacols, fields, yahoo)
+    except (AttributeError, KeyError, IOError) as e:
+        out.write('error: %s\n' % str(e))
+        return 2
+    except Warning as e:
+        out.write('web error: %s\n' % str(e))
+        return 1
+    finally:
+        if cassette is not None and cassette.recording():
+            cassette.save()
+
+    for phase, seconds, detail in timings:
+        out.write('%-6s %8.3fs  %s\n' % (phase, seconds, detail))
+    out.write('%-6s %8.3fs\n' % ('total', sum(t[1] for t in timings)))
+    return 0
@@ -3,28 +3,125 @@ Logger = logging.getLogger('LoadPrices')
 Logger.debug("Load: sites.yahoo")
 
 import re
+import copy
+import json
+from collections import OrderedDict
 from spreadsheet import DataSheet, DataFrame
 from web import HttpAgent
+from web.singleflight import SingleFlight, FlightTimeout
+from sites.quotecache import CACHE
+from sites.negcache import NEGATIVE
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    #Python2 without the futures backport: fetch batches serially
+    ThreadPoolExecutor = None
+
+try:
+    from web.asyncagent import AsyncEngine
+except (ImportError, SyntaxError):
+    #Python2 or Python3 before 3.6: no 'asyncio' engine
+    AsyncEngine = None
+
+# tickers being fetched by any Yahoo, so concurrent refreshes from several
+# macros or workbooks share one request per ticker
+INFLIGHT = SingleFlight()
 
 
 class Yahoo(object):
     """
     Spreadsheet driver for Yahoo queries.
 
+    Constructor
+      Yahoo(doc, batchsize=BATCH_SIZE, workers=MAX_WORKERS, cache=CACHE,
+            negative=NEGATIVE, inflight=INFLIGHT, engine='threads',
+            cassette=None, url_base=None)
+
+      batchsize  maximum number of tickers per query URL.
+      workers    maximum number of queries in flight at once.
+      inflight   SingleFlight coalescing concurrent fetches of the same
+                 tickers and fields from the same engine, cassette and
+                 url_base, by default the process-wide INFLIGHT shared by
+                 all Yahoo instances; None disables it.
+      engine     'threads' to fetch with an HttpAgent per query on a
+                 thread pool, or 'asyncio' to fetch with
+                 web.asyncagent.AsyncEngine in one thread (Python 3.6+).
+      cassette   web.cassette.Cassette the queries are recorded to or
+                 replayed from, for offline runs; None to use the network.
+      url_base   query URL up to the symbols, by default Yahoo's
+                 KeyTickerBase.URL_BASE; eg., a local stand-in for tests.
+      cache      QuoteCache consulted before fetching, by default the
+                 process-wide sites.quotecache.CACHE; None disables it.
+      negative   NegativeCache of tickers Yahoo does not price, by default
+                 the process-wide sites.negcache.NEGATIVE; None disables
+                 it. Cached tickers are not requested and their rows get
+                 the PriceDict defaults.
+
     Methods
-      get(mode, sheet, keyrange, datacols)
+      get(mode, sheet, keyrange, datacols, fields=None)
 
       for mode in one of { 'stock', 'fx', 'index' }, read keyrange columns
-      in sheet, extract Yahoo tickers, assemble URL, fetch query, parse
-      result, populate datacols of spreadsheet.
+      in sheet, extract Yahoo tickers, assemble URLs of at most batchsize
+      tickers, fetch the queries concurrently, parse and merge the results,
+      populate datacols of spreadsheet. Only tickers missing from the
+      cache, or stale in it, are fetched. The datacols are cleared and
+      written inside one doc.batch() transaction.
+
+      fields is a list of Yahoo quote attributes, one per datacol, eg.,
+      ['bid', 'ask', 'regularMarketVolume']; only these are requested from
+      Yahoo. Defaults to PriceDict.NAMES (price and currency).
+
+      get_many(jobs)
+
+      as get() for each job, a dict of get() keyword arguments, eg.,
+      {'mode': 'fx', 'sheet': 'Sheet1', 'keyrange': 'E1:E200',
+       'datacols': ['F']}, or a tuple of them in order. All key columns
+      are read first, the union of their tickers and fields is fetched
+      at once, and all datacols are written in one doc.batch().
+
+      get() runs three phases, also usable separately to refresh several
+      spreadsheets with one fetch:
+
+      prepare(mode, sheet, keyrange, datacols, fields=None, doc=None)
+                   reads the keys and returns a YahooJob, on doc or
+                   self.doc.
+      fetch(jobs)  fetches the union of the tickers and fields of all
+                   jobs; returns one PriceDict per job.
+      populate(job, pricedict)
+                   writes the prices, or clears the datacols if pricedict
+                   is None, in one doc.batch() transaction.
+
+      Requests are paced and guarded per host by web.throttle.LIMITS.
+      While Yahoo's circuit is open, fetches fail at once unless the
+      cache still holds, however stale, a quote for every ticker.
 
     Raises
-      AttributeError  if called with unknown mode.
-      Warning         if web fetch fails.
+      AttributeError  if called with unknown mode or engine.
+      Warning         if any web fetch fails.
     """
 
-    def __init__(self, doc=None):
+    BATCH_SIZE = 100
+    MAX_WORKERS = 4
+
+    ENGINES = ['threads', 'asyncio']
+
+    def __init__(self, doc=None, batchsize=BATCH_SIZE, workers=MAX_WORKERS,
+                 cache=CACHE, negative=NEGATIVE, inflight=INFLIGHT,
+                 engine='threads', cassette=None, url_base=None):
+        if engine not in self.ENGINES:
+            raise AttributeError("unknown engine '%s'" % str(engine))
+        if engine == 'asyncio' and AsyncEngine is None:
+            raise AttributeError("engine 'asyncio' needs Python 3.6+")
+        self.engine = engine
+        self.cassette = cassette
+        self.url_base = url_base
         self.doc = doc
+        self.batchsize = max(1, int(batchsize))
+        self.workers = max(1, int(workers))
+        self.cache = cache
+        self.negative = negative
+        self.inflight = inflight
         self.web = HttpAgent()
 
     def stock(self, *args, **kwargs): self.get('stock', *args, **kwargs)
@@ -33,12 +130,40 @@ class Yahoo(object):
 
     def index(self, *args, **kwargs): self.get('index', *args, **kwargs)
 
-    def get(self, mode, sheet='Sheet1', keyrange='A2:A200', datacols=['B']):
-
-        sht = DataSheet(self.doc, sheet)
+    def get(self, mode, sheet='Sheet1', keyrange='A2:A200', datacols=['B'],
+            fields=None):
+        job = self.prepare(mode, sheet, keyrange, datacols, fields)
+        try:
+            pricedict = self.fetch([job])[0]
+        except Warning:
+            self.populate(job, None)
+            raise
+        self.populate(job, pricedict)
+
+    def get_many(self, jobs):
+        jobs = [self.prepare(**job) if isinstance(job, dict)
+                else self.prepare(*job)
+                for job in jobs]
+        try:
+            pricedicts = self.fetch(jobs)
+        except Warning:
+            with self.doc.batch():
+                for job in jobs:
+                    self.populate(job, None)
+            raise
+        # one spreadsheet transaction for every frame
+        with self.doc.batch():
+            for job, pricedict in zip(jobs, pricedicts):
+                self.populate(job, pricedict)
+
+    def prepare(self, mode, sheet='Sheet1', keyrange='A2:A200', datacols=['B'],
+                fields=None, doc=None):
+        doc = self.doc if doc is None else doc
+        sht = DataSheet(doc, sheet)
 
         Logger.debug('keyrange: ' + str(keyrange))
         Logger.debug('datacols: ' + str(datacols))
+        Logger.debug('fields: ' + str(fields))
 
         keydata = sht.read_column(keyrange, truncate=True)
         Logger.debug('keydata: ' + str(keydata))
@@ -57,31 +182,294 @@ class Yahoo(object):
         dataframe = DataFrame(keydata, keyticker, datacols)
         Logger.debug('dataframe: ' + str(dataframe))
 
-        sht.clear_frame(dataframe)
+        return YahooJob(doc, sht, keyticker, dataframe, fields)
+
+    def fetch(self, jobs):
+        # one fetch of the union of the tickers and fields of all jobs
+        tickers, names = OrderedDict(), OrderedDict()
+        for job in jobs:
+            tickers.update((t, True) for t in job.keyticker.tickers())
+            names.update((n, True) for n in job.fields or PriceDict.NAMES)
+        names = list(names)
+        fetched = self._fetch_prices(list(tickers), names).data()
+
+        pricedicts = []
+        for job in jobs:
+            pricedict = PriceDict('', job.keyticker, job.fields)
+            index = [names.index(n) for n in pricedict.names()]
+            pricedict.update(dict((t, [v[i] for i in index])
+                                  for (t, v) in fetched.items()))
+            Logger.debug('pricedict: ' + str(pricedict))
+            pricedicts.append(pricedict)
+        return pricedicts
+
+    def populate(self, job, pricedict):
+        if pricedict is not None:
+            job.dataframe.update(pricedict)
+            Logger.debug('dataframe: ' + str(job.dataframe))
+
+        # one spreadsheet transaction: recalculate once, not per cell
+        with job.doc.batch():
+            job.sheet.clear_frame(job.dataframe)
+            if pricedict is not None:
+                job.sheet.write_frame(job.dataframe)
+
+    def _fetch_prices(self, tickers, fields=None):
+        """
+        Return a PriceDict for tickers, taken from the cache where fresh
+        and fetched otherwise. Fetched quotes also carry the fields the
+        cache needs for expiry, and are stored in the cache.
+
+        Tickers in the negative cache are left out, so take the defaults.
+        Fetched tickers missing from the results or without a price are
+        added to it, but only from batches whose response parsed: a page
+        that is not a quote response says nothing about its tickers.
+
+        If Yahoo's circuit is open, stale cached quotes are used when the
+        cache still holds every ticker; otherwise the fetch fails at once.
+        """
+        pricedict = PriceDict('', None, fields)
+        names = pricedict.names()
+        wanted = list(names)
+
+        if self.negative is not None:
+            skipped, tickers = self.negative.partition(tickers)
+            if skipped:
+                self.negative.saved_requests(
+                    self._count_urls(len(tickers) + len(skipped)) -
+                    self._count_urls(len(tickers)))
+            wanted += [n for n in [PRICE] if n not in wanted]
+
+        if self.cache is not None:
+            cached, tickers = self.cache.lookup(tickers, names)
+            pricedict.update(cached)
+            wanted += [n for n in self.cache.FIELDS if n not in wanted]
 
-        url = keyticker.url()
-        Logger.debug('url: ' + url)
+        if len(tickers) < 1:
+            return pricedict
 
-        text = self.web.fetch(url)
+        try:
+            if self.inflight is None:
+                fetched, answered = self._fetch_quotes(tickers, wanted)
+            else:
+                fetched, answered = self._fetch_shared(tickers, wanted)
+        except Warning:
+            if not self._serve_stale(pricedict, tickers, names):
+                raise
+            return pricedict
+
+        if self.cache is not None:
+            self.cache.store(wanted, fetched)
+        pricedict.update(dict((t, v[:len(names)])
+                              for (t, v) in fetched.items()))
+
+        if self.negative is not None:
+            i = wanted.index(PRICE)
+            unpriced = [t for t in answered
+                        if fetched.get(t, [''] * len(wanted))[i] == '']
+            if unpriced:
+                Logger.debug('negative cache: add ' + ','.join(unpriced))
+                self.negative.add(unpriced)
+            self.negative.save()
+        return pricedict
+
+    def _fetch_quotes(self, tickers, wanted):
+        # dict of ticker to values of wanted, fetched in batches, and the
+        # list of tickers whose batch parsed as a quote response
+        tickers, fetched, answered = list(tickers), {}, []
+        urls = KeyTickerBase().urls(self.batchsize, tickers, wanted,
+                                    self.url_base)
+        for i, text in enumerate(self._fetch_all(urls)):
+            pricedict = PriceDict(text, names=wanted)
+            fetched.update(pricedict.data())
+            if pricedict.parsed():
+                answered += tickers[i*self.batchsize:(i+1)*self.batchsize]
+            else:
+                Logger.warning('batch %d: not a quote response' % (i + 1))
+        return fetched, answered
+
+    def _fetch_shared(self, tickers, wanted):
+        """
+        As _fetch_quotes, but tickers already being fetched with the same
+        fields, from the same source, by another Yahoo are not requested
+        again: their results are awaited and shared. If that fetch fails,
+        self.web is a copy of its failing agent and its Warning is raised;
+        if it outlasts its RetryPolicy deadlines, a 'FlightTimeout' Warning
+        is raised.
+        """
+        keys = [(t,) + self._flight_key(wanted) for t in tickers]
+        flight, mine, theirs = self.inflight.begin(keys, owner=self)
+        fetched, answered = {}, []
+        if mine:
+            result, error = None, None
+            try:
+                fetched, answered = self._fetch_quotes([k[0] for k in mine],
+                                                       wanted)
+                result = (fetched, set(answered))
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self.inflight.end(flight, result, error)
+        for other, keys in theirs.items():
+            try:
+                data, parsed = other.wait(timeout=self._flight_timeout(other))
+            except FlightTimeout as e:
+                self.web = HttpAgent()
+                self.web.state['error'] = 'FlightTimeout: ' + str(e)
+                msg = "Diagnostics: " + str(self.web)
+                Logger.error(msg)
+                raise Warning(msg)
+            except Warning:
+                self.web = copy.copy(other.owner.web)
+                self.web.state = dict(self.web.state, shared=True)
+                raise
+            tickers = [k[0] for k in keys]
+            fetched.update((t, data[t]) for t in tickers if t in data)
+            answered += [t for t in tickers if t in parsed]
+        return fetched, answered
+
+    def _flight_key(self, wanted):
+        # fetches are only shared between Yahoos that would make the same
+        # requests; a cassette is alive while in flight, so its id is unique
+        return (tuple(wanted), self.engine, self.url_base, id(self.cassette))
+
+    def _flight_timeout(self, flight):
+        # the leader fetches its batches workers at a time, each within its
+        # RetryPolicy deadline
+        leader = flight.owner
+        rounds = -(-leader._count_urls(len(flight.keys)) // leader.workers)
+        return self.web.policy().deadline * max(1, rounds)
+
+    def _serve_stale(self, pricedict, tickers, names):
+        if self.cache is None or not self.web.circuit_open():
+            return False
+        stale, missing = self.cache.lookup(tickers, names, stale=True)
+        if missing:
+            return False
+        Logger.warning('circuit open: using %d stale quotes' % len(stale))
+        pricedict.update(stale)
+        return True
+
+    def _count_urls(self, n):
+        return (n + self.batchsize - 1) // self.batchsize
+
+    def _fetch_all(self, urls):
+        """
+        Fetch each URL with its own HttpAgent, at most self.workers at a
+        time, and return the pages in URL order. On failure the failing
+        agent is kept in self.web for diagnostics.
+        """
+        if self.engine == 'asyncio':
+            engine = AsyncEngine(self.workers, cassette=self.cassette)
+            return self._check(engine.fetch_all(urls))
+
+        agents = [HttpAgent(cassette=self.cassette) for url in urls]
+
+        def fetch(i):
+            Logger.debug('url: ' + urls[i])
+            return agents[i].fetch(urls[i])
+
+        workers = min(self.workers, len(urls))
+        if workers > 1 and ThreadPoolExecutor is not None:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                texts = list(pool.map(fetch, range(len(urls))))
+        else:
+            texts = [fetch(i) for i in range(len(urls))]
+        return self._check(agents, texts)
 
-        if self.web.failed():
-            msg = "Diagnostics: " + str(self.web)
-            Logger.error(msg)
-            raise Warning(msg)
+    def _check(self, agents, texts=None):
+        # the first failure, in URL order, is kept for diagnostics, passing
+        # over fetches cancelled because of it
+        failed = [a for a in agents if a.failed()]
+        failed.sort(key=lambda a: a.error() == 'Cancelled')
+        for agent in failed[:1] or agents[-1:]:
+            self.web = agent
+            if agent.failed():
+                msg = "Diagnostics: " + str(agent)
+                Logger.error(msg)
+                raise Warning(msg)
 
-        pricedict = PriceDict(text, keyticker)
-        Logger.debug('pricedict: ' + str(pricedict))
+        if texts is None:
+            texts = [agent.html() for agent in agents]
+        return texts
 
-        dataframe.update(pricedict)
-        Logger.debug('dataframe: ' + str(dataframe))
 
-        sht.write_frame(dataframe)
+# quote field whose absence marks a ticker Yahoo does not price
+PRICE = 'regularMarketPrice'
+
+
+class YahooJob(object):
+    """
+    One spreadsheet range to refresh, as returned by Yahoo.prepare().
+
+    Attributes
+      doc        SpreadsheetAPI holding the sheet.
+      sheet      DataSheet.
+      keyticker  KeyTicker of the keys read.
+      dataframe  DataFrame of the datacols to populate.
+      fields     quote fields, one per datacol, or None for the defaults.
+    """
+
+    def __init__(self, doc, sheet, keyticker, dataframe, fields=None):
+        self.doc = doc
+        self.sheet = sheet
+        self.keyticker = keyticker
+        self.dataframe = dataframe
+        self.fields = fields
+
+    def __repr__(self):
+        return 'YahooJob(%s, %d tickers)' % (self.sheet.sheet, len(self.keyticker))
+
+
+class TickerMemo(object):
+    """
+    Bounded memo of cell value to ticker ('' if unmatched). When full it
+    is emptied, which is cheap and keeps recent values warm soon enough.
+
+    Constructor
+      TickerMemo(maxsize=MAX_SIZE)
+
+    Methods
+      get(text)          returns memoised ticker or None.
+      put(text, ticker)  memoises ticker.
+      clear()            drops all entries.
+    """
+
+    MAX_SIZE = 100000
+
+    def __init__(self, maxsize=MAX_SIZE):
+        self.maxsize = maxsize
+        self.memo = {}
+
+    def get(self, text):
+        return self.memo.get(text)
+
+    def put(self, text, ticker):
+        if len(self.memo) >= self.maxsize:
+            self.memo = {}
+        self.memo[text] = ticker
+
+    def clear(self):
+        self.memo = {}
+
+    def __len__(self):
+        return len(self.memo)
 
 
 class KeyTickerBase(object):
     """
     Base class provides a read-only dict of spreadsheet cell value to
-    Yahoo tickers.
+    Yahoo tickers. Cell values are matched with surrounding whitespace
+    removed, and each distinct value only once; tickers are kept once
+    each, with a reverse index to the rows whose values map to them, so
+    that eg., 'BP', 'BP.' and repeated holdings of BP request BP once.
+
+    Subclasses define CRE_TICKER, one regex for all the ticker patterns of
+    their mode, each an alternative in its own named group; TEMPLATES,
+    mapping each group name to a match.expand() template giving the
+    ticker; and MEMO, a TickerMemo of cell value to ticker shared by all
+    instances, so each distinct value is only matched once per session.
 
     Constructor
       KeyTicker(list_of_string)
@@ -94,24 +482,81 @@ class KeyTickerBase(object):
       keys()        returns keys.
       items()       returns items.
       values()      returns values.
-      tickers()     returns stored tickers as list.
-      url(tickers)  returns composed URL using tickers (or stored tickers
-                    if no argument).
+      tickers()     returns stored tickers as list, each once, in order of
+                    first use.
+      rows(ticker)  returns list of 0-based row indices of data whose
+                    values map to ticker.
+      classify(column)
+                    returns list of the ticker for each cell value in
+                    column, or '' if unmatched.
+      match_ticker(text)
+                    returns the ticker for one cell value, or ''.
+      url(tickers, fields, base)
+                    returns composed URL using tickers (or stored tickers
+                    if no argument), restricted to the quote fields if
+                    given, starting with base if given, else URL_BASE.
+      urls(batchsize, tickers, fields, base)
+                    returns list of composed URLs, each using at most
+                    batchsize tickers (or stored tickers if no argument).
 
     """
 
-    URL_BASE = 'http://query1.finance.yahoo.com/v7/finance/quote?'
+    URL_BASE = 'https://query1.finance.yahoo.com/v7/finance/quote?'
+
+    CRE_TICKER = None
+    TEMPLATES = {}
+    MEMO = None
 
     def __init__(self, data=[]):
         self.key2tick = self._extract_tickers(data)
+        self.tick2rows = self._index_rows(data)
 
     def tickers(self):
-        return self.key2tick.values()
+        return list(self.tick2rows)
 
-    def url(self, tickers=[]):
+    def rows(self, ticker):
+        return self.tick2rows.get(ticker, [])
+
+    def classify(self, column):
+        tickers = []
+        if len(column) < 1:
+            return tickers
+        lookup, match = self.MEMO.get, self.match_ticker
+        for text in column:
+            ticker = lookup(text)
+            tickers.append(match(text) if ticker is None else ticker)
+        return tickers
+
+    def match_ticker(self, text=''):
+        ticker = self.MEMO.get(text)
+        if ticker is not None:
+            return ticker
+        m = self.CRE_TICKER.match(text.strip())
+        if m:
+            ticker = m.expand(self.TEMPLATES[m.lastgroup])
+            Logger.debug('%s: %s => %s', m.lastgroup, text, ticker)
+        else:
+            ticker = ''
+        self.MEMO.put(text, ticker)
+        return ticker
+
+    def url(self, tickers=[], fields=None, base=None):
+        if len(tickers) < 1:
+            tickers = self.tickers()
+        base = self.URL_BASE if base is None else base
+        url = base + 'symbols=' + ','.join(tickers)
+        if fields:
+            if 'symbol' not in fields:
+                fields = list(fields) + ['symbol']
+            url += '&fields=' + ','.join(fields)
+        return url
+
+    def urls(self, batchsize, tickers=[], fields=None, base=None):
         if len(tickers) < 1:
             tickers = self.tickers()
-        return self.URL_BASE + 'symbols=' + ','.join(tickers)
+        tickers = list(tickers)
+        return [self.url(tickers[i:i+batchsize], fields, base)
+                for i in range(0, len(tickers), batchsize)]
 
     def __repr__(self):
         return str(self.key2tick)
@@ -129,95 +574,76 @@ class KeyTickerBase(object):
     def values(self): return self.key2tick.values()
 
     def _extract_tickers(self, data):
-        d = {}
-        for key in data:
-            ticker = self.match_ticker(key)
-            if ticker != '':
-                d[key] = ticker
-        return d
+        keys = list(OrderedDict.fromkeys(data))
+        return dict((key, ticker)
+                    for (key, ticker) in zip(keys, self.classify(keys))
+                    if ticker != '')
+
+    def _index_rows(self, data):
+        index = OrderedDict()
+        for row, key in enumerate(data):
+            ticker = self.key2tick.get(key)
+            if ticker is not None:
+                index.setdefault(ticker, []).append(row)
+        return index
 
 
 class KeyTickerStock(KeyTickerBase):
     """
     KeyTicker for stocks.
     """
-    # patterns could be combined, but easier to test separately:
-    CRE_EPIC = re.compile(r'^([A-Z0-9]{2,4})$')          # BP
-    CRE_EPIC_DOT = re.compile(r'^([A-Z0-9]{2,4})\.$')        # BP.
-    CRE_EPIC_FLOOR = re.compile(r'^([A-Z0-9]{2,4}\.[A-Z]+)$')  # BP.L
 
-    def match_ticker(self, text=''):
-        m = self.CRE_EPIC.search(text)
-        if m:
-            ticker = m.group(1)
-            Logger.debug('EPIC: %s => %s' % (text, ticker))
-            return ticker
+    CRE_TICKER = re.compile(
+        r'^(?:(?P<EPIC>[A-Z0-9]{2,4})'              # BP
+        r'|(?P<EPIC_DOT>[A-Z0-9]{2,4})\.'           # BP.
+        r'|(?P<EPIC_FLOOR>[A-Z0-9]{2,4}\.[A-Z]+))$'  # BP.L
+    )
 
-        m = self.CRE_EPIC_DOT.search(text)
-        if m:
-            ticker = m.group(1)
-            Logger.debug('EPIC_DOT: %s => %s' % (text, ticker))
-            return ticker
+    TEMPLATES = {
+        'EPIC': r'\g<EPIC>',
+        'EPIC_DOT': r'\g<EPIC_DOT>',
+        'EPIC_FLOOR': r'\g<EPIC_FLOOR>',
+    }
 
-        m = self.CRE_EPIC_FLOOR.search(text)
-        if m:
-            ticker = m.group(1)
-            Logger.debug('EPIC_FLOOR: %s => %s' % (text, ticker))
-            return ticker
-        return ''
+    MEMO = TickerMemo()
 
 
 class KeyTickerFX(KeyTickerBase):
     """
     KeyTicker for FX currency pairs.
     """
-    # patterns could be combined, but easier to test separately:
-    CRE_FXPAIR_X = re.compile(r'^([A-Z]{6}=X)$')              # EURGBP=X
-    CRE_FXPAIR_SEP = re.compile(r'^([A-Z]{3})[:/]([A-Z]{3})$')  # EUR:GBP
-    CRE_FXPAIR_CH6 = re.compile(r'^([A-Z]{6})$')                # EURGBP
 
-    def match_ticker(self, text=''):
-        m = self.CRE_FXPAIR_X.search(text)
-        if m:
-            ticker = m.group(1)
-            Logger.debug('FXPAIR_X: %s => %s' % (text, ticker))
-            return ticker
+    CRE_TICKER = re.compile(
+        r'^(?:(?P<FXPAIR_X>[A-Z]{6}=X)'                        # EURGBP=X
+        r'|(?P<FXPAIR_SEP>(?P<BASE>[A-Z]{3})[:/](?P<QUOTE>[A-Z]{3}))'  # EUR:GBP
+        r'|(?P<FXPAIR_CH6>[A-Z]{6}))$'                         # EURGBP
+    )
 
-        m = self.CRE_FXPAIR_SEP.search(text)
-        if m:
-            ticker = m.group(1) + m.group(2) + '=X'
-            Logger.debug('FXPAIR_SEP: %s => %s' % (text, ticker))
-            return ticker
+    TEMPLATES = {
+        'FXPAIR_X': r'\g<FXPAIR_X>',
+        'FXPAIR_SEP': r'\g<BASE>\g<QUOTE>=X',
+        'FXPAIR_CH6': r'\g<FXPAIR_CH6>=X',
+    }
 
-        m = self.CRE_FXPAIR_CH6.search(text)
-        if m:
-            ticker = m.group(1) + '=X'
-            Logger.debug('FXPAIR_CH6: %s => %s' % (text, ticker))
-            return ticker
-        return ''
+    MEMO = TickerMemo()
 
 
 class KeyTickerIndex(KeyTickerBase):
     """
     KeyTicker for indices.
     """
-    # patterns could be combined, but easier to test separately:
-    CRE_INDEX_HAT = re.compile(r'^(\^[A-Z][A-Z0-9]{2,})$')  # ^FTSE
-    CRE_INDEX = re.compile(r'^([A-Z][A-Z0-9]{2,})$')    # FTSE
 
-    def match_ticker(self, text=''):
-        m = self.CRE_INDEX_HAT.search(text)
-        if m:
-            ticker = m.group(1)
-            Logger.debug('INDEX_HAT: %s => %s' % (text, ticker))
-            return ticker
+    CRE_TICKER = re.compile(
+        r'^(?:(?P<INDEX_HAT>\^[A-Z][A-Z0-9]{2,})'  # ^FTSE
+        r'|(?P<INDEX>[A-Z][A-Z0-9]{2,}))$'         # FTSE
+    )
 
-        m = self.CRE_INDEX.search(text)
-        if m:
-            ticker = '^' + m.group(1)
-            Logger.debug('INDEX: %s => %s' % (text, ticker))
-            return ticker
-        return ''
+    TEMPLATES = {
+        'INDEX_HAT': r'\g<INDEX_HAT>',
+        'INDEX': r'^\g<INDEX>',
+    }
+
+    MEMO = TickerMemo()
 
 
 class PriceDict(object):
@@ -225,13 +651,16 @@ class PriceDict(object):
     Provides a read-only dict of spreadsheet cell value to Yahoo price
     information from a Yahoo generated JSON string. The optional second
     argument, keydict, provides an indirection on lookups; keys will be
-    looked up here first, then in the parsed price dict.
+    looked up here first, then in the parsed price dict. The optional
+    third argument, names, selects the quote fields to extract, in column
+    order; it defaults to NAMES.
 
     Constructor
-      PriceDict(text, keydict=None)
+      PriceDict(text, keydict=None, names=None)
 
     Operators
-      PriceDict[key]  returns price list for that key:
+      PriceDict[key]  returns price list for that key, one value per name,
+                      by default:
                         [regularMarketPrice, currency]
                       or a default list for an unmatched non-whitespace key.
       len(PriceDict)  returns number of key,price pairs.
@@ -247,6 +676,13 @@ class PriceDict(object):
       defaults(i)  returns i'th default value.
 
       data()       returns ticker to price list dict.
+      parsed()     returns True if text was a quote response, even one
+                   without results; False for an error or other page.
+
+      update(PriceDict)
+                   merges another PriceDict's ticker to price lists into
+                   this one, eg., from a further batch of the same query.
+      update(dict) merges a dict of ticker to price list.
 
     Raises
       KeyError    if key lookup fails.
@@ -257,30 +693,52 @@ class PriceDict(object):
     FORMATS = ['%f', '%s']
     DEFAULTS = [0, 'n/a']
 
-    def __init__(self, text, key2ticker=None):
+    # format and default for a field by name; fields not listed are
+    # treated as numeric
+    TEXT_FIELDS = [
+        'currency', 'financialCurrency', 'exchange', 'fullExchangeName',
+        'market', 'marketState', 'quoteType', 'shortName', 'longName',
+        'symbol', 'exchangeTimezoneName', 'exchangeTimezoneShortName',
+        'fiftyTwoWeekRange', 'quoteSourceName', 'messageBoardId',
+        'language', 'tradeable',
+    ]
+
+    def __init__(self, text, key2ticker=None, names=None):
         self.key2ticker = key2ticker
+        self.fields = list(names) if names else self.NAMES
+        self.fmts = [self._field_format(n) for n in self.fields]
+        self.defs = [self._field_default(n) for n in self.fields]
+        self.valid = False
         self.tick2price = self._parse_json(text)
 
     def names(self, i=None):
         if i is None:
-            return self.NAMES
-        return self.NAMES[i]
+            return self.fields
+        return self.fields[i]
 
     def formats(self, i=None):
         if i is None:
-            return self.FORMATS
-        return self.FORMATS[i]
+            return self.fmts
+        return self.fmts[i]
 
     def defaults(self, i=None):
         if i is None:
-            return self.DEFAULTS
-        return self.DEFAULTS[i]
+            return self.defs
+        return self.defs[i]
 
     def data(self):
         return self.tick2price
 
+    def parsed(self):
+        return self.valid
+
+    def update(self, other):
+        if isinstance(other, PriceDict):
+            other = other.data()
+        self.tick2price.update(other)
+
     def __repr__(self):
-        return str(self.tick2price) + ', fmt=' + str(self.FORMATS)
+        return str(self.tick2price) + ', fmt=' + str(self.fmts)
 
     def __len__(self):
         return len(self.tick2price)
@@ -300,45 +758,45 @@ class PriceDict(object):
     def _parse_json(self, text=''):
         data = {}
 
-        # extract inner dict key:value "result":[] which is an array
-        # containing one dict
-        m = re.search(r'"result":\[([^\]]*)\]', text)
-        if not m:
+        # parse numbers as their source text so prices keep the exact
+        # digits Yahoo sent, eg., '1351.0' rather than 1351.0
+        try:
+            doc = json.loads(text, parse_float=str, parse_int=str)
+            result = doc['quoteResponse']['result']
+        except (ValueError, TypeError, KeyError):
             return data
+        if not isinstance(result, list):
+            return data
+        self.valid = True
 
-        # strip double quotes throughout
-        text = m.group(1).replace('"', '')
-
-        while text:
-            # extract one ticker's dict from array
-            m = re.search(r'{(.*?)}(.*)', text)
-            if not m:
-                break
-
-            # split into key:value pairs
-            keyvals = m.group(1).split(',')
-            symbol, price, currency = '', '', ''
-
-            for pair in keyvals:
-                try:
-                    key, val = pair.split(':', 1)
-                except:
-                    continue
-
-                if key == 'symbol':
-                    symbol = val
-                    continue
-
-                if key == 'regularMarketPrice':
-                    price = val
-                    continue
-
-                if key == 'currency':
-                    currency = val
-                    continue
-
-            #Logger.debug("ypj: %s,%s,%s", symbol,price,currency)
-            data[symbol] = [price, currency]
-            text = m.group(2)
+        # result is an array containing one dict per ticker
+        for quote in result:
+            try:
+                symbol = quote['symbol']
+            except (TypeError, KeyError):
+                continue
+            data[symbol] = [self._as_text(quote.get(name))
+                            for name in self.fields]
 
         return data
+
+    def _field_format(self, name):
+        if name in self.NAMES:
+            return self.FORMATS[self.NAMES.index(name)]
+        if name in self.TEXT_FIELDS:
+            return '%s'
+        return '%f'
+
+    def _field_default(self, name):
+        if name in self.NAMES:
+            return self.DEFAULTS[self.NAMES.index(name)]
+        if name in self.TEXT_FIELDS:
+            return 'n/a'
+        return 0
+
+    def _as_text(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, bool):
+            return ('false', 'true')[value]
+        return value
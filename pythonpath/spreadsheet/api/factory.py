@@ -2,20 +2,46 @@ import logging
 Logger = logging.getLogger('LoadPrices')
 Logger.debug("Load: spreadsheet.api.factory")
 
+from contextlib import contextmanager
+
 
 def spreadsheet_api(name, **kwargs):
     if name == 'libreoffice':
         from . libreoffice import LibreOffice
         return LibreOffice(**kwargs)
+    if name == 'memory':
+        from . memory import Memory
+        return Memory(**kwargs)
+    if name == 'odsfile':
+        from . odsfile import OdsFile
+        return OdsFile(**kwargs)
+    if name == 'xlsx':
+        from . xlsx import Xlsx
+        return Xlsx(**kwargs)
     raise AttributeError("unknown spreadsheet type '%s'" % name)
 
 
 class SpreadsheetAPI(object):
 
+    @contextmanager
+    def batch(self):
+        """Context manager grouping a set of reads and writes into one
+        refresh transaction, eg., deferring recalculation and repaints
+        until the end. This default does nothing."""
+        yield self
+
     def clear_cell(self, sheetname, col, row):
         """Virtual method: clear spreadsheet cell."""
         raise NotImplementedError()
 
+    def clear_range(self, sheetname, cells):
+        """Clear all cells in a CellRange. Backends should override this
+        with a single bulk call; this default clears cell by cell."""
+        ((start_col, start_row), (end_col, end_row)) = cells.posn()
+        for row in range(start_row, end_row+1):
+            for col in range(start_col, end_col+1):
+                self.clear_cell(sheetname, col, row)
+
     def read_cell_string(self, sheetname, col, row):
         """Virtual method: read value from spreadsheet cell as string."""
         raise NotImplementedError()
@@ -33,6 +59,32 @@ class SpreadsheetAPI(object):
         """Virtual method: write string to spreadsheet cell."""
         raise NotImplementedError()
 
+    def read_range(self, sheetname, cells):
+        """Read values from a CellRange as strings; returns a list of rows,
+        each a list of column values. Backends should override this with
+        a single bulk call; this default reads cell by cell."""
+        ((start_col, start_row), (end_col, end_row)) = cells.posn()
+        return [
+            [self.read_cell_string(sheetname, col, row)
+             for col in range(start_col, end_col+1)]
+            for row in range(start_row, end_row+1)
+        ]
+
+    def write_range(self, sheetname, cells, rows):
+        """Write a block of values to a CellRange; rows is a list of rows,
+        each a list of column values, with numbers as float and text as
+        str. Backends should override this with a single bulk call; this
+        default writes cell by cell."""
+        ((start_col, start_row), _) = cells.posn()
+        for r, values in enumerate(rows):
+            for c, value in enumerate(values):
+                if isinstance(value, float):
+                    self.write_cell_numeric(sheetname, start_col+c,
+                                            start_row+r, value)
+                else:
+                    self.write_cell_string(sheetname, start_col+c,
+                                           start_row+r, value)
+
     def show_box(self, text, title, value):
         """Virtual method: display message box popup."""
         raise NotImplementedError()
@@ -7,16 +7,31 @@ Logger.debug("Load: spreadsheet.api.libreoffice")
 # https://api.libreoffice.org/docs/idl/ref/namespacecom_1_1sun_1_1star_1_1sheet_1_1CellFlags.html
 ###########################################################################
 
+from contextlib import contextmanager
+from collections import OrderedDict
+
 from . factory import SpreadsheetAPI
 
 
 class LibreOffice(SpreadsheetAPI):
+    """
+    SpreadsheetAPI backend for a LibreOffice/OpenOffice document over UNO.
+
+    Inside a batch(), sheet objects are cached by name, and the most
+    recently used cell range objects by (sheet, position), to save UNO
+    round trips. The caches are made on entry to the outermost batch and
+    dropped on exit: range objects move with the cells when rows or
+    columns are inserted or deleted, so they are only trusted while the
+    batch holds the document locked. Outside a batch nothing is cached.
+    """
     from com.sun.star.sheet.CellFlags import \
         VALUE, DATETIME, STRING, ANNOTATION, FORMULA, HARDATTR, \
         STYLES, OBJECTS, EDITATTR, FORMATTED
 
     Clear_Flags = (VALUE | STRING)
 
+    Range_Cache_Size = 64
+
     from com.sun.star.awt.VclWindowPeerAttribute import \
         OK, OK_CANCEL, YES_NO, YES_NO_CANCEL, RETRY_CANCEL, \
         DEF_OK, DEF_CANCEL, DEF_RETRY, DEF_YES, DEF_NO
@@ -42,9 +57,73 @@ class LibreOffice(SpreadsheetAPI):
             self.doc = docroot.getDocument()
         except Exception as e:
             raise AttributeError("could not open document: %s" % str(e))
+        self._batch_depth = 0
+        self._sheets = None   #name => sheet, in a batch
+        self._ranges = None   #(name, position) => cell range, in a batch
+
+    #@override
+    @contextmanager
+    def batch(self):
+        """
+        Lock the views and suspend automatic calculation while the block
+        runs, then restore both and recalculate dirty formulas once.
+        Nested batches join the outermost one.
+        """
+        self._batch_depth += 1
+        if self._batch_depth > 1:
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
+
+        self._sheets, self._ranges = {}, OrderedDict()
+        doc = self.doc
+        autocalc = doc.isAutomaticCalculationEnabled()
+        doc.lockControllers()
+        doc.addActionLock()
+        doc.enableAutomaticCalculation(False)
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            self._sheets, self._ranges = None, None
+            try:
+                if autocalc:
+                    doc.calculate()
+                doc.enableAutomaticCalculation(autocalc)
+            finally:
+                doc.removeActionLock()
+                doc.unlockControllers()
+
+    def _get_sheet(self, sheetname):
+        if self._sheets is None:
+            return self.doc.getSheets().getByName(sheetname)
+        try:
+            return self._sheets[sheetname]
+        except KeyError:
+            sheet = self.doc.getSheets().getByName(sheetname)
+            self._sheets[sheetname] = sheet
+            return sheet
+
+    def _get_range(self, sheetname, cells):
+        ((start_col, start_row), (end_col, end_row)) = cells.posn()
+        if self._ranges is None:
+            return self._get_sheet(sheetname).getCellRangeByPosition(
+                start_col, start_row, end_col, end_row)
+        key = (sheetname, start_col, start_row, end_col, end_row)
+        try:
+            block = self._ranges.pop(key)
+        except KeyError:
+            block = self._get_sheet(sheetname).getCellRangeByPosition(
+                start_col, start_row, end_col, end_row)
+        self._ranges[key] = block  #most recently used
+        while len(self._ranges) > self.Range_Cache_Size:
+            self._ranges.popitem(last=False)
+        return block
 
     def _get_cell(self, sheetname, col, row):
-        sheet = self.doc.getSheets().getByName(sheetname)
+        sheet = self._get_sheet(sheetname)
         return sheet.getCellByPosition(col, row)
 
     #@override
@@ -52,11 +131,27 @@ class LibreOffice(SpreadsheetAPI):
         cell = self._get_cell(sheetname, col, row)
         cell.clearContents(self.Clear_Flags)
 
+    #@override
+    def clear_range(self, sheetname, cells):
+        block = self._get_range(sheetname, cells)
+        block.clearContents(self.Clear_Flags)
+
     #@override
     def read_cell_string(self, sheetname, col, row):
         cell = self._get_cell(sheetname, col, row)
         return cell.getString()
 
+    #@override
+    def read_range(self, sheetname, cells):
+        # getDataArray returns text cells as str, numeric cells as float
+        # and empty cells as ''; only numeric cells need their displayed
+        # text from getString(), as read_cell_string returns
+        block = self._get_range(sheetname, cells)
+        return [[block.getCellByPosition(col, row).getString()
+                 if isinstance(value, float) else value
+                 for (col, value) in enumerate(values)]
+                for (row, values) in enumerate(block.getDataArray())]
+
     #@override
     def write_cell_numeric(self, sheetname, col, row, value):
         cell = self._get_cell(sheetname, col, row)
@@ -72,6 +167,11 @@ class LibreOffice(SpreadsheetAPI):
         cell = self._get_cell(sheetname, col, row)
         cell.String = value
 
+    #@override
+    def write_range(self, sheetname, cells, rows):
+        block = self._get_range(sheetname, cells)
+        block.setDataArray(tuple(tuple(row) for row in rows))
+
     #@override
     def show_box(self, text, title, value=OK):
         parent = self.doc.CurrentController.Frame.ContainerWindow
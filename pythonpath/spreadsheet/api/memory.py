@@ -0,0 +1,160 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: spreadsheet.api.memory")
+
+from contextlib import contextmanager
+
+from spreadsheet.cell import Cell
+from . factory import SpreadsheetAPI
+
+
+class Memory(SpreadsheetAPI):
+    """
+    Pure Python in-memory spreadsheet for headless runs, tests and
+    benchmarks. Cells are stored sparsely per sheet; empty cells are not
+    stored. Every SpreadsheetAPI call is counted by method name so the
+    number of backend round trips made by DataSheet/Yahoo can be measured.
+
+    Constructor
+      Memory(sheets=None)
+
+      sheets  optional dict of sheet name to dict of cell to value, where
+              a cell is a name 'A1' or a 0-based (column, row) pair.
+              Numbers are stored as float, everything else as str.
+
+    Methods
+      (all SpreadsheetAPI methods)
+
+      value(sheetname, cell)  returns stored value of a cell, or '' if
+                              empty; cell as for the constructor.
+      cells(sheetname)        returns dict of (column, row) to value.
+      counts()                returns dict of method name to call count.
+      reset_counts()          zeroes the call counts.
+      messages()              returns list of (title, text) shown by
+                              show_box.
+    """
+
+    def __init__(self, sheets=None):
+        self.sheets = {}
+        self.calls = {}
+        self.shown = []
+        for sheetname, cells in (sheets or {}).items():
+            data = self._sheet(sheetname)
+            for cell, value in cells.items():
+                self._store(data, self._posn(cell), self._as_value(value))
+
+    def value(self, sheetname, cell):
+        return self._sheet(sheetname).get(self._posn(cell), '')
+
+    def cells(self, sheetname):
+        return self._sheet(sheetname)
+
+    def counts(self):
+        return dict(self.calls)
+
+    def reset_counts(self):
+        self.calls.clear()
+
+    def messages(self):
+        return self.shown
+
+    #@override
+    @contextmanager
+    def batch(self):
+        self._count('batch')
+        yield self
+
+    #@override
+    def clear_cell(self, sheetname, col, row):
+        self._count('clear_cell')
+        self._sheet(sheetname).pop((col, row), None)
+
+    #@override
+    def clear_range(self, sheetname, cells):
+        self._count('clear_range')
+        data = self._sheet(sheetname)
+        ((start_col, start_row), (end_col, end_row)) = cells.posn()
+        for row in range(start_row, end_row+1):
+            for col in range(start_col, end_col+1):
+                data.pop((col, row), None)
+
+    #@override
+    def read_cell_string(self, sheetname, col, row):
+        self._count('read_cell_string')
+        return self._as_string(self._sheet(sheetname).get((col, row), ''))
+
+    #@override
+    def read_range(self, sheetname, cells):
+        self._count('read_range')
+        data = self._sheet(sheetname)
+        ((start_col, start_row), (end_col, end_row)) = cells.posn()
+        return [
+            [self._as_string(data.get((col, row), ''))
+             for col in range(start_col, end_col+1)]
+            for row in range(start_row, end_row+1)
+        ]
+
+    #@override
+    def write_cell_numeric(self, sheetname, col, row, value):
+        self._count('write_cell_numeric')
+        self._store(self._sheet(sheetname), (col, row), float(value))
+
+    #@override
+    def write_cell_boolean(self, sheetname, col, row, value):
+        self._count('write_cell_boolean')
+        self._store(self._sheet(sheetname), (col, row),
+                    float(self._as_boolean(value)))
+
+    #@override
+    def write_cell_string(self, sheetname, col, row, value):
+        self._count('write_cell_string')
+        self._store(self._sheet(sheetname), (col, row), str(value))
+
+    #@override
+    def write_range(self, sheetname, cells, rows):
+        self._count('write_range')
+        data = self._sheet(sheetname)
+        ((start_col, start_row), _) = cells.posn()
+        for r, values in enumerate(rows):
+            for c, value in enumerate(values):
+                self._store(data, (start_col+c, start_row+r),
+                            self._as_value(value))
+
+    #@override
+    def show_box(self, text, title, value=None):
+        self._count('show_box')
+        Logger.info('%s: %s' % (title, text))
+        self.shown.append((title, text))
+        return 1
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _sheet(self, sheetname):
+        return self.sheets.setdefault(sheetname, {})
+
+    def _posn(self, cell):
+        if isinstance(cell, str):
+            return Cell(cell).posn()
+        return tuple(cell)
+
+    def _store(self, data, posn, value):
+        if value == '':
+            data.pop(posn, None)
+        else:
+            data[posn] = value
+
+    def _as_value(self, value):
+        if isinstance(value, bool):
+            return float(value)
+        if isinstance(value, (int, float)):
+            return float(value)
+        return str(value)
+
+    def _as_string(self, value):
+        # as displayed: numbers without a trailing '.0' if integral
+        if isinstance(value, float):
+            if value.is_integer():
+                return str(int(value))
+            return repr(value)
+        return value
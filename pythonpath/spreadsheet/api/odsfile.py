@@ -0,0 +1,370 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: spreadsheet.api.odsfile")
+
+###########################################################################
+# OpenDocument spreadsheet file backend: no office suite required.
+# http://docs.oasis-open.org/office/v1.2/os/OpenDocument-v1.2-os-part1.html
+###########################################################################
+
+from bisect import bisect_left
+try:
+    from xml.etree.cElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+from . zipdoc import ZipDocument, EventFilter, CLEAR, as_string, sax_filter, \
+    xml_writer
+
+CONTENT = 'content.xml'
+
+NS_OFFICE = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+NS_TABLE = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+NS_TEXT = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+NS_CALCEXT = 'urn:org:documentfoundation:names:experimental:calc:xmlns:calcext:1.0'
+
+# value types whose cell value is held in office:value
+NUMERIC_TYPES = ('float', 'percentage', 'currency')
+
+
+def _q(ns, name):
+    return '{%s}%s' % (ns, name)
+
+
+class OdsFile(ZipDocument):
+    """
+    SpreadsheetAPI backend reading and updating an .ods file directly;
+    see ZipDocument for pending updates, save() and batch().
+
+    Reads stream content.xml with iterparse, discarding each table row
+    once seen and stopping after the last row wanted, so large sheets are
+    never held in memory.
+
+    save() streams content.xml through a SAX filter that rewrites only the
+    updated cells, splitting repeated rows and cells where needed; every
+    other member is copied without being recompressed.
+
+    Formula cells keep their formula when cleared, as in LibreOffice with
+    VALUE|STRING clear flags; writing a value replaces the formula.
+
+    Constructor
+      OdsFile(path, output=None)
+
+    Raises
+      AttributeError  if path is not a readable zip archive with
+                      content.xml.
+      KeyError        on save, if an updated sheet does not exist.
+    """
+
+    REQUIRED = CONTENT
+
+    def _scan(self, zf, sheetname, start_col, start_row, end_col, end_row):
+        """
+        Stream content.xml and return {row: {col: text}} for the non-empty
+        cells of sheetname within the given bounds.
+        """
+        T_TABLE = _q(NS_TABLE, 'table')
+        T_ROW = _q(NS_TABLE, 'table-row')
+        A_NAME = _q(NS_TABLE, 'name')
+        A_ROWS = _q(NS_TABLE, 'number-rows-repeated')
+
+        found = {}
+        stream = zf.open(CONTENT)
+        try:
+            stack, wanted, row = [], False, 0
+            for event, elem in iterparse(stream, ('start', 'end')):
+                if event == 'start':
+                    if elem.tag == T_TABLE:
+                        wanted = elem.get(A_NAME) == sheetname
+                        row = 0
+                    stack.append(elem)
+                    continue
+                stack.pop()
+                if elem.tag == T_ROW:
+                    if wanted:
+                        repeat = int(elem.get(A_ROWS, '1'))
+                        first = max(row, start_row)
+                        last = min(row + repeat - 1, end_row)
+                        if first <= last:
+                            values = _row_values(elem, start_col, end_col)
+                            for r in range(first, last+1):
+                                found[r] = values
+                        row += repeat
+                    # never keep more than one row in memory
+                    elem.clear()
+                    if stack:
+                        stack[-1].remove(elem)
+                    if wanted and row > end_row:
+                        break
+                elif elem.tag == T_TABLE:
+                    if wanted:
+                        break
+                    elem.clear()
+        finally:
+            stream.close()
+        return found
+
+    ########################################
+    # writing
+
+    def _rewrite(self, zw, updates):
+        for info in zw.infolist():
+            if info.filename != CONTENT:
+                zw.copy_member(info)
+                continue
+            stream = zw.open_source(info)
+            out = zw.open_member(info)
+            try:
+                handler = _ContentFilter(xml_writer(out), updates)
+                sax_filter(stream, handler)
+            finally:
+                stream.close()
+                out.close()
+            missing = set(self.updates) - handler.seen
+            if missing:
+                raise KeyError("unknown sheet(s) %s"
+                               % ', '.join(sorted(missing)))
+
+
+def _row_values(row, start_col, end_col):
+    T_CELL = _q(NS_TABLE, 'table-cell')
+    T_COVERED = _q(NS_TABLE, 'covered-table-cell')
+    A_COLS = _q(NS_TABLE, 'number-columns-repeated')
+    values, col = {}, 0
+    for cell in row:
+        if cell.tag != T_CELL and cell.tag != T_COVERED:
+            continue
+        repeat = int(cell.get(A_COLS, '1'))
+        first, last = max(col, start_col), min(col + repeat - 1, end_col)
+        if first <= last:
+            text = _cell_text(cell)
+            if text != '':
+                for c in range(first, last+1):
+                    values[c] = text
+        col += repeat
+        if col > end_col:
+            break
+    return values
+
+
+def _cell_text(cell):
+    vtype = cell.get(_q(NS_OFFICE, 'value-type'))
+    if vtype in NUMERIC_TYPES:
+        value = cell.get(_q(NS_OFFICE, 'value'))
+        if value is not None:
+            return as_string(float(value))
+    T_P = _q(NS_TEXT, 'p')
+    return '\n'.join(_para_text(p) for p in cell if p.tag == T_P)
+
+
+def _para_text(elem):
+    T_S = _q(NS_TEXT, 's')
+    T_TAB = _q(NS_TEXT, 'tab')
+    T_BREAK = _q(NS_TEXT, 'line-break')
+    text = [elem.text or '']
+    for child in elem:
+        if child.tag == T_S:
+            text.append(' ' * int(child.get(_q(NS_TEXT, 'c'), '1')))
+        elif child.tag == T_TAB:
+            text.append('\t')
+        elif child.tag == T_BREAK:
+            text.append('\n')
+        else:
+            text.append(_para_text(child))
+        text.append(child.tail or '')
+    return ''.join(text)
+
+
+class _ContentFilter(EventFilter):
+    """
+    SAX filter applying cell updates to content.xml. Events are passed
+    straight through except for each table row of an updated sheet, which
+    is buffered and rewritten as a unit.
+    """
+
+    ROW_CONTAINERS = ('table-row', 'table-row-group', 'table-header-rows',
+                      'table-rows')
+
+    def __init__(self, out, updates):
+        EventFilter.__init__(self, out)
+        self.updates = updates
+        self.seen = set()
+        self.sheet = None      # updates for the current sheet, if any
+        self.rows = []         # sorted rows of self.sheet
+        self.table_depth = None
+        self.row = 0
+        self.rows_seen = False
+        self.span = None       # (first row, updated rows) of buffered row
+
+    def prepare(self):
+        qname = self.qname
+        self.TABLE = qname(NS_TABLE, 'table', 'table')
+        self.ROW = qname(NS_TABLE, 'table-row', 'table')
+        self.CELL = qname(NS_TABLE, 'table-cell', 'table')
+        self.COVERED = qname(NS_TABLE, 'covered-table-cell', 'table')
+        self.NAME = qname(NS_TABLE, 'name', 'table')
+        self.ROWS = qname(NS_TABLE, 'number-rows-repeated', 'table')
+        self.COLS = qname(NS_TABLE, 'number-columns-repeated', 'table')
+        self.FORMULA = qname(NS_TABLE, 'formula', 'table')
+        self.P = qname(NS_TEXT, 'p', 'text')
+        self.VALUE_TYPE = qname(NS_OFFICE, 'value-type', 'office')
+        self.VALUE = qname(NS_OFFICE, 'value', 'office')
+        self.VALUE_ATTRS = [
+            self.VALUE_TYPE, self.VALUE,
+            qname(NS_OFFICE, 'date-value', 'office'),
+            qname(NS_OFFICE, 'time-value', 'office'),
+            qname(NS_OFFICE, 'boolean-value', 'office'),
+            qname(NS_OFFICE, 'string-value', 'office'),
+            qname(NS_OFFICE, 'currency', 'office'),
+        ]
+        self.CALC_TYPE = None
+        if NS_CALCEXT in self.prefix:
+            self.CALC_TYPE = qname(NS_CALCEXT, 'value-type', 'calcext')
+            self.VALUE_ATTRS.append(self.CALC_TYPE)
+
+    def start(self, name, attrs):
+        if name == self.TABLE and self.table_depth is None:
+            sheetname = attrs.get(self.NAME)
+            self.seen.add(sheetname)
+            self.sheet = self.updates.get(sheetname)
+            self.rows = sorted(self.sheet or [])
+            self.table_depth = self.depth
+            self.row = 0
+            self.rows_seen = False
+        elif self.sheet is not None and self.depth == self.table_depth + 1 \
+                and self.rows_seen \
+                and name.split(':', 1)[-1] not in self.ROW_CONTAINERS:
+            self._append_rows()
+        if name != self.ROW or self.sheet is None:
+            return False
+        # buffer only rows spanning an update
+        self.rows_seen = True
+        first = self.row
+        self.row += int(attrs.get(self.ROWS, '1'))
+        targets = self.rows[bisect_left(self.rows, first):
+                            bisect_left(self.rows, self.row)]
+        self.span = (first, targets)
+        return len(targets) > 0
+
+    def end(self, name):
+        if name == self.TABLE and self.depth + 1 == self.table_depth:
+            if self.sheet is not None:
+                self._append_rows()
+            self.sheet = None
+            self.table_depth = None
+
+    def flush(self, events):
+        self._flush_row(events)
+
+    def _with_repeat(self, events, attr, repeat):
+        attrs = dict(events[0][2])
+        if repeat > 1:
+            attrs[attr] = str(repeat)
+        else:
+            attrs.pop(attr, None)
+        return [(events[0][0], events[0][1], attrs)] + events[1:]
+
+    def _flush_row(self, events):
+        first, targets = self.span
+        row = first
+        for target in targets:
+            if target > row:
+                self.replay(self._with_repeat(events, self.ROWS, target-row))
+            self._emit_row(self._with_repeat(events, self.ROWS, 1),
+                           self.sheet.pop(target))
+            row = target + 1
+        if row < self.row:
+            self.replay(self._with_repeat(events, self.ROWS, self.row-row))
+
+    def _emit_row(self, events, updates):
+        self.out.startElement(events[0][1], events[0][2])
+        col = 0
+        for item in self.children(events):
+            if item[0][0] != 'start' or item[0][1] not in (self.CELL, self.COVERED):
+                self.replay(item)
+                continue
+            repeat = int(item[0][2].get(self.COLS, '1'))
+            first = col
+            col += repeat
+            targets = sorted(c for c in updates if first <= c < col)
+            if not targets:
+                self.replay(item)
+                continue
+            c = first
+            for target in targets:
+                if target > c:
+                    self.replay(self._with_repeat(item, self.COLS, target-c))
+                self._emit_cell(self._with_repeat(item, self.COLS, 1),
+                                updates.pop(target))
+                c = target + 1
+            if c < col:
+                self.replay(self._with_repeat(item, self.COLS, col-c))
+        self._append_cells(col, updates)
+        self.out.endElement(events[-1][1])
+
+    def _emit_cell(self, events, value):
+        attrs = dict(events[0][2])
+        if value is CLEAR and self.FORMULA in attrs:
+            self.replay(events)
+            return
+        for attr in self.VALUE_ATTRS + [self.FORMULA]:
+            attrs.pop(attr, None)
+        if value is not CLEAR:
+            vtype = 'float' if isinstance(value, float) else 'string'
+            attrs[self.VALUE_TYPE] = vtype
+            if vtype == 'float':
+                attrs[self.VALUE] = repr(value)
+            if self.CALC_TYPE:
+                attrs[self.CALC_TYPE] = vtype
+
+        self.out.startElement(events[0][1], attrs)
+        # keep annotations and the like, drop the old text:p paragraphs
+        depth, skip = 0, False
+        for event in events[1:-1]:
+            if depth == 0:
+                skip = event[0] == 'start' and event[1] == self.P
+            if event[0] == 'start':
+                depth += 1
+            if not skip:
+                self.replay([event])
+            if event[0] == 'end':
+                depth -= 1
+        if value is not CLEAR:
+            self.out.startElement(self.P, {})
+            self.out.characters(as_string(value))
+            self.out.endElement(self.P)
+        self.out.endElement(events[-1][1])
+
+    def _append_cells(self, col, updates):
+        # values for columns beyond the end of the row
+        targets = sorted(c for c in updates if updates[c] is not CLEAR)
+        for target in targets:
+            if target > col:
+                attrs = {}
+                if target - col > 1:
+                    attrs[self.COLS] = str(target - col)
+                self.out.startElement(self.CELL, attrs)
+                self.out.endElement(self.CELL)
+            self._emit_cell([('start', self.CELL, {}), ('end', self.CELL)],
+                            updates[target])
+            col = target + 1
+        updates.clear()
+
+    def _append_rows(self):
+        # values for rows beyond the end of the table
+        targets = sorted(r for r in self.sheet
+                         if any(v is not CLEAR for v in self.sheet[r].values()))
+        for target in targets:
+            if target > self.row:
+                attrs = {}
+                if target - self.row > 1:
+                    attrs[self.ROWS] = str(target - self.row)
+                self.out.startElement(self.ROW, attrs)
+                self.out.startElement(self.CELL, {})
+                self.out.endElement(self.CELL)
+                self.out.endElement(self.ROW)
+            self.out.startElement(self.ROW, {})
+            self._append_cells(0, self.sheet[target])
+            self.out.endElement(self.ROW)
+            self.row = target + 1
+        self.sheet.clear()
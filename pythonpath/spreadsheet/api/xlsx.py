@@ -0,0 +1,464 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: spreadsheet.api.xlsx")
+
+###########################################################################
+# Office Open XML workbook backend: no office suite required.
+# ECMA-376 Part 1, SpreadsheetML
+###########################################################################
+
+import re
+import zipfile
+import posixpath
+try:
+    from xml.etree.cElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+from . zipdoc import ZipDocument, EventFilter, CLEAR, as_string, sax_filter, \
+    xml_writer
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+TYPE_DOCUMENT = NS_REL + '/officeDocument'
+TYPE_STRINGS = NS_REL + '/sharedStrings'
+TYPE_CALCCHAIN = NS_REL + '/calcChain'
+
+CRE_REF = re.compile(r'^\$?([A-Z]+)\$?([0-9]+)$')
+
+
+def _q(ns, name):
+    return '{%s}%s' % (ns, name)
+
+
+class Xlsx(ZipDocument):
+    """
+    SpreadsheetAPI backend reading and updating an .xlsx file directly;
+    see ZipDocument for pending updates, save() and batch().
+
+    Reads stream the worksheet part with iterparse, discarding each row
+    once seen and stopping after the last row wanted, then stream the
+    shared strings part only as far as the last string index needed, so
+    memory stays flat however large the sheet.
+
+    save() streams only the updated worksheet parts through a SAX filter
+    that replaces, inserts or removes the updated cells. Strings are
+    written inline, so the shared strings part is left alone; every other
+    member is copied without being recompressed. Writing over a formula
+    drops the formula and its calculation chain entry, except for the
+    master cell of a shared formula, which its other cells depend on.
+    The sheet's recorded dimension is extended to cover written cells.
+
+    Values are read as stored: dates and times are serial numbers and
+    booleans TRUE or FALSE. Formula cells keep their formula when
+    cleared, and other cells their style.
+
+    Constructor
+      Xlsx(path, output=None)
+
+    Raises
+      AttributeError  if path is not a readable .xlsx archive.
+      KeyError        on save, if an updated sheet does not exist.
+      ValueError      on save, if a write would overwrite the master
+                      cell of a shared formula.
+    """
+
+    REQUIRED = '_rels/.rels'
+
+    def __init__(self, path=None, output=None):
+        ZipDocument.__init__(self, path, output)
+        try:
+            self._read_workbook()
+        except Exception as e:
+            raise AttributeError("could not open document: %s" % str(e))
+
+    def _read_workbook(self):
+        with zipfile.ZipFile(self.path) as zf:
+            rels = _relationships(zf, '')
+            workbook = [t for (kind, t) in rels.values()
+                        if kind == TYPE_DOCUMENT][0]
+            rels = _relationships(zf, workbook)
+            self.sheets = {}  # sheetname => (part, sheetId)
+            with zf.open(workbook) as stream:
+                for event, elem in iterparse(stream):
+                    if elem.tag == _q(NS_MAIN, 'sheet'):
+                        target = rels[elem.get(_q(NS_REL, 'id'))][1]
+                        self.sheets[elem.get('name')] = \
+                            (target, elem.get('sheetId'))
+        parts = dict((kind, target) for (kind, target) in rels.values())
+        self.strings = parts.get(TYPE_STRINGS)
+        self.calcchain = parts.get(TYPE_CALCCHAIN)
+
+    ########################################
+    # reading
+
+    def _scan(self, zf, sheetname, start_col, start_row, end_col, end_row):
+        """
+        Stream the worksheet and return {row: {col: text}} for the
+        non-empty cells of sheetname within the given bounds.
+        """
+        if sheetname not in self.sheets:
+            return {}
+        T_DATA = _q(NS_MAIN, 'sheetData')
+        T_ROW = _q(NS_MAIN, 'row')
+
+        found, shared = {}, {}  # shared: string index => [(row, col)]
+        stream = zf.open(self.sheets[sheetname][0])
+        try:
+            data, row = None, -1
+            for event, elem in iterparse(stream, ('start', 'end')):
+                if event == 'start':
+                    if elem.tag == T_DATA:
+                        data = elem
+                    continue
+                if elem.tag != T_ROW:
+                    continue
+                ref = elem.get('r')
+                row = int(ref) - 1 if ref else row + 1
+                if row > end_row:
+                    break
+                if row >= start_row:
+                    values = _row_values(elem, start_col, end_col, shared, row)
+                    if values:
+                        found[row] = values
+                # never keep more than one row in memory
+                elem.clear()
+                data.remove(elem)
+        finally:
+            stream.close()
+
+        if shared and self.strings:
+            for index, text in self._shared_strings(zf, shared):
+                for (row, col) in shared[index]:
+                    found.setdefault(row, {})[col] = text
+        return found
+
+    def _shared_strings(self, zf, wanted):
+        """Yield (index, text) for each wanted shared string index."""
+        T_SST = _q(NS_MAIN, 'sst')
+        T_SI = _q(NS_MAIN, 'si')
+        last = max(wanted)
+        stream = zf.open(self.strings)
+        try:
+            sst, index = None, 0
+            for event, elem in iterparse(stream, ('start', 'end')):
+                if event == 'start':
+                    if elem.tag == T_SST:
+                        sst = elem
+                    continue
+                if elem.tag != T_SI:
+                    continue
+                if index in wanted:
+                    yield index, _rich_text(elem)
+                index += 1
+                if index > last:
+                    break
+                elem.clear()
+                sst.remove(elem)
+        finally:
+            stream.close()
+
+    ########################################
+    # writing
+
+    def _rewrite(self, zw, updates):
+        missing = set(updates) - set(self.sheets)
+        if missing:
+            raise KeyError("unknown sheet(s) %s" % ', '.join(sorted(missing)))
+        parts = dict((self.sheets[name][0], name) for name in updates)
+        dropped = set()  # (sheetId, cell name) of overwritten formulas
+        deferred = None
+        for info in zw.infolist():
+            if info.filename in parts:
+                name = parts.pop(info.filename)
+                handler = _SheetFilter(None, updates[name])
+                self._filter(zw, info, handler)
+                sheetid = self.sheets[name][1]
+                dropped.update((sheetid, ref) for ref in handler.formulas)
+            elif info.filename == self.calcchain:
+                deferred = info  # after the sheets that drop formulas
+            else:
+                zw.copy_member(info)
+        if deferred is not None:
+            if dropped:
+                self._filter(zw, deferred, _CalcChainFilter(None, dropped))
+            else:
+                zw.copy_member(deferred)
+
+    def _filter(self, zw, info, handler):
+        stream = zw.open_source(info)
+        out = zw.open_member(info)
+        try:
+            handler.out = xml_writer(out)
+            sax_filter(stream, handler)
+        finally:
+            stream.close()
+            out.close()
+
+
+def _relationships(zf, part):
+    """Returns dict of relationship id to (type, target part name) for a
+    package part, '' for the package itself."""
+    folder, name = posixpath.split(part)
+    rels = {}
+    with zf.open(posixpath.join(folder, '_rels', name + '.rels')) as stream:
+        for event, elem in iterparse(stream):
+            if elem.tag == _q(NS_PKG_REL, 'Relationship'):
+                target = elem.get('Target')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(posixpath.join(folder, target))
+                rels[elem.get('Id')] = (elem.get('Type'), target)
+    return rels
+
+
+def ref2posn(ref):
+    """Returns 0-based (col, row) of a cell reference like 'AB12'."""
+    m = CRE_REF.match(ref)
+    col = 0
+    for letter in m.group(1):
+        col = col * 26 + ord(letter) - 64
+    return col - 1, int(m.group(2)) - 1
+
+
+def posn2ref(col, row):
+    """Returns the cell reference of 0-based (col, row)."""
+    letters = ''
+    col += 1
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters + str(row + 1)
+
+
+def _row_values(row, start_col, end_col, shared, rownum):
+    T_C = _q(NS_MAIN, 'c')
+    T_V = _q(NS_MAIN, 'v')
+    T_IS = _q(NS_MAIN, 'is')
+    values, col = {}, -1
+    for cell in row:
+        if cell.tag != T_C:
+            continue
+        ref = cell.get('r')
+        col = ref2posn(ref)[0] if ref else col + 1
+        if col < start_col:
+            continue
+        if col > end_col:
+            break
+        kind = cell.get('t', 'n')
+        if kind == 'inlineStr':
+            inline = cell.find(T_IS)
+            text = _rich_text(inline) if inline is not None else ''
+        else:
+            v = cell.find(T_V)
+            text = (v.text or '') if v is not None else ''
+            if text == '':
+                pass
+            elif kind == 's':
+                shared.setdefault(int(text), []).append((rownum, col))
+                continue
+            elif kind == 'b':
+                text = 'TRUE' if text == '1' else 'FALSE'
+            elif kind == 'n':
+                text = as_string(float(text))
+        if text != '':
+            values[col] = text
+    return values
+
+
+def _rich_text(elem):
+    # plain <t>, or rich text runs <r><t>; phonetic runs <rPh> are skipped
+    T_T = _q(NS_MAIN, 't')
+    T_R = _q(NS_MAIN, 'r')
+    text = []
+    for child in elem:
+        if child.tag == T_T:
+            text.append(child.text or '')
+        elif child.tag == T_R:
+            t = child.find(T_T)
+            if t is not None:
+                text.append(t.text or '')
+    return ''.join(text)
+
+
+class _SheetFilter(EventFilter):
+    """
+    SAX filter applying cell updates to a worksheet part. Rows with
+    updates are buffered and rewritten; new rows are inserted in order
+    and remaining ones appended at the end of sheetData; the dimension
+    is extended to take in written cells. Records the names of formula
+    cells overwritten in formulas.
+    """
+
+    def __init__(self, out, updates):
+        EventFilter.__init__(self, out)
+        self.updates = updates  # {row: {col: value or CLEAR}}
+        self.written = [(col, row) for row in updates
+                        for (col, value) in updates[row].items()
+                        if value is not CLEAR]
+        self.rows = sorted(updates)
+        self.next = 0           # index in rows of the next row to insert
+        self.in_data = False
+        self.row = -1
+        self.formulas = []
+
+    def prepare(self):
+        qname = self.qname
+        self.DIMENSION = qname(NS_MAIN, 'dimension', '')
+        self.DATA = qname(NS_MAIN, 'sheetData', '')
+        self.ROW = qname(NS_MAIN, 'row', '')
+        self.C = qname(NS_MAIN, 'c', '')
+        self.V = qname(NS_MAIN, 'v', '')
+        self.F = qname(NS_MAIN, 'f', '')
+        self.IS = qname(NS_MAIN, 'is', '')
+        self.T = qname(NS_MAIN, 't', '')
+
+    def start(self, name, attrs):
+        if name == self.DIMENSION:
+            return True
+        if name == self.DATA:
+            self.in_data = True
+        elif name == self.ROW and self.in_data:
+            ref = attrs.get('r')
+            self.row = int(ref) - 1 if ref else self.row + 1
+            self._insert_rows(self.row)
+            return self.row in self.updates
+        return False
+
+    def end(self, name):
+        if name == self.DATA:
+            self._insert_rows(None)
+            self.in_data = False
+
+    def flush(self, events):
+        if events[0][1] == self.DIMENSION:
+            return self._dimension(events)
+        attrs = dict(events[0][2])
+        attrs.pop('spans', None)
+        updates = self.updates.pop(self.row)
+        self.out.startElement(events[0][1], attrs)
+        col, trailing = -1, []
+        for item in self.children(events):
+            if item[0][0] != 'start':
+                self.replay(item)
+                continue
+            if item[0][1] != self.C:
+                trailing.append(item)  # eg., extLst, after the cells
+                continue
+            ref = item[0][2].get('r')
+            col = ref2posn(ref)[0] if ref else col + 1
+            self._insert_cells(updates, col)
+            if col in updates:
+                self._emit_cell(item, col, updates.pop(col))
+            else:
+                self.replay(item)
+        self._insert_cells(updates, None)
+        for item in trailing:
+            self.replay(item)
+        self.out.endElement(events[-1][1])
+
+    def _dimension(self, events):
+        attrs = dict(events[0][2])
+        ref = attrs.get('ref')
+        if ref and self.written:
+            corners = [ref2posn(r) for r in ref.split(':')]
+            cols = [c for (c, r) in corners + self.written]
+            rows = [r for (c, r) in corners + self.written]
+            first = posn2ref(min(cols), min(rows))
+            last = posn2ref(max(cols), max(rows))
+            attrs['ref'] = first if first == last else first + ':' + last
+        self.replay([(events[0][0], events[0][1], attrs)] + events[1:])
+
+    def _insert_rows(self, before):
+        # new rows for writes to rows not in the sheet
+        while self.next < len(self.rows):
+            row = self.rows[self.next]
+            if before is not None and row >= before:
+                break
+            self.next += 1
+            updates = self.updates.pop(row, None)
+            if not updates or all(v is CLEAR for v in updates.values()):
+                continue
+            self.out.startElement(self.ROW, {'r': str(row + 1)})
+            self._insert_cells(updates, None, row)
+            self.out.endElement(self.ROW)
+
+    def _insert_cells(self, updates, before, row=None):
+        row = self.row if row is None else row
+        for col in sorted(updates):
+            if before is not None and col >= before:
+                break
+            value = updates.pop(col)
+            if value is not CLEAR:
+                self._new_cell({'r': posn2ref(col, row)}, value)
+
+    def _emit_cell(self, events, col, value):
+        attrs = events[0][2]
+        formula = [e[2] for e in events if e[0] == 'start' and e[1] == self.F]
+        if value is CLEAR:
+            if formula:
+                self.replay(events)
+            elif 's' in attrs:
+                # keep its style, as a write does
+                self.element(self.C, {'r': posn2ref(col, self.row),
+                                      's': attrs['s']})
+            return
+        if formula:
+            ref = posn2ref(col, self.row)
+            f_attrs = formula[0]
+            span = f_attrs.get('ref', ref)
+            if f_attrs.get('t') == 'shared' and span not in (ref, ref+':'+ref):
+                # its dependents hold only the shared index, si
+                raise ValueError("cannot overwrite %s, the master cell of "
+                                 "shared formula %s" % (ref, span))
+            self.formulas.append(ref)
+        new = {'r': posn2ref(col, self.row)}
+        if 's' in attrs:
+            new['s'] = attrs['s']
+        self._new_cell(new, value)
+
+    def _new_cell(self, attrs, value):
+        if isinstance(value, float):
+            self.out.startElement(self.C, attrs)
+            self.element(self.V, {}, repr(value))
+        else:
+            attrs['t'] = 'inlineStr'
+            self.out.startElement(self.C, attrs)
+            self.out.startElement(self.IS, {})
+            t_attrs = {}
+            if value != value.strip():
+                t_attrs['xml:space'] = 'preserve'
+            self.element(self.T, t_attrs, value)
+            self.out.endElement(self.IS)
+        self.out.endElement(self.C)
+
+
+class _CalcChainFilter(EventFilter):
+    """
+    SAX filter dropping calculation chain entries, given as a set of
+    (sheetId, cell name), for formulas that were overwritten. The sheet
+    id is sticky between entries, so kept entries are given it explicitly.
+    """
+
+    def __init__(self, out, dropped):
+        EventFilter.__init__(self, out)
+        self.dropped = dropped
+        self.sheetid = None
+
+    def prepare(self):
+        self.C = self.qname(NS_MAIN, 'c', '')
+
+    def start(self, name, attrs):
+        return name == self.C
+
+    def flush(self, events):
+        attrs = dict(events[0][2])
+        self.sheetid = attrs.get('i', self.sheetid)
+        if (self.sheetid, attrs.get('r')) in self.dropped:
+            return
+        if self.sheetid is not None:
+            attrs['i'] = self.sheetid
+        self.replay([(events[0][0], events[0][1], attrs)] + events[1:])
@@ -0,0 +1,348 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: spreadsheet.api.zipdoc")
+
+import os
+import stat
+import zipfile
+import tempfile
+import xml.sax
+from xml.sax.saxutils import XMLGenerator
+from contextlib import contextmanager
+
+from . factory import SpreadsheetAPI
+from . ziprewrite import ZipRewriter
+from util.fileio import atomic_replace
+
+CLEAR = None  # pending update that clears a cell
+
+
+class ZipDocument(SpreadsheetAPI):
+    """
+    Base class for backends that read and update a zipped XML workbook
+    file directly, without an office suite.
+
+    Writes and clears are kept as a pending diff of cell updates, which
+    reads see, until save(). save() writes a new archive through a
+    ZipRewriter, replaced atomically, or written to output if given. The
+    outermost batch() saves on a clean exit.
+
+    Subclasses define REQUIRED, the member that must exist, and
+
+      _scan(zf, sheetname, start_col, start_row, end_col, end_row)
+          returns {row: {col: text}} for the non-empty cells in bounds.
+      _rewrite(zw, updates)
+          writes every member to ZipRewriter zw, applying updates, a copy
+          of the pending diff the method may consume.
+
+    Constructor
+      ZipDocument(path, output=None)
+
+    Methods
+      (all SpreadsheetAPI methods)
+
+      save()         apply pending updates to the file; returns number of
+                     cells updated.
+      pending()      returns number of cells with pending updates.
+      messages()     returns list of (title, text) shown by show_box.
+
+    Raises
+      AttributeError  if path is not a readable zip archive with the
+                      REQUIRED member.
+    """
+
+    REQUIRED = None
+
+    def __init__(self, path=None, output=None):
+        if path is None:
+            raise AttributeError("missing document path")
+        try:
+            with zipfile.ZipFile(path) as zf:
+                zf.getinfo(self.REQUIRED)
+        except Exception as e:
+            raise AttributeError("could not open document: %s" % str(e))
+        self.path = path
+        self.output = output
+        self.updates = {}  # sheetname => {row: {col: value or CLEAR}}
+        self.shown = []
+        self._batch_depth = 0
+
+    def pending(self):
+        return sum(len(cols) for rows in self.updates.values()
+                   for cols in rows.values())
+
+    def messages(self):
+        return self.shown
+
+    #@override
+    @contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield self
+        except:
+            self._batch_depth -= 1
+            raise
+        self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.save()
+
+    #@override
+    def clear_cell(self, sheetname, col, row):
+        self._update(sheetname, col, row, CLEAR)
+
+    #@override
+    def clear_range(self, sheetname, cells):
+        ((start_col, start_row), (end_col, end_row)) = cells.posn()
+        for row in range(start_row, end_row+1):
+            for col in range(start_col, end_col+1):
+                self._update(sheetname, col, row, CLEAR)
+
+    #@override
+    def read_cell_string(self, sheetname, col, row):
+        return self._read(sheetname, col, row, col, row)[0][0]
+
+    #@override
+    def read_range(self, sheetname, cells):
+        ((start_col, start_row), (end_col, end_row)) = cells.posn()
+        return self._read(sheetname, start_col, start_row, end_col, end_row)
+
+    #@override
+    def write_cell_numeric(self, sheetname, col, row, value):
+        self._update(sheetname, col, row, float(value))
+
+    #@override
+    def write_cell_boolean(self, sheetname, col, row, value):
+        self._update(sheetname, col, row, float(self._as_boolean(value)))
+
+    #@override
+    def write_cell_string(self, sheetname, col, row, value):
+        self._update(sheetname, col, row, str(value))
+
+    #@override
+    def write_range(self, sheetname, cells, rows):
+        ((start_col, start_row), _) = cells.posn()
+        for r, values in enumerate(rows):
+            for c, value in enumerate(values):
+                if not isinstance(value, float):
+                    value = str(value)
+                self._update(sheetname, start_col+c, start_row+r, value)
+
+    #@override
+    def show_box(self, text, title, value=None):
+        Logger.info('%s: %s' % (title, text))
+        self.shown.append((title, text))
+        return 1
+
+    def save(self):
+        count = self.pending()
+        if count == 0:
+            return 0
+        target = self.output or self.path
+        fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(target)[1],
+                                   dir=os.path.dirname(os.path.abspath(target)))
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                zw = ZipRewriter(self.path, out)
+                try:
+                    self._rewrite(zw, self._copy_updates())
+                finally:
+                    zw.close()
+            # mkstemp files are 0600: keep the workbook's permissions
+            source = target if os.path.exists(target) else self.path
+            os.chmod(tmp, stat.S_IMODE(os.stat(source).st_mode))
+            atomic_replace(tmp, target)
+        except:
+            os.remove(tmp)
+            raise
+        Logger.debug('saved %d cells to %s' % (count, target))
+        self.updates = {}
+        self.path = target
+        return count
+
+    def _scan(self, zf, sheetname, start_col, start_row, end_col, end_row):
+        raise NotImplementedError()
+
+    def _rewrite(self, zw, updates):
+        raise NotImplementedError()
+
+    def _update(self, sheetname, col, row, value):
+        if not isinstance(col, int) or not isinstance(row, int):
+            raise TypeError("cell positions must be integers")
+        self.updates.setdefault(sheetname, {}).setdefault(row, {})[col] = value
+
+    def _copy_updates(self):
+        return dict((sheet, dict((row, dict(cols))
+                                 for row, cols in rows.items()))
+                    for sheet, rows in self.updates.items())
+
+    def _read(self, sheetname, start_col, start_row, end_col, end_row):
+        with zipfile.ZipFile(self.path) as zf:
+            found = self._scan(zf, sheetname,
+                               start_col, start_row, end_col, end_row)
+        pending = self.updates.get(sheetname, {})
+        data = []
+        for row in range(start_row, end_row+1):
+            values = found.get(row, {})
+            updates = pending.get(row, {})
+            line = []
+            for col in range(start_col, end_col+1):
+                if col in updates:
+                    line.append(as_string(updates[col]))
+                else:
+                    line.append(values.get(col, ''))
+            data.append(line)
+        return data
+
+
+def as_string(value):
+    """Cell value as displayed: numbers without a trailing '.0' if
+    integral, CLEAR as ''."""
+    if value is CLEAR:
+        return ''
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    return value
+
+
+def sax_filter(stream, handler):
+    """Parse stream with handler, qualified names as written."""
+    parser = xml.sax.make_parser()
+    parser.setFeature(xml.sax.handler.feature_namespaces, False)
+    parser.setContentHandler(handler)
+    parser.parse(stream)
+
+
+def xml_writer(out):
+    """XMLGenerator writing UTF-8 to the binary stream out, closing empty
+    elements short where the Python version can."""
+    try:
+        return XMLGenerator(out, 'utf-8', short_empty_elements=True)
+    except TypeError:  # Python2
+        return XMLGenerator(out, 'utf-8')
+
+
+class EventFilter(xml.sax.handler.ContentHandler):
+    """
+    SAX filter copying a document to an XMLGenerator. Qualified names are
+    used as written; qname() looks up prefixes from the root element's
+    namespace declarations.
+
+    Subclasses override the hooks
+
+      prepare()            called once namespace prefixes are known.
+      start(name, attrs)   returns True to buffer the element, otherwise
+                           it is copied.
+      end(name)            called before an unbuffered element is closed.
+      flush(events)        given a buffered element as a list of events
+                           ('start', name, attrs), ('end', name) and
+                           ('chars', text), writes it out.
+    """
+
+    def __init__(self, out):
+        xml.sax.handler.ContentHandler.__init__(self)
+        self.out = out
+        self.prefix = {}
+        self.depth = 0
+        self.buffer = None
+        self.buffer_depth = None
+
+    def prepare(self):
+        pass
+
+    def start(self, name, attrs):
+        return False
+
+    def end(self, name):
+        pass
+
+    def flush(self, events):
+        self.replay(events)
+
+    def qname(self, ns, name, default):
+        prefix = self.prefix.get(ns, default)
+        if prefix:
+            return prefix + ':' + name
+        return name
+
+    def replay(self, events):
+        for event in events:
+            if event[0] == 'start':
+                self.out.startElement(event[1], event[2])
+            elif event[0] == 'end':
+                self.out.endElement(event[1])
+            else:
+                self.out.characters(event[1])
+
+    def children(self, events):
+        """Split the events inside a buffered element into one list per
+        child node."""
+        items, depth = [], 0
+        for event in events[1:-1]:
+            if depth == 0:
+                items.append([])
+            items[-1].append(event)
+            if event[0] == 'start':
+                depth += 1
+            elif event[0] == 'end':
+                depth -= 1
+        return items
+
+    def element(self, name, attrs, text=None):
+        self.out.startElement(name, attrs)
+        if text is not None:
+            self.out.characters(text)
+        self.out.endElement(name)
+
+    ########################################
+    # SAX events
+
+    def startDocument(self):
+        self.out.startDocument()
+
+    def endDocument(self):
+        self.out.endDocument()
+
+    def startElement(self, name, attrs):
+        attrs = dict(attrs.items())
+        if self.depth == 0:
+            for key, value in attrs.items():
+                if key == 'xmlns':
+                    self.prefix[value] = ''
+                elif key.startswith('xmlns:'):
+                    self.prefix[value] = key[6:]
+            self.prepare()
+        self.depth += 1
+
+        if self.buffer is not None:
+            self.buffer.append(('start', name, attrs))
+        elif self.start(name, attrs):
+            self.buffer = [('start', name, attrs)]
+            self.buffer_depth = self.depth - 1
+        else:
+            self.out.startElement(name, attrs)
+
+    def endElement(self, name):
+        self.depth -= 1
+        if self.buffer is not None:
+            self.buffer.append(('end', name))
+            if self.depth == self.buffer_depth:
+                events, self.buffer = self.buffer, None
+                self.flush(events)
+            return
+        self.end(name)
+        self.out.endElement(name)
+
+    def characters(self, content):
+        if self.buffer is not None:
+            self.buffer.append(('chars', content))
+        else:
+            self.out.characters(content)
+
+    def ignorableWhitespace(self, content):
+        self.characters(content)
+
+    def processingInstruction(self, target, data):
+        self.out.processingInstruction(target, data)
@@ -0,0 +1,182 @@
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: spreadsheet.api.ziprewrite")
+
+import io
+import zlib
+import struct
+import zipfile
+
+# zip record layouts, as in the zipfile module
+_LOCAL = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL = struct.Struct('<4s4B4HL2L5H2L')
+_END = struct.Struct('<4s4H2LH')
+
+_LOCAL_SIG = b'PK\x03\x04'
+_CENTRAL_SIG = b'PK\x01\x02'
+_END_SIG = b'PK\x05\x06'
+_DESCRIPTOR_SIG = b'PK\x07\x08'
+
+_FLAG_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+
+class ZipRewriter(object):
+    """
+    Writes a copy of a zip archive in which chosen members are replaced
+    and all others are copied byte for byte, without decompressing or
+    recompressing them. Member order is preserved, eg., an ODF mimetype
+    stays first and stored.
+
+    Replacement members are deflated as they are written, so they can be
+    streamed from a parser without holding them in memory. Zip64 archives
+    are not supported.
+
+    Usage
+      with open(dst, 'wb') as out:
+          zw = ZipRewriter(src, out)
+          for info in zw.infolist():
+              if info.filename == 'content.xml':
+                  stream = zw.open_member(info)
+                  stream.write(data)   # bytes, any number of times
+                  stream.close()
+              else:
+                  zw.copy_member(info)
+          zw.close()
+
+    Methods
+      infolist()          returns ZipInfo list of the source archive.
+      open_source(info)   returns a readable stream of a source member.
+      copy_member(info)   copies a source member unchanged.
+      open_member(info)   returns a writable stream for a replacement of
+                          member info, deflated as it is written.
+      close()             writes the central directory and closes the
+                          source.
+    """
+
+    BufferSize = 1 << 16
+
+    def __init__(self, src, out):
+        self.src = zipfile.ZipFile(src)
+        self.raw = open(src, 'rb')
+        self.out = out
+        self.offset = 0
+        self.central = []
+
+    def infolist(self):
+        return self.src.infolist()
+
+    def open_source(self, info):
+        return self.src.open(info)
+
+    def copy_member(self, info):
+        if info.file_size >= 0xffffffff or info.header_offset >= 0xffffffff:
+            raise ValueError("zip64 member '%s' not supported" % info.filename)
+        self.raw.seek(info.header_offset)
+        header = self.raw.read(_LOCAL.size)
+        fields = _LOCAL.unpack(header)
+        if fields[0] != _LOCAL_SIG:
+            raise ValueError("bad local header for '%s'" % info.filename)
+        length = _LOCAL.size + fields[10] + fields[11] + info.compress_size
+        if info.flag_bits & _FLAG_DESCRIPTOR:
+            self.raw.seek(info.header_offset + length)
+            length += 16 if self.raw.read(4) == _DESCRIPTOR_SIG else 12
+
+        self.raw.seek(info.header_offset)
+        self._add_central(info, info.flag_bits, info.compress_type,
+                          info.CRC, info.compress_size, info.file_size)
+        while length > 0:
+            chunk = self.raw.read(min(length, 1 << 16))
+            if not chunk:
+                raise ValueError("truncated member '%s'" % info.filename)
+            self._write(chunk)
+            length -= len(chunk)
+
+    def open_member(self, info):
+        # buffered, as XML writers emit many small strings
+        return io.BufferedWriter(_MemberWriter(self, info), self.BufferSize)
+
+    def close(self):
+        start = self.offset
+        for record in self.central:
+            self._write(record)
+        self._write(_END.pack(_END_SIG, 0, 0, len(self.central),
+                              len(self.central), self.offset - start,
+                              start, 0))
+        self.raw.close()
+        self.src.close()
+
+    def _name(self, info):
+        try:
+            return info.filename.encode('ascii'), 0
+        except UnicodeEncodeError:
+            return info.filename.encode('utf-8'), _FLAG_UTF8
+
+    def _add_central(self, info, flags, method, crc, csize, usize):
+        name, _ = self._name(info)
+        dostime, dosdate = _dos_datetime(info.date_time)
+        record = _CENTRAL.pack(
+            _CENTRAL_SIG, info.create_version, info.create_system,
+            info.extract_version, info.reserved, flags, method,
+            dostime, dosdate, crc, csize, usize, len(name), len(info.extra),
+            len(info.comment), 0, info.internal_attr, info.external_attr,
+            self.offset)
+        self.central.append(record + name + info.extra + info.comment)
+
+    def _write(self, data):
+        self.out.write(data)
+        self.offset += len(data)
+
+
+class _MemberWriter(io.RawIOBase):
+    """Deflating writer for one replacement member, sizes and CRC given
+    in a trailing data descriptor."""
+
+    def __init__(self, zw, info):
+        self.zw = zw
+        self.info = info
+        self.start = zw.offset
+        self.crc = 0
+        self.csize = 0
+        self.usize = 0
+        self.deflate = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                                        zlib.DEFLATED, -zlib.MAX_WBITS)
+        name, utf8 = zw._name(info)
+        self.flags = _FLAG_DESCRIPTOR | utf8
+        dostime, dosdate = _dos_datetime(info.date_time)
+        zw._write(_LOCAL.pack(_LOCAL_SIG, 20, 0, self.flags,
+                              zipfile.ZIP_DEFLATED, dostime, dosdate,
+                              0, 0, 0, len(name), 0) + name)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = memoryview(data).tobytes()  #bytes(view) is its repr on 2.7
+        self.crc = zlib.crc32(data, self.crc) & 0xffffffff
+        self.usize += len(data)
+        self._emit(self.deflate.compress(data))
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self._emit(self.deflate.flush())
+        self.zw._write(struct.pack('<4s3L', _DESCRIPTOR_SIG, self.crc,
+                                   self.csize, self.usize))
+        offset, self.zw.offset = self.zw.offset, self.start
+        self.info.extract_version = max(self.info.extract_version, 20)
+        self.zw._add_central(self.info, self.flags, zipfile.ZIP_DEFLATED,
+                             self.crc, self.csize, self.usize)
+        self.zw.offset = offset
+        io.RawIOBase.close(self)
+
+    def _emit(self, data):
+        self.csize += len(data)
+        self.zw._write(data)
+
+
+def _dos_datetime(date_time):
+    (y, mo, d, h, mi, s) = date_time
+    return ((h << 11) | (mi << 5) | (s // 2),
+            ((max(y, 1980) - 1980) << 9) | (mo << 5) | d)
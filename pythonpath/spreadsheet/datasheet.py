@@ -2,6 +2,8 @@ import logging
 Logger = logging.getLogger('LoadPrices')
 Logger.debug("Load: spreadsheet.datasheet")
 
+from collections import OrderedDict
+
 from spreadsheet import CellRange
 
 
@@ -39,6 +41,27 @@ def asCellRange(item, template=None):
     raise TypeError("unexpected type '%s'" % str(item))
 
 
+def contiguous_runs(mask):
+    """
+    contiguous_runs(list_of_bool)  return a list of (first, last) index
+                                   pairs, inclusive, for each run of True
+                                   values in the list.
+
+    Example:
+      contiguous_runs([True, True, False, True])  =>  [(0, 1), (3, 3)]
+    """
+    runs, first = [], None
+    for i, flag in enumerate(mask):
+        if flag and first is None:
+            first = i
+        elif not flag and first is not None:
+            runs.append((first, i-1))
+            first = None
+    if first is not None:
+        runs.append((first, len(mask)-1))
+    return runs
+
+
 class DataColumn(object):
     """
     Represents a spreadsheet column range as a CellRange object and a list
@@ -100,10 +123,14 @@ class DataFrame(object):
     Methods
       keycol()   returns keycol DataColumn.
       columns()  returns DataColumn list.
+      runs()     returns list of (first, last) row index pairs for each
+                 contiguous block of keyed rows.
+      keyrows()  returns dict of each distinct key to its row indices.
       update(dict[key] = [val1, val2, ...])
-                 iterates over self.keycol looking up keys in the supplied
-                 dict; values are written to the corresponding DataColumns
-                 to fill out the DataFrame.
+                 looks up each distinct key of self.keycol once in the
+                 supplied dict; values are written to the corresponding
+                 DataColumns of every row with that key to fill out the
+                 DataFrame.
     """
 
     def __init__(self, keycolumn, keyvals, datacols):
@@ -130,15 +157,28 @@ class DataFrame(object):
         #Logger.debug("has_data[%d]: %s" % (i, str(self.keyvec[i])))
         return self.keyvec[i]
 
+    def runs(self):
+        return contiguous_runs(self.keyvec)
+
     def update(self, datadict):
-        # iterate by row and terminate inner on column index failure
-        for r, key in enumerate(self.keycol.rows()):
+        # iterate by key, fanning out to its rows, and terminate inner on
+        # column index failure
+        for key, rows in self.keyrows().items():
+            values = datadict[key]
             for c, column in enumerate(self.cframe):
                 try:
-                    column[r] = datadict[key][c]
-                    Logger.debug("update: '%s'  (%d,%d)" % (key, c, r))
+                    value = values[c]
                 except IndexError:
                     break
+                for r in rows:
+                    column[r] = value
+                Logger.debug("update: '%s'  (%d,%s)" % (key, c, rows))
+
+    def keyrows(self):
+        index = OrderedDict()
+        for r, key in enumerate(self.keycol.rows()):
+            index.setdefault(key, []).append(r)
+        return index
 
     def __repr__(self):
         s = ','.join([str(f) for f in self.cframe])
@@ -155,15 +195,20 @@ class DataSheet(object):
     CellRange as its position (currently DataColumn).
 
     Methods
-      read_column(colid)   return DataColumn from spreadsheet.
+      read_column(colid)   return DataColumn from spreadsheet, read in one
+                           bulk read_range call.
 
       clear_cell(col, row)           clear cell at numeric (col,row).
       clear_column(DataFrame, colid) clear column given by 'colid' using
-                                     DataFrame to select cells.
+                                     DataFrame to select cells, one bulk
+                                     clear_range call per contiguous
+                                     block of selected cells.
       clear_frame(DataFrame)         clear cells given by DataFrame.
 
       write_cell(col, row, value)  write value to cell at numeric (col,row).
-      write_column(DataFrame, DataColumn)     write column from DataColumn.
+      write_column(DataFrame, DataColumn)     write column from DataColumn,
+                                   one bulk write_range call per
+                                   contiguous block of selected cells.
       write_frame(DataFrame)       write cells from DataFrame using
                                    DataFrame to select cells.
     """
@@ -195,10 +240,8 @@ class DataSheet(object):
     def read_column(self, column, truncate=False):
         cells = self._get_cells(column)
         ((start_col, start_row), (end_col, end_row)) = cells.posn()
-        data = [
-            self.read_cell(start_col, row)
-            for row in range(start_row, end_row+1)
-        ]
+        block = CellRange(start_col, start_row, start_col, end_row)
+        data = [row[0] for row in self.doc.read_range(self.sheet, block)]
         if truncate:
             length = self._find_length(data)
             data = data[:length]
@@ -220,10 +263,11 @@ class DataSheet(object):
             raise TypeError("unexpected type '%s'" % str(frame))
         cells = self._get_cells(column)
         #Logger.debug('clear_column: ' + str(cells))
-        ((start_col, start_row), (_, end_row)) = cells.posn()
-        for i, row in enumerate(range(start_row, end_row+1)):
-            if frame.has_data(i):
-                self.clear_cell(start_col, row)
+        ((start_col, start_row), _) = cells.posn()
+        for (first, last) in frame.runs():
+            block = CellRange(start_col, start_row + first,
+                              start_col, start_row + last)
+            self.doc.clear_range(self.sheet, block)
 
     def clear_frame(self, frame):
         if not isinstance(frame, DataFrame):
@@ -253,10 +297,22 @@ class DataSheet(object):
         cells = self._get_cells(column)
         #Logger.debug('write_column: ' + str(cells))
         ((start_col, start_row), (_, end_row)) = cells.posn()
-        for i, row in enumerate(range(start_row, end_row+1)):
-            if not frame.has_data(i):
-                continue
-            self.write_cell(start_col, row, column[i])
+        mask = [
+            frame.has_data(i) and column[i] is not None
+            for i in range(end_row - start_row + 1)
+        ]
+        for (first, last) in contiguous_runs(mask):
+            block = CellRange(start_col, start_row + first,
+                              start_col, start_row + last)
+            rows = [[self._as_value(column[i])] for i in range(first, last+1)]
+            self.doc.write_range(self.sheet, block, rows)
+
+    def _as_value(self, value):
+        # numbers as float, everything else as written
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return value
 
     def write_frame(self, frame):
         if not isinstance(frame, DataFrame):
@@ -0,0 +1 @@
+from util.fileio import atomic_replace
@@ -0,0 +1,19 @@
+###########################################################################
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: util.fileio")
+
+###########################################################################
+import os
+
+###########################################################################
+def atomic_replace(src, dst):
+    """
+    Rename file src over dst in one step, so readers of dst see either
+    the old or the new file, never a partial one. src is normally a
+    temporary file written in dst's folder.
+    """
+    try:
+        os.replace(src, dst)
+    except AttributeError:  # Python2: atomic on POSIX only
+        os.rename(src, dst)
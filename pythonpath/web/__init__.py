@@ -1 +1,5 @@
 from web.httpagent import HttpAgent
+from web.connpool import ConnectionPool
+from web.retry import RetryPolicy
+from web.throttle import HostLimits
+from web.singleflight import SingleFlight
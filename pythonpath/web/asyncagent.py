@@ -0,0 +1,288 @@
+###########################################################################
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: web.asyncagent")
+
+###########################################################################
+# Needs Python 3.6+ (async generators); importers should catch SyntaxError
+# as well as ImportError.
+###########################################################################
+import io
+import ssl
+import time
+import zlib
+import asyncio
+import threading
+from urllib.parse import urlsplit, urljoin
+from http.client import parse_headers
+
+from web.httpagent import HttpAgent, HTTPError, URLError, _Decoder
+
+###########################################################################
+class AsyncHttpAgent(HttpAgent):
+    """
+    HttpAgent whose fetch() is a coroutine, for one request among many
+    run concurrently in an asyncio event loop. Keeps the same record of
+    the request and the same diagnostics methods as HttpAgent, and uses
+    the same RetryPolicy, HostLimits and Cassette.
+
+    Requests are made over asyncio streams, one connection per try, and
+    are sent with 'Connection: close'.
+
+    Constructor and usage:
+
+    agent = AsyncHttpAgent(paramDict=None, retry=None, limits=None,
+                           cassette=None)
+
+    html = await agent.fetch(url)
+
+    If the coroutine is cancelled, the error is 'Cancelled'.
+    """
+
+    Header = dict(HttpAgent.Header, Connection='close')
+
+    def __init__(self, paramDict=None, retry=None, limits=None,
+                 cassette=None):
+        HttpAgent.__init__(self, paramDict, retry=retry, limits=limits,
+                           cassette=cassette)
+
+    #@override
+    async def fetch(self, url):
+        if self.cassette is not None and self.cassette.replaying():
+            delay = self._replay(url)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return self.state['html']
+        start = self._start(url)
+        if start is None:
+            return self.state['html']
+        started = time.time()
+        try:
+            await self._fetch(url, *start)
+        except asyncio.CancelledError:
+            self.state['error'] = 'Cancelled'
+            raise
+        self._record(url, started)
+        return self.state['html']
+
+    async def _fetch(self, url, policy, expires, host):
+        while True:
+            wait = self._admit(policy, expires, host)
+            if wait is None:
+                break  #fail fast, retries would only add load
+
+            try:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                response, html = await self._open(url, self.state['timeout'])
+            except asyncio.CancelledError:
+                if host is not None:
+                    #neither success nor failure, but may hold the trial
+                    #of a half-open circuit
+                    self.limits.breaker(host).release()
+                raise
+            except Exception as e:
+                delay = self._failed(e, policy, expires, host)
+            else:
+                self._succeeded(response, html, host)
+                break  #got something
+
+            if delay is None:
+                break  #give up
+
+            Logger.debug('retry in {:.2f}s'.format(delay))
+            await asyncio.sleep(delay)
+            self.state['tries'] += 1
+
+    #@override
+    async def _open(self, url, timeout):
+        for _ in range(self.MaxRedirects + 1):
+            try:
+                response, text = await asyncio.wait_for(
+                    self._request(url, timeout), timeout)
+            except asyncio.TimeoutError:
+                raise URLError('timed out')
+            location = response.getheader('Location')
+            if response.status not in self.Redirect_Codes or not location:
+                break
+            url = urljoin(url, location)
+            Logger.debug('redirect {!s} {}'.format(response.status, url))
+        else:
+            raise URLError('too many redirects')
+
+        if response.status >= 400:
+            raise HTTPError(response.status, response.msg)
+        response.realurl = url
+        return response, text
+
+    #@override
+    async def _request(self, url, timeout):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError("unknown url type: '{}'".format(url))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        try:
+            reader, writer = await asyncio.open_connection(
+                parts.hostname, port,
+                ssl=ssl.create_default_context() if secure else None)
+        except (OSError, ssl.SSLError) as e:
+            raise URLError(e)
+        try:
+            lines = ['GET {} HTTP/1.1'.format(path),
+                     'Host: {}'.format(parts.netloc)]
+            lines += ['{}: {}'.format(k, v) for (k, v) in
+                      sorted(self.Header.items())]
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+            return await self._read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, zlib.error) as e:
+            raise URLError(e)
+        finally:
+            writer.close()
+
+    async def _read_response(self, reader):
+        status = (await reader.readline()).decode('latin-1').split(None, 2)
+        if len(status) < 2 or not status[0].startswith('HTTP/'):
+            raise URLError('bad status line: {!r}'.format(' '.join(status)))
+        head = []
+        while head[-1:] not in ([b'\r\n'], [b'\n'], [b'']):
+            head.append(await reader.readline())
+        head = b''.join(head)
+        response = _Response(int(status[1]), parse_headers(io.BytesIO(head)))
+
+        decoder = _Decoder(response.getheader('Content-Encoding'))
+        text = []
+        async for chunk in self._read_chunks(reader, response):
+            text.append(decoder.decode(chunk))
+        text.append(decoder.flush())
+
+        self.state['wire'] = decoder.wire
+        self.state['body'] = decoder.body
+        return response, ''.join(text)
+
+    async def _read_chunks(self, reader, response):
+        """Yields the body as sent: chunked, sized or up to EOF."""
+        if response.status in (204, 304) or 100 <= response.status < 200:
+            return
+        chunked = response.getheader('Transfer-Encoding', '').lower()
+        if 'chunked' in chunked:
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b''):
+                        pass  #trailers
+                    return
+                yield await reader.readexactly(size)
+                await reader.readline()
+        length = response.getheader('Content-Length')
+        if length is not None:
+            left = int(length)
+            while left > 0:
+                chunk = await reader.readexactly(min(left, self.ChunkSize))
+                left -= len(chunk)
+                yield chunk
+            return
+        while True:
+            chunk = await reader.read(self.ChunkSize)
+            if not chunk:
+                return
+            yield chunk
+
+class _Response(object):
+    """The parts of an http.client.HTTPResponse that HttpAgent uses."""
+    def __init__(self, status, msg):
+        self.status = status
+        self.msg = msg
+        self.realurl = None
+
+    def getheader(self, name, default=None):
+        return self.msg.get(name, default)
+
+###########################################################################
+class AsyncEngine(object):
+    """
+    Synchronous facade over AsyncHttpAgent: fetches many URLs concurrently
+    in a private event loop, with at most workers requests in flight, and
+    no thread per request.
+
+    Constructor and usage:
+
+    engine = AsyncEngine(workers=8, paramDict=None, retry=None, limits=None,
+                         cassette=None)
+
+    agents = engine.fetch_all(urls)
+    pages = [agent.html() for agent in agents if agent.ok()]
+
+    Public methods:
+
+    fetch_all(urls, timeout=None, fail_fast=True)
+                   fetches urls and returns one AsyncHttpAgent per URL, in
+                   URL order, with its diagnostics. Fetches still running
+                   after timeout seconds, or after any fetch fails if
+                   fail_fast, are cancelled and fail with 'Cancelled'.
+    cancel()       cancels the running fetch_all() from another thread.
+    """
+
+    Workers = 8
+
+    def __init__(self, workers=Workers, paramDict=None, retry=None,
+                 limits=None, cassette=None):
+        self.workers = max(1, int(workers))
+        self.params = paramDict
+        self.retry = retry
+        self.limits = limits
+        self.cassette = cassette
+        self.lock = threading.Lock()
+        self.loop = None
+        self.tasks = []
+
+    def fetch_all(self, urls, timeout=None, fail_fast=True):
+        loop = asyncio.new_event_loop()
+        with self.lock:
+            self.loop = loop
+        try:
+            return loop.run_until_complete(
+                self._gather(list(urls), timeout, fail_fast))
+        finally:
+            with self.lock:
+                self.loop, self.tasks = None, []
+            loop.close()
+
+    def cancel(self):
+        with self.lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self._cancel)
+
+    def _cancel(self):
+        for task in self.tasks:
+            task.cancel()
+
+    async def _gather(self, urls, timeout, fail_fast):
+        semaphore = asyncio.Semaphore(self.workers)
+        agents = [AsyncHttpAgent(self.params, self.retry, self.limits,
+                                 self.cassette)
+                  for url in urls]
+        for agent in agents:
+            agent.state['error'] = 'Cancelled'  #until its fetch starts
+
+        async def fetch(i):
+            async with semaphore:
+                Logger.debug('url: ' + urls[i])
+                await agents[i].fetch(urls[i])
+            if fail_fast and agents[i].failed():
+                self._cancel()
+
+        loop = asyncio.get_event_loop()
+        with self.lock:
+            self.tasks = [loop.create_task(fetch(i))
+                          for i in range(len(urls))]
+        if self.tasks:
+            done, pending = await asyncio.wait(self.tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        return agents
@@ -0,0 +1,177 @@
+###########################################################################
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: web.cassette")
+
+###########################################################################
+import os
+import gzip
+import json
+import time
+import tempfile
+import threading
+
+from util.fileio import atomic_replace
+
+###########################################################################
+class Cassette(object):
+    """
+    Thread-safe record of HTTP exchanges for offline, reproducible runs.
+
+    In 'record' mode HttpAgents add each request they make, its method,
+    URL and headers, with the response they get, its status, real URL,
+    headers, page and byte counts, and the time the fetch took; save()
+    writes them to path. In 'replay' mode the recording at path is loaded
+    and HttpAgents serve responses from it instead of the network,
+    optionally sleeping latency times the recorded time to simulate the
+    network. A request is matched on its method, URL and headers, less
+    the hop-by-hop ones such as Connection. A request recorded more than
+    once is replayed in recorded order, the last response repeating.
+
+    The cassette is gzip compressed JSON, one exchange per line.
+
+    Constructor and usage:
+
+    with Cassette('yahoo.jsonl.gz', 'record') as cassette:
+        HttpAgent(cassette=cassette).fetch(url)
+
+    agent = HttpAgent(cassette=Cassette('yahoo.jsonl.gz', latency=1))
+    html = agent.fetch(url)
+
+    Public methods:
+
+    recording()    returns True in 'record' mode.
+    replaying()    returns True in 'replay' mode.
+    record(url, state, elapsed, method='GET', headers=None)
+                   adds the request and the response in an HttpAgent's
+                   state dict.
+    play(url, method='GET', headers=None)
+                   returns the next recorded exchange for the request as
+                   a dict, or None.
+    delay(exchange)
+                   returns seconds to wait to simulate the exchange.
+    save()         writes the recorded exchanges to path.
+    stats()        returns a dict of counters: recorded, played, missed.
+
+    Raises
+      AttributeError  for an unknown mode.
+      IOError         if a cassette to replay cannot be read.
+    """
+
+    RECORD, REPLAY = 'record', 'replay'
+
+    # HttpAgent state recorded for each exchange
+    FIELDS = ['url', 'realurl', 'status', 'info', 'html', 'wire', 'body']
+
+    # request headers about the connection, not the resource: ignored
+    # when matching requests, so any HttpAgent can replay a recording
+    HOP_BY_HOP = ['connection', 'keep-alive', 'proxy-connection', 'te',
+                  'trailer', 'transfer-encoding', 'upgrade']
+
+    def __init__(self, path, mode=REPLAY, latency=0, sleep=time.sleep):
+        if mode not in (self.RECORD, self.REPLAY):
+            raise AttributeError("unknown cassette mode '%s'" % str(mode))
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.exchanges = []
+        self.queues = {}  #request key => list of exchanges still to play
+        self.played = 0
+        self.missed = 0
+        if mode == self.REPLAY:
+            self._load()
+
+    def recording(self): return self.mode == self.RECORD
+
+    def replaying(self): return self.mode == self.REPLAY
+
+    def record(self, url, state, elapsed, method='GET', headers=None):
+        exchange = dict((name, state[name]) for name in self.FIELDS)
+        exchange['method'] = method
+        exchange['url'] = url
+        exchange['request'] = sorted([k, v] for (k, v) in
+                                     dict(headers or {}).items())
+        exchange['info'] = _header_items(state['info'])
+        exchange['elapsed'] = round(elapsed, 6)
+        with self.lock:
+            self.exchanges.append(exchange)
+
+    def play(self, url, method='GET', headers=None):
+        key = self._key(method, url, dict(headers or {}).items())
+        with self.lock:
+            queue = self.queues.get(key)
+            if not queue:
+                self.missed += 1
+                return None
+            self.played += 1
+            return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    def delay(self, exchange):
+        return exchange['elapsed'] * self.latency
+
+    def save(self):
+        with self.lock:
+            exchanges = list(self.exchanges)
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=folder)
+        try:
+            with os.fdopen(fd, 'wb') as raw, \
+                 gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                for exchange in exchanges:
+                    line = json.dumps(exchange, separators=(',', ':'))
+                    f.write(line.encode('utf-8') + b'\n')
+            atomic_replace(tmp, self.path)
+        except:
+            os.remove(tmp)
+            raise
+        Logger.info('cassette: saved {!s} exchanges to {}'.format(
+            len(exchanges), self.path))
+
+    def stats(self):
+        with self.lock:
+            return {'recorded': len(self.exchanges), 'played': self.played,
+                    'missed': self.missed}
+
+    def __len__(self):
+        return len(self.exchanges)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.recording():
+            self.save()
+        return False
+
+    def _load(self):
+        with gzip.open(self.path, 'rb') as f:
+            for line in f:
+                exchange = json.loads(line.decode('utf-8'))
+                self.exchanges.append(exchange)
+                key = self._key(exchange['method'], exchange['url'],
+                                exchange['request'])
+                self.queues.setdefault(key, []).append(exchange)
+        Logger.debug('cassette: loaded {!s} exchanges from {}'.format(
+            len(self.exchanges), self.path))
+
+    def _key(self, method, url, headers):
+        headers = sorted((k.lower(), v.strip()) for (k, v) in headers
+                         if k.lower() not in self.HOP_BY_HOP)
+        return (method.upper(), url, tuple(headers))
+
+def _header_items(info):
+    """[name, value] pairs of response headers, in order and with names
+    as sent."""
+    lines = getattr(info, 'headers', None)
+    if not isinstance(lines, list):
+        return [[k, v] for (k, v) in (info or {}).items()]
+    items = []  #Python2 mimetools.Message: only its raw lines keep case
+    for line in lines:
+        if line[:1] in (' ', '\t') and items:
+            items[-1][1] += ' ' + line.strip()  #folded
+        elif ':' in line:
+            name, value = line.split(':', 1)
+            items.append([name.strip(), value.strip()])
+    return items
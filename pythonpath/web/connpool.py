@@ -0,0 +1,146 @@
+###########################################################################
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: web.connpool")
+
+###########################################################################
+import time
+import threading
+try:
+    #Python3
+    from http.client import HTTPConnection, HTTPSConnection
+except:
+    #Python2
+    from httplib import HTTPConnection, HTTPSConnection
+
+###########################################################################
+class ConnectionPool(object):
+    """
+    Thread-safe pool of idle keep-alive HTTP(S) connections, keyed by
+    (scheme, host, port), so that consecutive requests to the same host
+    skip DNS, TCP and TLS setup.
+
+    Constructor and usage:
+
+    pool = ConnectionPool(maxsize=8, idle_timeout=60)
+
+    conn = pool.acquire('https', 'query1.finance.yahoo.com', None, 10)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    body = response.read()
+    if response.will_close:
+        pool.discard(conn)
+    else:
+        pool.release(conn)
+
+    Public methods:
+
+    acquire(scheme, host, port, timeout)
+                   returns an idle connection for that host if one is
+                   available, otherwise a new one. The connection belongs
+                   to the caller until released or discarded.
+    release(conn)  returns a connection to the pool. If the pool is full
+                   the longest idle connection is closed.
+    discard(conn)  closes a connection that must not be reused.
+    evict()        closes connections idle longer than idle_timeout.
+    clear()        closes all idle connections.
+    is_reused(conn)
+                   returns True if conn came from the pool, ie., it may
+                   have been closed by the server while idle.
+    stats()        returns a dict of counters: created, reused, idle.
+    """
+
+    MaxSize     = 8   #idle connections kept over all hosts
+    IdleTimeout = 60  #seconds before an idle connection is closed
+
+    def __init__(self, maxsize=MaxSize, idle_timeout=IdleTimeout):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.idle = []  #list of (last_used, key, conn), oldest first
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, scheme, host, port=None, timeout=None):
+        key = (scheme, host, port)
+        self.evict()
+        while True:
+            conn = self._pop_idle(key)
+            if conn is None:
+                break
+            try:
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+            except Exception:
+                conn.close()  #socket went bad while idle
+                continue
+            conn._pool_reused = True
+            conn._pool_key = key
+            return conn
+
+        with self.lock:
+            self.created += 1
+        conn = self._connect(scheme, host, port, timeout)
+        conn._pool_reused = False
+        conn._pool_key = key
+        return conn
+
+    def release(self, conn):
+        closing = []
+        with self.lock:
+            self.idle.append((time.time(), conn._pool_key, conn))
+            while len(self.idle) > self.maxsize:
+                closing.append(self.idle.pop(0)[2])
+        for c in closing:
+            c.close()
+
+    def discard(self, conn):
+        conn.close()
+
+    def evict(self):
+        limit = time.time() - self.idle_timeout
+        with self.lock:
+            stale = [c for (t, k, c) in self.idle if t < limit]
+            self.idle = [e for e in self.idle if e[0] >= limit]
+        for conn in stale:
+            Logger.debug('evict idle connection {!s}'.format(conn._pool_key))
+            conn.close()
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for (t, k, conn) in idle:
+            conn.close()
+
+    def is_reused(self, conn):
+        return getattr(conn, '_pool_reused', False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'created': self.created,
+                'reused':  self.reused,
+                'idle':    len(self.idle),
+            }
+
+    def _pop_idle(self, key):
+        with self.lock:
+            for i in range(len(self.idle)-1, -1, -1):  #most recent first
+                if self.idle[i][1] == key:
+                    self.reused += 1
+                    return self.idle.pop(i)[2]
+        return None
+
+    def _connect(self, scheme, host, port, timeout):
+        Logger.debug('connect {}://{}:{!s}'.format(scheme, host, port))
+        if scheme == 'https':
+            return HTTPSConnection(host, port, timeout=timeout)
+        return HTTPConnection(host, port, timeout=timeout)
+
+###########################################################################
+#process-wide pool shared by all HttpAgents, eg., across macro calls in one
+#LibreOffice session
+POOL = ConnectionPool()
+
+###########################################################################
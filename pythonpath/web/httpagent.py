@@ -4,16 +4,47 @@ Logger = logging.getLogger('LoadPrices')
 Logger.debug("Load: web.httpagent")
 
 ###########################################################################
+import io
 import sys
+import time
+import zlib
+import errno
+import codecs
+import socket
 try:
     #Python3
-    from urllib.request import Request, urlopen
-    from urllib.error import URLError, HTTPError
-    from urllib.parse import urlencode
+    from urllib.parse import urlencode, urlsplit, urljoin
+    from http.client import HTTPException, BadStatusLine, parse_headers
 except:
     #Python2
-    from urllib2 import Request, urlopen, URLError, HTTPError
     from urllib import urlencode
+    from urlparse import urlsplit, urljoin
+    from httplib import HTTPException, BadStatusLine
+    from httplib import HTTPMessage as parse_headers
+
+from web.connpool import POOL
+from web.retry import RetryPolicy, parse_retry_after
+from web.throttle import LIMITS
+from web.singleflight import FLIGHTS, FlightTimeout
+
+###########################################################################
+class HTTPError(Exception):
+    """HTTP response with an error status code."""
+    def __init__(self, code, headers=None):
+        Exception.__init__(self, 'HTTP status {!s}'.format(code))
+        self.code = code
+        self.headers = headers
+
+    def retry_after(self):
+        if self.headers is None:
+            return None
+        return parse_retry_after(self.headers.get('Retry-After'))
+
+class URLError(Exception):
+    """Failure to reach the server."""
+    def __init__(self, reason):
+        Exception.__init__(self, str(reason))
+        self.reason = reason
 
 ###########################################################################
 class HttpAgent(object):
@@ -25,9 +56,37 @@ class HttpAgent(object):
     (4) returned header info, (5) number of tries, (6) maximum tries allowed,
     (7) last request timeout, (8) last exception message, (9) the page itself.
 
+    Requests go over keep-alive connections borrowed from a ConnectionPool,
+    by default the process-wide web.connpool.POOL, so repeated fetches from
+    the same host reuse one socket. Redirects are followed.
+
+    Failed tries are retried as directed by a RetryPolicy, by default one
+    allowing MaxTries tries within RetryPolicy.Deadline seconds: network
+    errors, 429 and transient 5xx statuses are retried after a jittered
+    exponential backoff or the server's Retry-After, other HTTP errors
+    are not. Each try has the same timeout, cut short by the deadline.
+
+    Every try first takes a token from its host's TokenBucket and asks its
+    host's CircuitBreaker, both from a HostLimits registry, by default the
+    process-wide web.throttle.LIMITS. While a host's circuit is open its
+    fetches fail at once with a 'CircuitOpen' error.
+
+    Concurrent fetches of the same URL are coalesced by a SingleFlight, by
+    default the process-wide web.singleflight.FLIGHTS: one agent fetches,
+    the others wait and receive a copy of its record as their own. Only
+    agents that would make the same fetch share one: the same headers and
+    parameters, pool, RetryPolicy, HostLimits and Cassette. A waiting
+    agent gives up after its RetryPolicy's deadline with a 'FlightTimeout'
+    error.
+
+    Given a web.cassette.Cassette, responses are recorded to it or, when
+    replaying, served from it without touching the network; a request
+    missing from a cassette being replayed fails with a 'Cassette' error.
+
     Constructor and usage:
 
-    agent = Web.HttpAgent()
+    agent = Web.HttpAgent(paramDict=None, pool=None, retry=None, limits=None,
+                          flight=None, cassette=None)
 
     html = agent.fetch(url)
 
@@ -54,27 +113,46 @@ class HttpAgent(object):
     error()        returns exception/error condition.
     info()         returns server headers as a dict (Content-Type, etc.)
     html()         returns already fetched web page.
-
-    See: https://docs.python.org/3.4/howto/urllib2.html  (Python3)
-         https://docs.python.org/2/howto/urllib2.html    (Python2)
+    wire_bytes()   returns size of the page body as transferred.
+    body_bytes()   returns size of the page body after decompression.
+    circuit()      returns the circuit state of the URL's host: 'closed',
+                   'open' or 'half-open'.
+    circuit_open() returns True if the fetch was refused by an open circuit.
+    shared()       returns True if the page came from another agent's fetch.
+
+    Responses are requested gzip or deflate compressed and decompressed
+    chunk by chunk as they are read.
+
+    See: https://docs.python.org/3/library/http.client.html  (Python3)
+         https://docs.python.org/2/library/httplib.html      (Python2)
     """
 
     Header = {
         'User-Agent': 'Mozilla/5.0 AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
-        'Accept-Encoding': 'none',
+        'Accept-Encoding': 'gzip, deflate',
         'Accept-Language': 'en-US,en;q=0.8',
         'Connection': 'keep-alive',
     }
 
-    Deft_Html    = 'no response'
-    Deft_Timeout = 10
-    MaxTries     = 5
-    NoError      = None
+    Deft_Html     = 'no response'
+    Deft_Timeout  = 10
+    MaxTries      = 5
+    MaxRedirects  = 5
+    ChunkSize     = 16384
+    NoError       = None
+
+    Redirect_Codes = (301, 302, 303, 307, 308)
 
-    def __init__(self, paramDict=None):
+    def __init__(self, paramDict=None, pool=None, retry=None, limits=None,
+                 flight=None, cassette=None):
         self.params = paramDict
+        self.pool = pool if pool is not None else POOL
+        self.retry = retry
+        self.limits = limits if limits is not None else LIMITS
+        self.flight = flight if flight is not None else FLIGHTS
+        self.cassette = cassette
         self.state = {
             'url':     None,  #supplied url
             'realurl': None,  #actual url retrieved (possible redirect)
@@ -84,6 +162,9 @@ class HttpAgent(object):
             'timeout': None,  #timeout of last try
             'info':    None,  #meta info
             'html':    None,  #the retrieved page
+            'wire':    None,  #body bytes transferred
+            'body':    None,  #body bytes after decompression
+            'shared':  None,  #record copied from a concurrent fetch
         }
         self._reset_state()
 
@@ -106,56 +187,263 @@ class HttpAgent(object):
         self.state['timeout'] = get_sane_timeout()
         self.state['info']    = {}
         self.state['html']    = self.Deft_Html
+        self.state['wire']    = 0
+        self.state['body']    = 0
+        self.state['shared']  = False
 
     def fetch(self, url):
         if not isinstance(url, str):
             self.state['error'] = "URL must be a string '{}'".format(str(url))
             return self.state['html']
+        try:
+            state, shared = self.flight.do(self._flight_key(url),
+                                           lambda: self._fetch(url),
+                                           timeout=self.policy().deadline)
+        except FlightTimeout as e:
+            self._reset_state(url)
+            self.state['error'] = 'FlightTimeout: ' + str(e)
+            Logger.error(self.state['error'])
+            return self.state['html']
+        if shared:
+            self.state = dict(state, shared=True)
+        return self.state['html']
 
-        self._reset_state(url)
-
-        self.state['tries'] = 1
+    def _flight_key(self, url):
+        # fetches are only shared between agents that would make the same
+        # one; the objects are alive while in flight, so their ids are
+        # unique
+        return (url, tuple(sorted(self.Header.items())),
+                repr(sorted((self.params or {}).items())),
+                id(self.pool), id(self.retry), id(self.limits),
+                id(self.cassette))
+
+    def _fetch(self, url):
+        """Fetch url, or replay it; returns a copy of the record."""
+        if self.cassette is not None and self.cassette.replaying():
+            delay = self._replay(url)
+            if delay > 0:
+                self.cassette.sleep(delay)
+            return dict(self.state)
+        started = time.time()
+        self._fetch_live(url)
+        self._record(url, started)
+        return dict(self.state)
+
+    def _fetch_live(self, url):
+        start = self._start(url)
+        if start is None:
+            return
+        policy, expires, host = start
 
         while True:
-            Logger.debug('try {!s}/{!s}/{!s}'.format(self.state['tries'],
-                                                     self.MaxTries,
-                                                     self.state['timeout']))
+            wait = self._admit(policy, expires, host)
+            if wait is None:
+                break  #fail fast, retries would only add load
+            if wait > 0:
+                self.limits.sleep(wait)
 
             try:
-                req = Request(url, headers=self.Header)
-                response = urlopen(req, None, self.state['timeout'])  #with timeout
-            except HTTPError as e:
-                self.state['error'] = 'HTTPError: ' + str(e.code)
-            except URLError as e:
-                self.state['error'] = 'URLError: ' + str(e.reason)
+                response, html = self._open(url, self.state['timeout'])
             except Exception as e:
-                self.state['error'] = 'Exception: ' + str(e)
+                delay = self._failed(e, policy, expires, host)
             else:
-                self.state['status'] = response.getcode()
-                self.state['realurl'] = response.geturl()
-                self.state['info'] = response.info()
-                self.state['html'] = response.read().decode('utf-8', 'ignore')
-                self.state['error'] = self.NoError  #cleanup
+                self._succeeded(response, html, host)
                 break  #got something
 
-            Logger.error(self.state['error'])
-
-            if self.state['tries'] >= self.MaxTries:
+            if delay is None:
                 break  #give up
 
-            self.state['timeout'] *= 2
+            Logger.debug('retry in {:.2f}s'.format(delay))
+            policy.sleep(delay)
             self.state['tries'] += 1
 
-        return self.state['html']
+    #the steps of a fetch, shared with web.asyncagent
+    def _start(self, url):
+        """
+        Resets the state for url and returns (policy, expires, host), or
+        None if url is not a string.
+        """
+        if not isinstance(url, str):
+            self.state['error'] = "URL must be a string '{}'".format(str(url))
+            return None
+        self._reset_state(url)
+        policy = self.policy()
+        self.state['tries'] = 1
+        self.base_timeout = self.state['timeout']
+        return policy, policy.start(), urlsplit(url).hostname
+
+    def _admit(self, policy, expires, host):
+        """
+        Sets the timeout of the next try and asks host's circuit breaker
+        and token bucket. Returns seconds to wait for a token, or None if
+        the request may not be sent.
+        """
+        self.state['timeout'] = policy.timeout(self.base_timeout, expires)
+        Logger.debug('try {!s}/{!s}/{!s}'.format(self.state['tries'],
+                                                 policy.max_tries,
+                                                 self.state['timeout']))
+        if host is None:
+            return 0  #invalid url, reported by _open
+        wait = None
+        if not self.limits.breaker(host).allow():
+            self.state['error'] = 'CircuitOpen: ' + host
+        else:
+            remaining = expires - policy.clock()
+            wait = self.limits.bucket(host).reserve(timeout=remaining)
+            if wait is None:
+                self.limits.breaker(host).release()
+                self.state['error'] = 'RateLimited: ' + host
+        if wait is None:
+            Logger.error(self.state['error'])
+        return wait
+
+    def _replay(self, url):
+        """
+        Sets the record from the cassette's exchange for url; returns the
+        seconds to wait to simulate it.
+        """
+        self._reset_state(url)
+        self.state['tries'] = 1
+        exchange = self.cassette.play(url, 'GET', self.Header)
+        if exchange is None:
+            self.state['error'] = 'Cassette: no recording of ' + url
+            Logger.error(self.state['error'])
+            return 0
+        for name in ('realurl', 'status', 'html', 'wire', 'body'):
+            self.state[name] = exchange[name]
+        self.state['info'] = _make_headers(exchange['info'])
+        if self.state['status'] >= 400:
+            self.state['error'] = 'HTTPError: ' + str(self.state['status'])
+        return self.cassette.delay(exchange)
+
+    def _record(self, url, started):
+        # responses only: a failure to connect says nothing about the server
+        if (self.cassette is not None and self.cassette.recording() and
+                self.state['status'] is not None):
+            self.cassette.record(url, self.state, time.time() - started,
+                                 'GET', self.Header)
+
+    def _succeeded(self, response, html, host):
+        self.state['status'] = response.status
+        self.state['realurl'] = response.realurl
+        self.state['info'] = response.msg
+        self.state['html'] = html
+        self.state['error'] = self.NoError  #cleanup
+        self.limits.breaker(host).success()
+
+    def _failed(self, e, policy, expires, host):
+        """
+        Records exception e of a failed try; returns seconds to wait
+        before the next try, or None to give up.
+        """
+        status, retry_after = None, None
+        if isinstance(e, HTTPError):
+            self.state['status'] = status = e.code
+            self.state['error'] = 'HTTPError: ' + str(e.code)
+            retry_after = e.retry_after()
+        elif isinstance(e, URLError):
+            self.state['error'] = 'URLError: ' + str(e.reason)
+        else:
+            self.state['error'] = 'Exception: ' + str(e)
+        Logger.error(self.state['error'])
+
+        if isinstance(e, ValueError):
+            return None  #malformed url, no retry can help
+        if policy.retryable(status):
+            self.limits.breaker(host).failure()
+        else:
+            self.limits.breaker(host).success()  #host is answering
+        return policy.delay(self.state['tries'], expires, status, retry_after)
+
+    def policy(self):
+        """The RetryPolicy for the next fetch."""
+        if self.retry is not None:
+            return self.retry
+        return RetryPolicy(max_tries=self.MaxTries)
+
+    def _open(self, url, timeout):
+        """
+        GET url following redirects; returns (response, text) with the
+        final URL set as response.realurl.
+        """
+        for _ in range(self.MaxRedirects + 1):
+            response, text = self._request(url, timeout)
+            location = response.getheader('Location')
+            if response.status not in self.Redirect_Codes or not location:
+                break
+            url = urljoin(url, location)
+            Logger.debug('redirect {!s} {}'.format(response.status, url))
+        else:
+            raise URLError('too many redirects')
+
+        if response.status >= 400:
+            raise HTTPError(response.status, response.msg)
+        response.realurl = url
+        return response, text
+
+    def _request(self, url, timeout):
+        """
+        One GET over a pooled connection. A reused connection may have been
+        closed by the server while idle, so failures on one that show it
+        closed are retried on the next pooled or a fresh connection. Other
+        failures, timeouts included, are left to the RetryPolicy.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError("unknown url type: '{}'".format(url))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        while True:
+            conn = self.pool.acquire(parts.scheme, parts.hostname,
+                                     parts.port, timeout)
+            try:
+                conn.request('GET', path, headers=self.Header)
+                response = conn.getresponse()
+                text = self._read_body(response)
+            except (HTTPException, socket.error, zlib.error) as e:
+                self.pool.discard(conn)
+                if self.pool.is_reused(conn) and _stale(e):
+                    continue
+                if isinstance(e, HTTPException):
+                    raise
+                raise URLError(e)  #zlib.error: a corrupt encoded body
+            if response.will_close:
+                self.pool.discard(conn)
+            else:
+                self.pool.release(conn)
+            return response, text
+
+    def _read_body(self, response):
+        """
+        Read the response in chunks, decompressing and decoding each chunk
+        as it arrives, and count bytes before and after decompression.
+        """
+        decoder = _Decoder(response.getheader('Content-Encoding'))
+        text = []
+        while True:
+            chunk = response.read(self.ChunkSize)
+            if not chunk:
+                break
+            text.append(decoder.decode(chunk))
+        text.append(decoder.flush())
+
+        self.state['wire'] = decoder.wire
+        self.state['body'] = decoder.body
+        return ''.join(text)
 
     #pretty-print the object diagnostics for print() and str() calls
     def __str__(self):
         triesmaxtime = '{!s}/{!s}/{!s}'.format(
-            self.state['tries'], self.MaxTries, self.state['timeout'])
-        s = ("  {:<}: {!s}" * 6)[2:]
+            self.state['tries'], self.policy().max_tries,
+            self.state['timeout'])
+        wirebody = '{!s}/{!s}'.format(self.state['wire'], self.state['body'])
+        s = ("  {:<}: {!s}" * 7)[2:]
         s = s.format(
             'status',  self.state['status'],
             'tries/max/timeout', triesmaxtime,
+            'bytes wire/body', wirebody,
             'error',   self.state['error'],
             'url',     self.state['url'],
             'realurl', self.state['realurl'],
@@ -178,6 +466,95 @@ class HttpAgent(object):
     def real_url(self):    return self.state['realurl']
     def error(self):       return self.state['error']
     def info(self):        return self.state['info']
+    def wire_bytes(self):  return self.state['wire']
+    def body_bytes(self):  return self.state['body']
+
+    def circuit(self):
+        host = urlsplit(self.state['url'] or '').hostname
+        return self.limits.state(host)
+
+    def shared(self):      return self.state['shared']
+
+    def circuit_open(self):
+        return str(self.state['error']).startswith('CircuitOpen')
+
+###########################################################################
+def _stale(e):
+    """True for the errors from using a kept-alive connection that the
+    server has closed: no status line (RemoteDisconnected in Python 3), a
+    reset or a broken pipe."""
+    if isinstance(e, BadStatusLine):
+        return True
+    return (isinstance(e, socket.error) and not isinstance(e, socket.timeout)
+            and getattr(e, 'errno', None) in (errno.ECONNRESET, errno.EPIPE))
+
+def _make_headers(items):
+    """Response headers from [name, value] pairs, as the same kind of
+    case-insensitive message a live response has."""
+    raw = ''.join('%s: %s\r\n' % (k, v) for (k, v) in items) + '\r\n'
+    return parse_headers(io.BytesIO(raw.encode('latin-1')))
+
+###########################################################################
+class _Decoder(object):
+    """
+    Incremental decoder of a response body to text, undoing a gzip or
+    deflate Content-Encoding, that counts bytes before (wire) and after
+    (body) decompression.
+    """
+    def __init__(self, encoding):
+        encoding = (encoding or '').strip().lower()
+        self.inflate = None
+        if encoding in ('gzip', 'x-gzip'):
+            self.inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self.inflate = _Deflate()
+        self.decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        self.wire = 0
+        self.body = 0
+
+    def decode(self, chunk):
+        self.wire += len(chunk)
+        if self.inflate is not None:
+            chunk = self.inflate.decompress(chunk)
+        self.body += len(chunk)
+        return self.decoder.decode(chunk)
+
+    def flush(self):
+        text = ''
+        if self.inflate is not None:
+            chunk = self.inflate.flush()
+            self.body += len(chunk)
+            text = self.decoder.decode(chunk)
+        return text + self.decoder.decode(b'', True)
+
+###########################################################################
+class _Deflate(object):
+    """
+    Incremental 'deflate' decoder. The encoding should be zlib wrapped, but
+    some servers send a raw deflate stream, so sniff the first bytes.
+    """
+    def __init__(self):
+        self.inflate = None
+        self.head = b''
+
+    def decompress(self, chunk):
+        if self.inflate is None:
+            self.head += chunk
+            if len(self.head) < 2:
+                return b''
+            b0, b1 = bytearray(self.head[:2])
+            if b0 & 0x0f == 8 and (b0 * 256 + b1) % 31 == 0:
+                self.inflate = zlib.decompressobj()
+            else:
+                self.inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+            chunk, self.head = self.head, b''
+        return self.inflate.decompress(chunk)
+
+    def flush(self):
+        if self.inflate is None:
+            self.inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.inflate.decompress(self.head) + self.inflate.flush()
+        return self.inflate.flush()
 
 ###########################################################################
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+###########################################################################
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: web.retry")
+
+###########################################################################
+import time
+import random
+import calendar
+try:
+    #Python3
+    from email.utils import parsedate
+except:
+    #Python2
+    from email.Utils import parsedate
+
+###########################################################################
+class RetryPolicy(object):
+    """
+    When and how long to wait before retrying a failed request.
+
+    A fetch gets at most max_tries tries and must finish within deadline
+    seconds of its start, waits included, so a dead endpoint blocks the
+    caller for at most about deadline seconds. Between tries the wait is
+    drawn uniformly from [0, min(cap, backoff * 2**(tries-1))] ("full
+    jitter"), so agents that failed together do not retry together. A
+    Retry-After from the server replaces the drawn wait, and if it is
+    later than the deadline the fetch gives up at once.
+
+    Network errors and the statuses in retry_codes (429 and the 5xx that
+    signal a transient condition) are retried; other HTTP errors such as
+    404 are final.
+
+    Constructor and usage:
+
+    policy = RetryPolicy(max_tries=5, deadline=30, backoff=0.5, cap=8)
+
+    expires = policy.start()
+    tries = 1
+    while True:
+        ...try the request with timeout policy.timeout(10, expires)...
+        delay = policy.delay(tries, expires, status, retry_after)
+        if delay is None:
+            break  #give up
+        policy.sleep(delay)
+        tries += 1
+
+    Public methods:
+
+    start()        returns the time by which the fetch must be done.
+    timeout(t, expires)
+                   returns t capped to the time left before expires.
+    retryable(status)
+                   returns True if a failure with that HTTP status (None
+                   for a network error) may succeed on retry.
+    delay(tries, expires, status=None, retry_after=None)
+                   returns seconds to wait before the next try, or None
+                   to give up after tries tries.
+    sleep(seconds) waits, using the injected sleep function.
+    """
+
+    MaxTries   = 5
+    Deadline   = 30    #seconds for all tries of one fetch
+    Backoff    = 0.5   #seconds, first backoff ceiling
+    Cap        = 8     #seconds, largest backoff ceiling
+    MinTimeout = 1     #seconds, shortest per-try timeout worth trying
+
+    Retry_Codes = (408, 425, 429, 500, 502, 503, 504)
+
+    def __init__(self, max_tries=MaxTries, deadline=Deadline, backoff=Backoff,
+                 cap=Cap, retry_codes=Retry_Codes, clock=time.time,
+                 sleep=time.sleep, rand=random.random):
+        self.max_tries = max(1, int(max_tries))
+        self.deadline = deadline
+        self.backoff = backoff
+        self.cap = cap
+        self.retry_codes = frozenset(retry_codes)
+        self.clock = clock
+        self.sleep = sleep
+        self.rand = rand
+
+    def start(self):
+        return self.clock() + self.deadline
+
+    def timeout(self, t, expires):
+        return max(self.MinTimeout, min(t, expires - self.clock()))
+
+    def retryable(self, status):
+        return status is None or status in self.retry_codes
+
+    def delay(self, tries, expires, status=None, retry_after=None):
+        if tries >= self.max_tries or not self.retryable(status):
+            return None
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            ceiling = min(self.cap, self.backoff * 2 ** (tries - 1))
+            delay = self.rand() * ceiling
+        if self.clock() + delay + self.MinTimeout > expires:
+            Logger.debug('retry: {:.1f}s wait passes deadline'.format(delay))
+            return None
+        return delay
+
+    def __repr__(self):
+        return 'RetryPolicy(max_tries={!s}, deadline={!s})'.format(
+            self.max_tries, self.deadline)
+
+###########################################################################
+def parse_retry_after(value, now=None):
+    """
+    Returns the seconds to wait given by a Retry-After header, either
+    delay-seconds or an HTTP-date, or None if value is missing or invalid.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0, int(value))
+    except ValueError:
+        pass
+    parsed = parsedate(value)
+    if parsed is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0, calendar.timegm(parsed) - now)
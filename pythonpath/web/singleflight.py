@@ -0,0 +1,161 @@
+###########################################################################
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: web.singleflight")
+
+###########################################################################
+import threading
+
+###########################################################################
+class FlightTimeout(Exception):
+    """Waited longer than the given timeout for a call in flight."""
+
+###########################################################################
+class Flight(object):
+    """
+    One call in flight, shared by every caller that asked for one of its
+    keys while it ran. Its owner is the context of the leading caller, as
+    given to SingleFlight.begin(), eg., for diagnostics on failure.
+
+    Public methods:
+
+    wait(timeout=None)
+                   blocks until the call ends and returns its result, or
+                   raises its exception; raises FlightTimeout if it has
+                   not ended after timeout seconds.
+    done()         returns True once the call has ended.
+    """
+
+    def __init__(self, keys, owner=None):
+        self.keys = keys
+        self.owner = owner
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        if not self.event.wait(timeout):
+            raise FlightTimeout('call still in flight after {!s}s'.format(
+                timeout))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def done(self):
+        return self.event.is_set()
+
+###########################################################################
+class SingleFlight(object):
+    """
+    Thread-safe request coalescing: while a call for a key is in flight,
+    other callers asking for that key wait for it and share its result
+    instead of making the same call again. Nothing is kept once a call
+    ends, so this only removes duplicates that overlap in time; see
+    sites.quotecache for reuse after that.
+
+    Constructor and usage:
+
+    group = SingleFlight()
+
+    result, shared = group.do(url, lambda: fetch(url), timeout=30)
+
+    or, for calls that cover several keys, eg., the tickers of a query:
+
+    flight, mine, theirs = group.begin(keys)
+    if mine:
+        result, error = None, None
+        try:
+            result = ...fetch mine...
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            group.end(flight, result, error)
+    for other, keys in theirs.items():
+        result = other.wait(timeout=30)
+
+    Public methods:
+
+    do(key, fn, timeout=None)
+                   calls fn() unless a call for key is in flight, else
+                   waits for that call for at most timeout seconds;
+                   returns (result, shared), shared True if another
+                   caller's.
+    begin(keys, owner=None)
+                   returns (flight, mine, theirs): mine is the list of keys
+                   not in flight, now led by the caller under flight (None
+                   if mine is empty); theirs is a dict of the other callers'
+                   Flights to the list of keys each covers. owner is kept
+                   in the new flight for its waiters.
+    end(flight, result=None, error=None)
+                   ends a flight from begin(), handing result, or error to
+                   raise, to its waiters. Must always be called, even if
+                   the leader is interrupted, or its waiters hang until
+                   their timeout. An error that is not an Exception, eg.,
+                   KeyboardInterrupt, reaches waiters as a RuntimeError.
+    in_flight()    returns the number of keys in flight.
+    stats()        returns a dict of counters: led, shared keys.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}  #key => Flight
+        self.led = 0
+        self.shared = 0
+
+    def do(self, key, fn, timeout=None):
+        flight, mine, theirs = self.begin([key])
+        if not mine:
+            return list(theirs)[0].wait(timeout), True
+        result, error = None, None
+        try:
+            result = fn()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.end(flight, result, error)
+        return result, False
+
+    def begin(self, keys, owner=None):
+        mine, theirs = [], {}
+        with self.lock:
+            for key in keys:
+                other = self.flights.get(key)
+                if other is None:
+                    mine.append(key)
+                else:
+                    theirs.setdefault(other, []).append(key)
+            flight = Flight(mine, owner) if mine else None
+            for key in mine:
+                self.flights[key] = flight
+            self.led += len(mine)
+            self.shared += len(keys) - len(mine)
+        if theirs:
+            Logger.debug('single flight: {!s} keys in flight'.format(
+                len(keys) - len(mine)))
+        return flight, mine, theirs
+
+    def end(self, flight, result=None, error=None):
+        if flight is None:
+            return
+        with self.lock:
+            for key in flight.keys:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+        if error is not None and not isinstance(error, Exception):
+            error = RuntimeError('single flight leader stopped: {!r}'.format(
+                error))
+        flight.result, flight.error = result, error
+        flight.event.set()
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.flights)
+
+    def stats(self):
+        with self.lock:
+            return {'led': self.led, 'shared': self.shared}
+
+# process-wide group of the URLs being fetched by HttpAgents
+FLIGHTS = SingleFlight()
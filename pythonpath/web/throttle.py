@@ -0,0 +1,232 @@
+###########################################################################
+import logging
+Logger = logging.getLogger('LoadPrices')
+Logger.debug("Load: web.throttle")
+
+###########################################################################
+import time
+import threading
+
+###########################################################################
+class TokenBucket(object):
+    """
+    Thread-safe token bucket: requests are let through at rate per second
+    on average, with bursts of up to burst requests after a quiet spell.
+
+    Constructor and usage:
+
+    bucket = TokenBucket(rate=10, burst=20)
+
+    if bucket.acquire(timeout=5):
+        ...send the request...
+
+    Public methods:
+
+    acquire(timeout=None)
+                   takes a token, waiting for one if the bucket is empty.
+                   Returns False at once, without a token, if the wait
+                   would be longer than timeout seconds.
+    reserve(timeout=None)
+                   as acquire() but does not wait: returns the seconds the
+                   caller must wait before using its token, or None.
+    wait()         returns seconds until a token is available.
+    """
+
+    def __init__(self, rate, burst, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.tokens = self.burst
+        self.stamp = clock()
+
+    def acquire(self, timeout=None):
+        wait = self.reserve(timeout)
+        if wait is None:
+            return False
+        if wait > 0:
+            self.sleep(wait)
+        return True
+
+    def reserve(self, timeout=None):
+        with self.lock:
+            self._refill()
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                return None
+            self.tokens -= 1  #reserve a token, maybe ahead of time
+        if wait > 0:
+            Logger.debug('token bucket: wait {:.2f}s'.format(wait))
+        return wait
+
+    def wait(self):
+        with self.lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+###########################################################################
+class CircuitBreaker(object):
+    """
+    Thread-safe circuit breaker for one host. After failures consecutive
+    failed requests the circuit opens and requests are refused at once,
+    rather than each paying a full retry ladder. After reset seconds one
+    trial request is let through (half-open): success closes the circuit,
+    failure opens it again.
+
+    Constructor and usage:
+
+    breaker = CircuitBreaker(failures=5, reset=30)
+
+    if breaker.allow():
+        ...send the request...
+        if ok: breaker.success()
+        else:  breaker.failure()
+        (or breaker.release() if it was not sent after all)
+
+    Public methods:
+
+    allow()        returns True if a request may be sent now.
+    success()      records a request that got an answer from the host.
+    failure()      records a request that timed out, could not connect or
+                   was throttled or refused by a 5xx.
+    release()      records that an allowed request was not sent, so that a
+                   half-open circuit lets another trial through.
+    state()        returns 'closed', 'open' or 'half-open'.
+    retry_in()     returns seconds until an open circuit lets a trial
+                   request through, 0 otherwise.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failures, reset, clock=time.time):
+        self.failures = max(1, int(failures))
+        self.reset = reset
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.count = 0       #consecutive failures
+        self.opened = None   #time the circuit opened, None if closed
+        self.trial = False   #half-open trial request in flight
+
+    def allow(self):
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.trial or self.clock() < self.opened + self.reset:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self.lock:
+            if self.opened is not None:
+                Logger.info('circuit breaker: closed')
+            self.count = 0
+            self.opened = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.count += 1
+            if self.trial or (self.opened is None and
+                              self.count >= self.failures):
+                Logger.warning('circuit breaker: open after {!s} failures'
+                               .format(self.count))
+                self.opened = self.clock()
+            self.trial = False
+
+    def release(self):
+        with self.lock:
+            self.trial = False
+
+    def state(self):
+        with self.lock:
+            if self.opened is None:
+                return self.CLOSED
+            if self.trial or self.clock() >= self.opened + self.reset:
+                return self.HALF_OPEN
+            return self.OPEN
+
+    def retry_in(self):
+        with self.lock:
+            if self.opened is None:
+                return 0
+            return max(0, self.opened + self.reset - self.clock())
+
+###########################################################################
+class HostLimits(object):
+    """
+    Thread-safe registry of a TokenBucket and a CircuitBreaker per host,
+    shared by all HttpAgents through the module level LIMITS so that
+    concurrent refreshes from several workbooks pace themselves together.
+
+    Constructor and usage:
+
+    limits = HostLimits(rate=10, burst=20, failures=5, reset=30)
+
+    limits.bucket('query1.finance.yahoo.com').acquire()
+    limits.breaker('query1.finance.yahoo.com').allow()
+
+    Public methods:
+
+    bucket(host)   returns the host's TokenBucket, created on first use.
+    breaker(host)  returns the host's CircuitBreaker, created on first use.
+    state(host)    returns the host's circuit state, 'closed' if unknown.
+    states()       returns a dict of host to circuit state.
+    clear()        forgets all hosts.
+    """
+
+    Rate     = 10   #requests per second per host
+    Burst    = 20   #requests let through at once after a quiet spell
+    Failures = 5    #consecutive failures that open a circuit
+    Reset    = 30   #seconds before an open circuit is tried again
+
+    def __init__(self, rate=Rate, burst=Burst, failures=Failures, reset=Reset,
+                 clock=time.time, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.failures = failures
+        self.reset = reset
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.breakers = {}
+
+    def bucket(self, host):
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst,
+                                                 self.clock, self.sleep)
+            return self.buckets[host]
+
+    def breaker(self, host):
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.failures,
+                                                     self.reset, self.clock)
+            return self.breakers[host]
+
+    def state(self, host):
+        with self.lock:
+            breaker = self.breakers.get(host)
+        return CircuitBreaker.CLOSED if breaker is None else breaker.state()
+
+    def states(self):
+        with self.lock:
+            breakers = list(self.breakers.items())
+        return dict((host, b.state()) for (host, b) in breakers)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.breakers.clear()
+
+# process-wide limits shared across macro invocations
+LIMITS = HostLimits()
@@ -0,0 +1,94 @@
+###########################################################################
+# Benchmark KeyTicker classification against the original matcher, which
+# tried each pattern's regex in turn and logged every hit.
+#
+# Run from the top-level directory:
+#
+#   python3 -m tests.sites.bench_yahoo_keyticker [--repeat N] [N ...]
+#
+# Synthetic columns mix stock, FX and index keys with unmatched text, each
+# distinct value repeated about ten times as in a holdings sheet. The memo
+# is cleared before each run, so the first pass over each value is timed.
+###########################################################################
+import re
+import sys
+import time
+import logging
+import argparse
+
+from sites.yahoo import KeyTickerStock
+
+SIZES = [1000, 100000]
+
+Logger = logging.getLogger('LoadPrices')
+
+###########################################################################
+CRE_EPIC = re.compile(r'^([A-Z0-9]{2,4})$')
+CRE_EPIC_DOT = re.compile(r'^([A-Z0-9]{2,4})\.$')
+CRE_EPIC_FLOOR = re.compile(r'^([A-Z0-9]{2,4}\.[A-Z]+)$')
+
+def legacy_match_ticker(text=''):
+    """The original KeyTickerStock.match_ticker, kept here for comparison."""
+    m = CRE_EPIC.search(text)
+    if m:
+        ticker = m.group(1)
+        Logger.debug('EPIC: %s => %s' % (text, ticker))
+        return ticker
+    m = CRE_EPIC_DOT.search(text)
+    if m:
+        ticker = m.group(1)
+        Logger.debug('EPIC_DOT: %s => %s' % (text, ticker))
+        return ticker
+    m = CRE_EPIC_FLOOR.search(text)
+    if m:
+        ticker = m.group(1)
+        Logger.debug('EPIC_FLOOR: %s => %s' % (text, ticker))
+        return ticker
+    return ''
+
+def make_column(n):
+    forms = ['%s', '%s.', '%s.L', 'note %s', '%s-1']
+    column = []
+    for i in range(n):
+        j = (i * 7919) % max(1, n // 10)
+        code = 'T%03d' % (j % 1000) if j < 1000 else 'X%d' % j
+        column.append(forms[j % len(forms)] % code)
+    return column
+
+def timed(classify, column, repeat):
+    best = None
+    for _ in range(repeat):
+        KeyTickerStock.MEMO.clear()
+        t0 = time.time()
+        tickers = classify(column)
+        dt = time.time() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, tickers
+
+###########################################################################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='KeyTicker benchmark')
+    parser.add_argument('sizes', nargs='*', type=int, default=SIZES,
+                        help='number of cells per column')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    keyticker = KeyTickerStock()
+    print('{:>8} {:>12} {:>12} {:>8}'.format(
+        'cells', 'legacy(s)', 'classify(s)', 'speedup'))
+
+    for n in args.sizes:
+        column = make_column(n)
+        old, oldtickers = timed(
+            lambda c: [legacy_match_ticker(t) for t in c], column, args.repeat)
+        new, tickers = timed(keyticker.classify, column, args.repeat)
+        if tickers != oldtickers:
+            raise SystemExit('classifiers disagree at %d cells' % n)
+        print('{:>8} {:12.4f} {:12.4f} {:7.1f}x'.format(
+            n, old, new, old / max(new, 1e-9)))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+###########################################################################
@@ -0,0 +1,130 @@
+###########################################################################
+# Benchmark PriceDict JSON parsing against the original regex parser.
+#
+# Run from the top-level directory:
+#
+#   python3 -m tests.sites.bench_yahoo_pricedict [--legacy-max N] [N ...]
+#
+# Synthetic quote responses are assembled from the recorded quotes in
+# data_yahoo_json.py, each copy given a unique symbol. The regex parser is
+# quadratic in the response length, so it is skipped above --legacy-max
+# quotes (default 5000) to keep the run finite.
+###########################################################################
+import re
+import sys
+import json
+import time
+import argparse
+
+from .data_yahoo_json import *  #yahoo json strings
+
+from sites.yahoo import PriceDict
+
+SIZES = [10, 1000, 50000]
+LEGACY_MAX = 5000
+
+###########################################################################
+def legacy_parse_json(text=''):
+    """The original PriceDict._parse_json, kept here for comparison."""
+    data = {}
+
+    m = re.search(r'"result":\[([^\]]*)\]', text)
+    if not m:
+        return data
+
+    text = m.group(1).replace('"', '')
+
+    while text:
+        m = re.search(r'{(.*?)}(.*)', text)
+        if not m:
+            break
+
+        keyvals = m.group(1).split(',')
+        symbol, price, currency = '', '', ''
+
+        for pair in keyvals:
+            try:
+                key, val = pair.split(':', 1)
+            except:
+                continue
+            if key == 'symbol':
+                symbol = val
+                continue
+            if key == 'regularMarketPrice':
+                price = val
+                continue
+            if key == 'currency':
+                currency = val
+                continue
+
+        data[symbol] = [price, currency]
+        text = m.group(2)
+
+    return data
+
+###########################################################################
+def sample_quotes():
+    quotes = []
+    for text in (DATA_ONE_SHARE, DATA_TWO_SHARES, DATA_ONE_INDEX,
+                 DATA_ONE_FX, DATA_MIXED, DATA_ANOMALY_42TE):
+        quotes.extend(json.loads(text)['quoteResponse']['result'])
+    return quotes
+
+def make_response(n, quotes):
+    result = []
+    for i in range(n):
+        quote = dict(quotes[i % len(quotes)])
+        quote['symbol'] = 'T%05d.L' % i
+        result.append(json.dumps(quote, separators=(',', ':')))
+    return ('{"quoteResponse":{"result":[' + ','.join(result) +
+            '],"error":null}}')
+
+def timed(parse, text, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.time()
+        data = parse(text)
+        dt = time.time() - t0
+        if best is None or dt < best:
+            best = dt
+    return best, data
+
+###########################################################################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PriceDict parse benchmark')
+    parser.add_argument('sizes', nargs='*', type=int, default=SIZES,
+                        help='number of quotes per response')
+    parser.add_argument('--legacy-max', type=int, default=LEGACY_MAX,
+                        help='largest response given to the regex parser')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    quotes = sample_quotes()
+    print('{:>8} {:>10} {:>12} {:>12} {:>8}'.format(
+        'quotes', 'bytes', 'legacy(s)', 'json(s)', 'speedup'))
+
+    for n in args.sizes:
+        text = make_response(n, quotes)
+
+        new, data = timed(lambda t: PriceDict(t).data(), text, args.repeat)
+        if len(data) != n:
+            raise SystemExit('json parser returned %d of %d quotes'
+                             % (len(data), n))
+
+        if n <= args.legacy_max:
+            old, olddata = timed(legacy_parse_json, text, args.repeat)
+            if olddata != data:
+                raise SystemExit('parsers disagree at %d quotes' % n)
+            legacy = '{:12.4f}'.format(old)
+            speedup = '{:7.1f}x'.format(old / max(new, 1e-9))
+        else:
+            legacy = '{:>12}'.format('skipped')
+            speedup = '{:>8}'.format('-')
+
+        print('{:>8} {:>10} {} {:12.4f} {}'.format(
+            n, len(text), legacy, new, speedup))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+###########################################################################
@@ -0,0 +1,98 @@
+###########################################################################
+# Benchmark the whole Yahoo.get pipeline offline, replaying a synthetic
+# cassette through each fetch engine.
+#
+# Run from the top-level directory:
+#
+#   python3 -m tests.sites.bench_yahoo_replay [--elapsed S] [--latency F]
+#                                             [--batchsize N] [N ...]
+#
+# Each query of the cassette is recorded as taking --elapsed seconds and
+# is replayed after --latency times that, so --latency 0 times parsing and
+# spreadsheet writes alone and --latency 1 adds simulated network waits,
+# overlapped up to --workers at a time.
+###########################################################################
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+
+from sites.yahoo import Yahoo, KeyTickerBase, PriceDict
+from spreadsheet.api.factory import spreadsheet_api
+from web.httpagent import HttpAgent
+from web.cassette import Cassette
+
+SIZES = [1000, 10000]
+
+###########################################################################
+def make_tickers(n):
+    # 'A000.L' ... 'Z999.L', so at most 26000
+    return ['%s%03d.L' % (chr(ord('A') + i // 1000), i % 1000)
+            for i in range(n)]
+
+def make_response(tickers):
+    result = [{'symbol': t, 'regularMarketPrice': 100 + i * 0.01,
+               'currency': 'GBp'} for (i, t) in enumerate(tickers)]
+    return json.dumps({'quoteResponse': {'result': result, 'error': None}})
+
+def make_cassette(path, tickers, batchsize, elapsed):
+    names = PriceDict('', None, None).names()
+    with Cassette(path, Cassette.RECORD) as cassette:
+        for i in range(0, len(tickers), batchsize):
+            batch = tickers[i:i+batchsize]
+            url = KeyTickerBase().url(batch, names)
+            agent = HttpAgent()
+            agent._reset_state(url)
+            agent.state.update(status=200, realurl=url,
+                               html=make_response(batch))
+            cassette.record(url, agent.state, elapsed, 'GET', agent.Header)
+
+def timed(path, tickers, engine, args):
+    doc = spreadsheet_api('memory', sheets={'Sheet1': dict(
+        ('A%d' % (i + 1), t) for (i, t) in enumerate(tickers))})
+    cassette = Cassette(path, latency=args.latency)
+    yahoo = Yahoo(doc, batchsize=args.batchsize, workers=args.workers,
+                  cache=None, negative=None, inflight=None, engine=engine,
+                  cassette=cassette)
+    t0 = time.time()
+    yahoo.stock(sheet='Sheet1', keyrange='A1:A%d' % len(tickers),
+                datacols=['B', 'C'])
+    dt = time.time() - t0
+    if cassette.stats()['missed']:
+        raise SystemExit('cassette missed %d queries'
+                         % cassette.stats()['missed'])
+    return dt
+
+###########################################################################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Yahoo replay benchmark')
+    parser.add_argument('sizes', nargs='*', type=int, default=SIZES,
+                        help='number of tickers')
+    parser.add_argument('--batchsize', type=int, default=Yahoo.BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=Yahoo.MAX_WORKERS)
+    parser.add_argument('--elapsed', type=float, default=0.2)
+    parser.add_argument('--latency', type=float, default=0)
+    args = parser.parse_args(argv)
+
+    folder = tempfile.mkdtemp()
+    try:
+        print('{:>8} {:>8} {:>10} {:>12}'.format(
+            'tickers', 'engine', 'time(s)', 'tickers/s'))
+        for n in args.sizes:
+            tickers = make_tickers(n)
+            path = os.path.join(folder, 'yahoo-%d.jsonl.gz' % n)
+            make_cassette(path, tickers, args.batchsize, args.elapsed)
+            for engine in Yahoo.ENGINES:
+                dt = timed(path, tickers, engine, args)
+                print('{:>8} {:>8} {:10.3f} {:12.0f}'.format(
+                    n, engine, dt, n / max(dt, 1e-9)))
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+###########################################################################
@@ -0,0 +1,93 @@
+###########################################################################
+# Load test the Yahoo fetch stack, HttpAgent and pool included, against
+# the local stub server in yahoo_server.py.
+#
+# Run from the top-level directory:
+#
+#   python3 -m tests.sites.bench_yahoo_server [--latency S] [--jitter S]
+#                                             [--error-rate F] [--throttle R]
+#                                             [--max-url N] [N ...]
+#
+# Each engine refreshes N tickers through Yahoo.get; the table shows the
+# wall time, the requests the server saw and how it answered them.
+# --rate and --burst set the client's own per-host token bucket.
+###########################################################################
+import sys
+import time
+import argparse
+
+from .yahoo_server import YahooServer
+from .bench_yahoo_replay import make_tickers
+
+from sites.yahoo import Yahoo
+from spreadsheet.api.factory import spreadsheet_api
+from web.connpool import POOL
+from web.throttle import HostLimits
+
+SIZES = [1000, 5000]
+
+###########################################################################
+def timed(server, tickers, engine, args):
+    doc = spreadsheet_api('memory', sheets={'Sheet1': dict(
+        ('A%d' % (i + 1), t) for (i, t) in enumerate(tickers))})
+    yahoo = Yahoo(doc, batchsize=args.batchsize, workers=args.workers,
+                  cache=None, negative=None, inflight=None, engine=engine,
+                  url_base=server.url_base)
+    t0 = time.time()
+    try:
+        yahoo.stock(sheet='Sheet1', keyrange='A1:A%d' % len(tickers),
+                    datacols=['B', 'C'])
+        error = ''
+    except Warning as e:
+        error = str(e)
+    return time.time() - t0, error
+
+def statuses(stats):
+    return ' '.join('%d:%d' % (k, stats[k]) for k in
+                    sorted(k for k in stats if isinstance(k, int)))
+
+###########################################################################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Yahoo stub server load test')
+    parser.add_argument('sizes', nargs='*', type=int, default=SIZES,
+                        help='number of tickers')
+    parser.add_argument('--batchsize', type=int, default=Yahoo.BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=Yahoo.MAX_WORKERS)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.05)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle', type=float, default=None)
+    parser.add_argument('--max-url', type=int, default=None)
+    parser.add_argument('--no-gzip', dest='gzip', action='store_false')
+    parser.add_argument('--rate', type=float, default=HostLimits.Rate)
+    parser.add_argument('--burst', type=float, default=HostLimits.Burst)
+    args = parser.parse_args(argv)
+
+    from web import throttle
+    throttle.LIMITS.rate, throttle.LIMITS.burst = args.rate, args.burst
+
+    print('{:>8} {:>8} {:>10} {:>12} {:>9}  {}'.format(
+        'tickers', 'engine', 'time(s)', 'tickers/s', 'requests', 'statuses'))
+    for n in args.sizes:
+        tickers = make_tickers(n)
+        for engine in Yahoo.ENGINES:
+            throttle.LIMITS.clear()
+            server = YahooServer(latency=args.latency, jitter=args.jitter,
+                                 error_rate=args.error_rate,
+                                 throttle=args.throttle,
+                                 max_url=args.max_url, gzip=args.gzip,
+                                 seed=n).start()
+            try:
+                dt, error = timed(server, tickers, engine, args)
+            finally:
+                POOL.clear()
+                server.stop()
+            stats = server.stats()
+            print('{:>8} {:>8} {:10.3f} {:12.0f} {:>9}  {}{}'.format(
+                n, engine, dt, n / max(dt, 1e-9), stats['requests'],
+                statuses(stats), '  ' + error if error else ''))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+###########################################################################
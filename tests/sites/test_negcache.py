@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from .data_yahoo_json import *  #yahoo json strings
+from .test_yahoo_get import StubYahoo
+
+from sites.negcache import NegativeCache
+from spreadsheet import CellRange
+from spreadsheet.api.factory import spreadsheet_api
+
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+###########################################################################
+class test_negcache(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(1000)
+        self.cache = NegativeCache(ttl=60, clock=self.clock)
+
+    def test_expire(self):
+        self.cache.add(['XYZ.L'])
+        self.assertIn('XYZ.L', self.cache)
+        self.clock.now += 60
+        self.assertNotIn('XYZ.L', self.cache)
+
+    def test_partition(self):
+        self.cache.add(['XYZ.L', 'AAT.L'])
+        self.assertEqual(self.cache.partition(['BP.L', 'AAT.L', 'VOD.L']),
+                         (['AAT.L'], ['BP.L', 'VOD.L']))
+        self.cache.saved_requests(1)
+        self.assertEqual(self.cache.stats(), {'skipped': 1, 'requests': 1})
+
+    def test_discard(self):
+        self.cache.add(['XYZ.L'])
+        self.cache.discard('XYZ.L')
+        self.assertEqual(len(self.cache), 0)
+
+###########################################################################
+class test_negcache_file(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'sub', 'negative.json')
+        self.clock = Clock(1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_persist(self):
+        cache = NegativeCache(self.path, ttl=60, clock=self.clock)
+        cache.add(['XYZ.L'])
+        cache.save()
+        cache = NegativeCache(self.path, ttl=60, clock=self.clock)
+        self.assertIn('XYZ.L', cache)
+
+    def test_save_drops_expired(self):
+        cache = NegativeCache(self.path, ttl=60, clock=self.clock)
+        cache.add(['XYZ.L'])
+        self.clock.now += 30
+        cache.add(['AAT.L'])
+        self.clock.now += 30
+        cache.save()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {'AAT.L': 1090})
+
+    def test_corrupt_ignored(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        self.assertEqual(len(NegativeCache(self.path)), 0)
+
+###########################################################################
+class test_negcache_yahoo(unittest.TestCase):
+    def setUp(self):
+        self.doc = spreadsheet_api('memory', sheets={'Sheet1': {
+            'A1': 'AAT.L', 'A2': 'XYZ.L',
+        }})
+        self.negative = NegativeCache()
+
+    def test_skip_unpriced(self):
+        get = StubYahoo(self.doc, [DATA_KNOWN_SYMBOL_WRONG_EXCHANGE],
+                        cache=None, negative=self.negative)
+        get.stock(sheet='Sheet1', keyrange='A1:A2', datacols=['B', 'C'])
+        self.assertIn('AAT.L', self.negative)
+        self.assertIn('XYZ.L', self.negative)
+
+        get = StubYahoo(self.doc, [], cache=None, negative=self.negative,
+                        batchsize=1)
+        get.stock(sheet='Sheet1', keyrange='A1:A2', datacols=['B', 'C'])
+        self.assertEqual(get.urls, [])
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('B1:C2')),
+                         [['0', 'n/a'], ['0', 'n/a']])
+        self.assertEqual(self.negative.stats(), {'skipped': 2, 'requests': 2})
+
+    def test_unparsed_batch_not_cached(self):
+        get = StubYahoo(self.doc, ['<html>consent</html>',
+                                   DATA_KNOWN_SYMBOL_WRONG_EXCHANGE],
+                        cache=None, negative=self.negative, batchsize=1)
+        get.stock(sheet='Sheet1', keyrange='A1:A2', datacols=['B', 'C'])
+        self.assertNotIn('AAT.L', self.negative)
+        self.assertIn('XYZ.L', self.negative)
+
+    def test_error_response_not_cached(self):
+        error = '{"finance":{"result":null,"error":{"code":"Bad Request"}}}'
+        get = StubYahoo(self.doc, [error], cache=None, negative=self.negative)
+        get.stock(sheet='Sheet1', keyrange='A1:A2', datacols=['B', 'C'])
+        self.assertEqual(len(self.negative), 0)
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import calendar
+
+from sites.quotecache import QuoteCache
+
+NAMES = ['regularMarketPrice', 'currency']
+
+# Thursday 2017-11-09 12:00:00 UTC
+THURSDAY_NOON = calendar.timegm((2017, 11, 9, 12, 0, 0))
+# Friday 2017-11-10 12:00:00 UTC
+FRIDAY_NOON = calendar.timegm((2017, 11, 10, 12, 0, 0))
+
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+    def __call__(self):
+        return self.now
+
+def quote(state='REGULAR', offset='0'):
+    return {'regularMarketPrice': '1.5', 'currency': 'GBp',
+            'marketState': state, 'gmtOffSetMilliseconds': offset}
+
+###########################################################################
+class test_quotecache_ttl(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(THURSDAY_NOON)
+        self.cache = QuoteCache(ttl=60, clock=self.clock)
+
+    def test_miss(self):
+        self.assertEqual(self.cache.get('BP', NAMES), None)
+
+    def test_hit_then_expire(self):
+        self.cache.put('BP', quote())
+        self.assertEqual(self.cache.get('BP', NAMES), ['1.5', 'GBp'])
+        self.clock.now += 61
+        self.assertEqual(self.cache.get('BP', NAMES), None)
+
+    def test_missing_field_is_miss(self):
+        self.cache.put('BP', quote())
+        self.assertEqual(self.cache.get('BP', ['bid']), None)
+
+    def test_lookup_and_store(self):
+        self.cache.store(NAMES + ['marketState'],
+                         {'BP': ['1.5', 'GBp', 'REGULAR']})
+        hits, misses = self.cache.lookup(['BP', 'VOD.L'], NAMES)
+        self.assertEqual(hits, {'BP': ['1.5', 'GBp']})
+        self.assertEqual(misses, ['VOD.L'])
+
+###########################################################################
+class test_quotecache_closed_market(unittest.TestCase):
+    def test_kept_until_next_midnight(self):
+        clock = Clock(THURSDAY_NOON)
+        cache = QuoteCache(ttl=60, clock=clock)
+        cache.put('BP', quote('CLOSED'))
+        clock.now += 11 * 3600
+        self.assertEqual(cache.get('BP', NAMES), ['1.5', 'GBp'])
+        clock.now += 3600
+        self.assertEqual(cache.get('BP', NAMES), None)
+
+    def test_kept_over_weekend(self):
+        clock = Clock(FRIDAY_NOON)
+        cache = QuoteCache(ttl=60, clock=clock)
+        cache.put('BP', quote('POSTPOST'))
+        clock.now += 2 * 86400 + 11 * 3600   #Sunday 23:00
+        self.assertEqual(cache.get('BP', NAMES), ['1.5', 'GBp'])
+        clock.now += 3600                    #Monday 00:00
+        self.assertEqual(cache.get('BP', NAMES), None)
+
+    def test_exchange_offset(self):
+        clock = Clock(THURSDAY_NOON)
+        cache = QuoteCache(ttl=60, clock=clock)
+        cache.put('AAPL', quote('CLOSED', '-18000000'))  #UTC-5
+        clock.now += 17 * 3600 - 1           #04:59 UTC, 23:59 local
+        self.assertEqual(cache.get('AAPL', NAMES), ['1.5', 'GBp'])
+        clock.now += 1
+        self.assertEqual(cache.get('AAPL', NAMES), None)
+
+    def test_pre_open_expires(self):
+        clock = Clock(THURSDAY_NOON - 9 * 3600)  #Thursday 03:00
+        cache = QuoteCache(ttl=60, clock=clock)
+        for state in ['PREPRE', 'PRE']:
+            cache.put('BP', quote(state))
+            clock.now += 61
+            self.assertEqual(cache.get('BP', NAMES), None)
+
+###########################################################################
+class test_quotecache_lru(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = QuoteCache(maxsize=2)
+        cache.put('A', quote())
+        cache.put('B', quote())
+        cache.get('A', NAMES)
+        cache.put('C', quote())
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('B', NAMES), None)
+        self.assertNotEqual(cache.get('A', NAMES), None)
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
+
+###########################################################################
@@ -0,0 +1,94 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from .data_yahoo_json import *  #yahoo json strings
+from .test_yahoo_get import StubYahoo
+
+from sites.refresh import refresh, main, parse_args
+from sites.negcache import NegativeCache
+from spreadsheet import CellRange
+from spreadsheet.api.factory import spreadsheet_api
+
+TEST_ODS = os.path.join(os.path.dirname(__file__), '..', '..', 'test.ods')
+
+###########################################################################
+class test_refresh(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.paths = []
+        for name in ['one.ods', 'two.ods']:
+            path = os.path.join(self.dir, name)
+            shutil.copy(TEST_ODS, path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read(self, path, cells):
+        doc = spreadsheet_api('odsfile', path=path)
+        return doc.read_range('Sheet1', CellRange(cells))
+
+    def test_one_fetch(self):
+        yahoo = StubYahoo(None, [DATA_TWO_SHARES], cache=None)
+        timings = refresh(self.paths, 'stock', 'Sheet1', 'A1:A20', ['B', 'C'],
+                          yahoo=yahoo)
+        self.assertEqual([t[0] for t in timings], ['read', 'fetch', 'write'])
+        self.assertEqual(len(yahoo.urls), 1)
+        self.assertEqual(yahoo.urls[0].count('BARC.L'), 1)
+        for path in self.paths:
+            self.assertEqual(self.read(path, 'A4:C5'), [
+                ['BARC.L', '178.95', 'GBp'],
+                ['VOD.L', '220.95', 'GBp'],
+            ])
+
+    def test_web_error_clears(self):
+        yahoo = StubYahoo(None, [], cache=None)
+        def fail(urls):
+            raise Warning('down')
+        yahoo._fetch_all = fail
+        with self.assertRaises(Warning):
+            refresh(self.paths, 'stock', 'Sheet1', 'A1:A20', ['B'],
+                    yahoo=yahoo)
+        for path in self.paths:
+            self.assertEqual(self.read(path, 'B4:C4'), [['', 'x']])
+
+    def test_negative_detail(self):
+        yahoo = StubYahoo(None, [DATA_TWO_SHARES], cache=None,
+                          negative=NegativeCache())
+        timings = refresh(self.paths, 'stock', 'Sheet1', 'A1:A20', ['B'],
+                          yahoo=yahoo)
+        self.assertIn('0 skipped (0 requests saved)', timings[1][2])
+
+    def test_main_errors(self):
+        out = StringIO()
+        path = os.path.join(self.dir, 'book.csv')
+        self.assertEqual(main([path], out), 2)
+        self.assertIn('unsupported workbook', out.getvalue())
+
+    def test_bad_arguments(self):
+        stderr, sys.stderr = sys.stderr, StringIO()  #argparse usage
+        try:
+            for args in [['-k', 'A1:'], ['-k', 'B1:A1'], ['-d', 'B,1'],
+                         ['-d', 'B,'], ['-s', '']]:
+                with self.assertRaises(SystemExit):
+                    parse_args([self.paths[0]] + args)
+            self.assertIn("bad range 'A1:'", sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    def test_parse_args(self):
+        args = parse_args([self.paths[0], '-k', 'A2:A9', '-d', 'C,D'])
+        self.assertEqual(args.keyrange, 'A2:A9')
+        self.assertEqual(args.datacols, ['C', 'D'])
+        self.assertEqual(parse_args([self.paths[0]]).datacols, ['B', 'C'])
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import shutil
+import tempfile
+import unittest
+import threading
+
+from .data_yahoo_json import *  #yahoo json strings
+
+from sites.yahoo import Yahoo
+from sites.quotecache import QuoteCache
+from web.httpagent import HttpAgent
+from web.retry import RetryPolicy
+from web.singleflight import SingleFlight
+from web.cassette import Cassette
+from spreadsheet import CellRange
+from spreadsheet.api.factory import spreadsheet_api
+
+# the engines this interpreter can run
+NO_ASYNC = sys.version_info < (3, 6)
+ENGINES = [e for e in Yahoo.ENGINES if not (NO_ASYNC and e == 'asyncio')]
+
+###########################################################################
+class StubYahoo(Yahoo):
+    """Yahoo serving canned responses instead of fetching URLs."""
+    def __init__(self, doc, responses, **kwargs):
+        kwargs.setdefault('negative', None)
+        Yahoo.__init__(self, doc, **kwargs)
+        self.responses = responses
+        self.urls = []
+
+    def _fetch_all(self, urls):
+        self.urls.extend(urls)
+        return [self.responses.pop(0) for url in urls]
+
+###########################################################################
+class test_yahoo_get(unittest.TestCase):
+    def setUp(self):
+        self.doc = spreadsheet_api('memory', sheets={'Sheet1': {
+            'A1': 'BARC.L', 'A2': 'not a ticker', 'A3': 'VOD.L',
+            'B2': 'keep',
+        }})
+
+    def test_stock(self):
+        get = StubYahoo(self.doc, [DATA_TWO_SHARES], cache=None)
+        get.stock(sheet='Sheet1', keyrange='A1:A10', datacols=['B', 'C'])
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('B1:C3')),
+                         [['178.95', 'GBp'], ['keep', ''], ['220.95', 'GBp']])
+        self.assertEqual(len(get.urls), 1)
+
+    def test_round_trips(self):
+        get = StubYahoo(self.doc, [DATA_TWO_SHARES], cache=None)
+        get.stock(sheet='Sheet1', keyrange='A1:A10', datacols=['B', 'C'])
+        self.assertEqual(self.doc.counts(), {
+            'read_range': 1, 'batch': 1, 'clear_range': 4, 'write_range': 4,
+        })
+
+    def test_unknown_mode(self):
+        with self.assertRaises(AttributeError):
+            StubYahoo(self.doc, []).get('bond', sheet='Sheet1')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(AttributeError):
+            StubYahoo(self.doc, [], engine='fibres')
+
+    @unittest.skipIf(NO_ASYNC, "engine 'asyncio' needs Python 3.6+")
+    def test_asyncio_engine(self):
+        get = StubYahoo(self.doc, [], engine='asyncio')
+        get.web = None
+        with self.assertRaises(Warning):
+            Yahoo._fetch_all(get, ['nonsense://url'])
+        self.assertEqual(get.web.error(), "Exception: unknown url type: "
+                                          "'nonsense://url'")
+
+    def test_cache_saves_fetch(self):
+        cache = QuoteCache()
+        StubYahoo(self.doc, [DATA_TWO_SHARES], cache=cache).stock(
+            sheet='Sheet1', keyrange='A1:A10', datacols=['B'])
+        get = StubYahoo(self.doc, [], cache=cache)
+        get.stock(sheet='Sheet1', keyrange='A1:A10', datacols=['B'])
+        self.assertEqual(get.urls, [])
+        self.assertEqual(self.doc.value('Sheet1', 'B3'), 220.95)
+
+    def test_stale_when_circuit_open(self):
+        cache = QuoteCache(ttl=-1)  #stored quotes are stale at once
+        StubYahoo(self.doc, [DATA_TWO_SHARES], cache=cache).stock(
+            sheet='Sheet1', keyrange='A1:A10', datacols=['B'])
+        self.doc.clear_range('Sheet1', CellRange('B1:B3'))
+        get = StubYahoo(self.doc, [], cache=cache)
+        get._fetch_all = self.circuit_open(get)
+        get.stock(sheet='Sheet1', keyrange='A1:A10', datacols=['B'])
+        self.assertEqual(self.doc.value('Sheet1', 'B3'), 220.95)
+
+        cache.clear()
+        with self.assertRaises(Warning):
+            get.stock(sheet='Sheet1', keyrange='A1:A10', datacols=['B'])
+
+    def circuit_open(self, get):
+        def fail(urls):
+            get.web = HttpAgent()
+            get.web.state['error'] = 'CircuitOpen: query1.finance.yahoo.com'
+            raise Warning(str(get.web))
+        return fail
+
+###########################################################################
+class test_yahoo_cassette(unittest.TestCase):
+    def setUp(self):
+        self.doc = spreadsheet_api('memory', sheets={'Sheet1': {
+            'A1': 'BARC.L', 'A2': 'VOD.L',
+        }})
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'yahoo.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def get(self, cassette, engine='threads'):
+        get = Yahoo(self.doc, cache=None, negative=None, inflight=None,
+                    engine=engine, cassette=cassette)
+        get.stock(sheet='Sheet1', keyrange='A1:A2', datacols=['B', 'C'])
+
+    def test_replay(self):
+        # the URL Yahoo asks for, from a miss on an empty cassette
+        Cassette(self.path, Cassette.RECORD).save()
+        with self.assertRaises(Warning) as raised:
+            self.get(Cassette(self.path))
+        self.assertIn('Cassette: no recording', str(raised.exception))
+        url = re.search(r' url: (\S+)', str(raised.exception)).group(1)
+
+        with Cassette(self.path, Cassette.RECORD) as cassette:
+            agent = HttpAgent()
+            agent._reset_state(url)
+            agent.state.update(status=200, html=DATA_TWO_SHARES)
+            cassette.record(url, agent.state, 0.25, 'GET', agent.Header)
+
+        for engine in ENGINES:
+            self.doc.clear_range('Sheet1', CellRange('B1:C2'))
+            cassette = Cassette(self.path)
+            self.get(cassette, engine)
+            self.assertEqual(self.doc.read_range('Sheet1', CellRange('B1:C2')),
+                             [['178.95', 'GBp'], ['220.95', 'GBp']])
+            self.assertEqual(cassette.stats()['played'], 1)
+
+###########################################################################
+class test_yahoo_inflight(unittest.TestCase):
+    def setUp(self):
+        self.doc = spreadsheet_api('memory', sheets={'Sheet1': {
+            'A1': 'BARC.L', 'A2': 'VOD.L',
+        }})
+        self.inflight = SingleFlight()
+        self.release = threading.Event()
+
+    def leader(self, responses):
+        get = StubYahoo(self.doc, responses, cache=None,
+                        inflight=self.inflight)
+        fetch_all = get._fetch_all
+        def blocked(urls):
+            self.release.wait(5)
+            if not responses:
+                get.web = HttpAgent()
+                get.web.state['error'] = 'HTTPError: 503'
+                raise Warning(str(get.web))
+            return fetch_all(urls)
+        get._fetch_all = blocked
+        def stock():
+            try:
+                get.stock(sheet='Sheet1', keyrange='A1:A2',
+                          datacols=['B', 'C'])
+            except Warning:
+                pass
+        thread = threading.Thread(target=stock)
+        thread.start()
+        while self.inflight.in_flight() < 2:
+            pass
+        return thread
+
+    def test_overlap_shared(self):
+        thread = self.leader([DATA_TWO_SHARES])
+        get = StubYahoo(self.doc, [], cache=None, inflight=self.inflight)
+        self.release.set()
+        get.stock(sheet='Sheet1', keyrange='A2:A2', datacols=['D'])
+        thread.join(5)
+        self.assertEqual(get.urls, [])
+        self.assertEqual(self.doc.value('Sheet1', 'D2'), 220.95)
+        self.assertEqual(self.doc.value('Sheet1', 'B1'), 178.95)
+
+    def test_overlap_failure(self):
+        thread = self.leader([])
+        get = StubYahoo(self.doc, [], cache=None, inflight=self.inflight)
+        self.release.set()
+        with self.assertRaises(Warning):
+            get.stock(sheet='Sheet1', keyrange='A2:A2', datacols=['D'])
+        thread.join(5)
+        self.assertEqual(get.urls, [])
+        self.assertEqual(get.web.error(), 'HTTPError: 503')
+        self.assertTrue(get.web.shared())
+
+    def test_other_source_not_shared(self):
+        thread = self.leader([DATA_TWO_SHARES])
+        get = StubYahoo(self.doc, [DATA_TWO_SHARES], cache=None,
+                        inflight=self.inflight,
+                        url_base='http://127.0.0.1:1/v7/finance/quote')
+        get.stock(sheet='Sheet1', keyrange='A2:A2', datacols=['D'])
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(len(get.urls), 1)
+        self.assertEqual(self.doc.value('Sheet1', 'D2'), 220.95)
+
+    def test_wait_timeout(self):
+        thread = self.leader([DATA_TWO_SHARES])
+        get = StubYahoo(self.doc, [], cache=None, inflight=self.inflight)
+        get.web.retry = RetryPolicy(deadline=0.1)
+        with self.assertRaises(Warning):
+            get.stock(sheet='Sheet1', keyrange='A2:A2', datacols=['D'])
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(get.urls, [])
+        self.assertTrue(get.web.error().startswith('FlightTimeout'))
+
+###########################################################################
+class test_yahoo_get_many(unittest.TestCase):
+    def setUp(self):
+        self.doc = spreadsheet_api('memory', sheets={'Sheet1': {
+            'A1': 'BARC.L', 'A2': 'VOD.L', 'E1': 'EUR/USD', 'H1': 'FTSE',
+        }})
+
+    def test_one_fetch(self):
+        get = StubYahoo(self.doc, [DATA_TWO_SHARES], cache=None)
+        get.get_many([
+            {'mode': 'stock', 'sheet': 'Sheet1', 'keyrange': 'A1:A10',
+             'datacols': ['B', 'C']},
+            ('fx', 'Sheet1', 'E1:E10', ['F']),
+            {'mode': 'index', 'keyrange': 'H1:H10', 'datacols': ['I'],
+             'fields': ['currency']},
+        ])
+        self.assertEqual(self.doc.counts()['read_range'], 3)
+        self.assertEqual(len(get.urls), 1)
+        for ticker in ['BARC.L', 'VOD.L', 'EURUSD=X', '^FTSE']:
+            self.assertIn(ticker, get.urls[0])
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('B1:C2')),
+                         [['178.95', 'GBp'], ['220.95', 'GBp']])
+        self.assertEqual(self.doc.value('Sheet1', 'F1'), 0.0)
+        self.assertEqual(self.doc.value('Sheet1', 'I1'), 'n/a')
+
+    def test_web_error_clears(self):
+        self.doc.write_cell_string('Sheet1', 1, 0, 'stale')
+        get = StubYahoo(self.doc, [], cache=None)
+        def fail(urls):
+            raise Warning('down')
+        get._fetch_all = fail
+        with self.assertRaises(Warning):
+            get.get_many([('stock', 'Sheet1', 'A1:A10', ['B'])])
+        self.assertEqual(self.doc.value('Sheet1', 'B1'), '')
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
+
+###########################################################################
@@ -0,0 +1,86 @@
+import unittest
+
+from sites.yahoo import KeyTickerStock, KeyTickerFX, KeyTickerIndex, TickerMemo
+
+URL = 'https://query1.finance.yahoo.com/v7/finance/quote?symbols='
+
+###########################################################################
+class test_keyticker_urls(unittest.TestCase):
+    def test_single_batch(self):
+        o = KeyTickerStock(['BP', 'VOD.L'])
+        self.assertEqual(o.urls(10), [URL + 'BP,VOD.L'])
+
+    def test_split_batches(self):
+        o = KeyTickerStock(['BP', 'VOD.L', 'GSK.L'])
+        self.assertEqual(o.urls(2), [URL + 'BP,VOD.L', URL + 'GSK.L'])
+        self.assertEqual(o.urls(1), [URL + 'BP', URL + 'VOD.L', URL + 'GSK.L'])
+
+    def test_no_tickers(self):
+        o = KeyTickerStock(['', 'not a ticker'])
+        self.assertEqual(o.urls(10), [])
+
+    def test_explicit_tickers(self):
+        o = KeyTickerFX(['EURUSD'])
+        self.assertEqual(o.urls(1, ['A', 'B']), [URL + 'A', URL + 'B'])
+
+    def test_fields(self):
+        o = KeyTickerStock(['BP'])
+        self.assertEqual(o.url(fields=['bid', 'ask']),
+                         URL + 'BP&fields=bid,ask,symbol')
+        self.assertEqual(o.urls(1, fields=['symbol', 'bid']),
+                         [URL + 'BP&fields=symbol,bid'])
+
+###########################################################################
+class test_keyticker_dedup(unittest.TestCase):
+    def test_each_ticker_once(self):
+        o = KeyTickerStock(['BP', 'VOD.L', 'BP.', ' BP ', 'x', 'BP', 'VOD.L'])
+        self.assertEqual(o.tickers(), ['BP', 'VOD.L'])
+        self.assertEqual(o.urls(10), [URL + 'BP,VOD.L'])
+
+    def test_rows(self):
+        o = KeyTickerFX(['EUR/USD', '', 'EURUSD', 'EURUSD=X', 'GBPUSD'])
+        self.assertEqual(o.rows('EURUSD=X'), [0, 2, 3])
+        self.assertEqual(o.rows('GBPUSD=X'), [4])
+        self.assertEqual(o.rows('JPYUSD=X'), [])
+        self.assertEqual(o[' EUR/USD '.strip()], 'EURUSD=X')
+
+###########################################################################
+class test_keyticker_classify(unittest.TestCase):
+    def test_stock(self):
+        self.assertEqual(
+            KeyTickerStock().classify(['BP', 'BP.', 'BP.L', ' VOD.L ',
+                                       'bp', 'BP..', 'LONGER', '']),
+            ['BP', 'BP', 'BP.L', 'VOD.L', '', '', '', ''])
+
+    def test_fx(self):
+        self.assertEqual(
+            KeyTickerFX().classify(['EURUSD=X', 'EUR/USD', 'EUR:USD',
+                                    'EURUSD', 'EUR-USD', 'EURUS']),
+            ['EURUSD=X', 'EURUSD=X', 'EURUSD=X', 'EURUSD=X', '', ''])
+
+    def test_index(self):
+        self.assertEqual(
+            KeyTickerIndex().classify(['^FTSE', 'FTSE', 'FT', '^^FTSE']),
+            ['^FTSE', '^FTSE', '', ''])
+
+    def test_memo(self):
+        o = KeyTickerStock()
+        o.MEMO.clear()
+        o.classify(['ZZT', 'x', 'ZZT'])
+        self.assertEqual(len(o.MEMO), 2)
+        self.assertEqual(o.MEMO.get('x'), '')
+        self.assertIsNone(KeyTickerIndex.MEMO.get('ZZT'))  # memo per mode
+
+    def test_memo_bounded(self):
+        memo = TickerMemo(maxsize=2)
+        memo.put('a', 'A')
+        memo.put('b', 'B')
+        memo.put('c', 'C')
+        self.assertEqual(len(memo), 1)
+        self.assertEqual(memo.get('c'), 'C')
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
+
+###########################################################################
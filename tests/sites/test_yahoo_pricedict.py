@@ -59,6 +59,50 @@ class test_cpd_miscellaneous(unittest.TestCase):
                              'GBPUSD=X': ['1.315824', 'USD'],
                          })
 
+###########################################################################
+class test_cpd_json_structure(unittest.TestCase):
+    def test_quoted_comma_and_nested_object(self):
+        text = ('{"quoteResponse":{"result":[{"longName":"Foo, Bar plc",'
+                '"extra":{"a":[1,{"b":2}]},"regularMarketPrice":12.5,'
+                '"currency":"GBp","symbol":"FOO.L"},'
+                '{"currency":"USD","regularMarketPrice":3,"symbol":"BAZ"}],'
+                '"error":null}}')
+        o = PriceDict(text)
+        self.assertEqual(o.data(), {'FOO.L': ['12.5', 'GBp'],
+                                    'BAZ':   ['3', 'USD'],
+                                })
+
+    def test_invalid_json(self):
+        self.assertEqual(PriceDict('no response').data(), {})
+        self.assertEqual(PriceDict('{"quoteResponse":null}').data(), {})
+
+###########################################################################
+class test_cpd_update(unittest.TestCase):
+    def test_merge_batches(self):
+        o = PriceDict('')
+        o.update(PriceDict(DATA_ONE_SHARE))
+        o.update(PriceDict(DATA_ONE_FX))
+        self.assertEqual(o.data(), { 'GSK.L':    ['1351.0', 'GBp'],
+                                     'GBPEUR=X': ['1.1277249', 'EUR'],
+                                 })
+
+###########################################################################
+class test_cpd_fields(unittest.TestCase):
+    def test_bid_ask_volume(self):
+        o = PriceDict(DATA_TWO_SHARES, names=['bid', 'ask', 'regularMarketVolume'])
+        self.assertEqual(o['VOD.L'], ['220.95', '221.0', '52058796'])
+        self.assertEqual(o.names(), ['bid', 'ask', 'regularMarketVolume'])
+
+    def test_missing_field(self):
+        o = PriceDict(DATA_KNOWN_SYMBOL_WRONG_EXCHANGE,
+                      names=['quoteType', 'tradeable', 'bid'])
+        self.assertEqual(o['AAT.L'], ['EQUITY', 'false', ''])
+
+    def test_formats_and_defaults(self):
+        o = PriceDict('', names=['currency', 'bid', 'shortName'])
+        self.assertEqual(o.formats(), ['%s', '%f', '%s'])
+        self.assertEqual(o.defaults(), ['n/a', 0, 'n/a'])
+
 ###########################################################################
 # class test_cpd_known_anomalies(unittest.TestCase):
 #     def test_anomaly_42TE(self):
@@ -0,0 +1,115 @@
+import json
+import unittest
+
+from .yahoo_server import YahooServer, make_quote
+from .test_yahoo_get import NO_ASYNC
+
+from sites.yahoo import Yahoo, PriceDict
+from spreadsheet import CellRange
+from spreadsheet.api.factory import spreadsheet_api
+from web.connpool import ConnectionPool
+from web.httpagent import HttpAgent
+from web.retry import RetryPolicy
+from web.throttle import HostLimits
+
+###########################################################################
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = None
+        self.pool = ConnectionPool()
+        self.limits = HostLimits()
+
+    def tearDown(self):
+        self.pool.clear()
+        if self.server is not None:
+            self.server.stop()
+
+    def serve(self, **kwargs):
+        self.server = YahooServer(**kwargs).start()
+        return self.server
+
+    def agent(self, **kwargs):
+        return HttpAgent(pool=self.pool, limits=self.limits, **kwargs)
+
+###########################################################################
+class test_yahoo_server(ServerTestCase):
+    def test_quotes(self):
+        server = self.serve()
+        agent = self.agent()
+        html = agent.fetch(server.url_base +
+                           'symbols=BP.L,ZZZ.L,EURUSD=X'
+                           '&fields=currency,regularMarketPrice')
+        self.assertTrue(agent.ok())
+        self.assertEqual(agent.info()['Content-Encoding'], 'gzip')
+        result = json.loads(html)['quoteResponse']['result']
+        self.assertEqual([q['symbol'] for q in result], ['BP.L', 'EURUSD=X'])
+        self.assertEqual(sorted(result[0]),
+                         ['currency', 'regularMarketPrice', 'symbol'])
+        self.assertEqual(PriceDict(html)['EURUSD=X'],
+                         [str(make_quote('EURUSD=X')['regularMarketPrice']),
+                          'USD'])
+        self.assertEqual(server.stats()['symbols'], 3)
+
+    def test_no_gzip(self):
+        server = self.serve(gzip=False)
+        agent = self.agent()
+        agent.fetch(server.url_base + 'symbols=BP.L')
+        self.assertEqual(agent.wire_bytes(), agent.body_bytes())
+
+    def test_throttle(self):
+        server = self.serve(throttle=1)
+        waits = []
+        agent = self.agent(retry=RetryPolicy(max_tries=2, sleep=waits.append))
+        agent.fetch(server.url_base + 'symbols=BP.L')
+        agent.fetch(server.url_base + 'symbols=BP.L')
+        self.assertEqual(waits, [1])
+        self.assertEqual(server.stats()[200], 1)
+        self.assertEqual(server.stats()[429], 2)
+
+    def test_errors(self):
+        server = self.serve(error_rate=1, seed=1)
+        agent = self.agent(retry=RetryPolicy(max_tries=3, sleep=lambda s: 0))
+        agent.fetch(server.url_base + 'symbols=BP.L')
+        self.assertTrue(agent.failed())
+        self.assertEqual(agent.state['tries'], 3)
+        self.assertIn(agent.status_code(), [500, 503])
+
+    def test_max_url(self):
+        server = self.serve(max_url=60)
+        agent = self.agent()
+        agent.fetch(server.url_base + 'symbols=' + 'BP.L,' * 20)
+        self.assertEqual(agent.status_code(), 414)
+        self.assertEqual(agent.state['tries'], 1)
+
+    def test_latency(self):
+        server = self.serve(latency=5)
+        agent = self.agent(retry=RetryPolicy(max_tries=1))
+        agent.params = {'webTimeOut': 1}
+        agent.fetch(server.url_base + 'symbols=BP.L')
+        self.assertTrue(agent.failed())
+
+###########################################################################
+class test_yahoo_server_stack(ServerTestCase):
+    def yahoo_get(self, engine):
+        server = self.serve()
+        tickers = ['T%03d.L' % i for i in range(250)]
+        doc = spreadsheet_api('memory', sheets={'Sheet1': dict(
+            ('A%d' % (i + 1), t) for (i, t) in enumerate(tickers))})
+        yahoo = Yahoo(doc, batchsize=100, cache=None, negative=None,
+                      inflight=None, engine=engine, url_base=server.url_base)
+        yahoo.stock(sheet='Sheet1', keyrange='A1:A250', datacols=['B', 'C'])
+        self.assertEqual(doc.read_range('Sheet1', CellRange('B250:C250')),
+                         [[str(make_quote('T249.L')['regularMarketPrice']),
+                           'GBp']])
+        self.assertEqual(server.stats()[200], 3)
+
+    def test_threads(self):
+        self.yahoo_get('threads')
+
+    @unittest.skipIf(NO_ASYNC, "engine 'asyncio' needs Python 3.6+")
+    def test_asyncio(self):
+        self.yahoo_get('asyncio')
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
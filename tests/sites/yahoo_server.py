@@ -0,0 +1,247 @@
+###########################################################################
+# Local stand-in for query1.finance.yahoo.com/v7/finance/quote, for load
+# tests of batching, retries and pooling.
+#
+# Serve from the top-level directory:
+#
+#   python3 -m tests.sites.yahoo_server [--port N] [--latency S] ...
+#
+# Quotes are generated for any symbol list, in the shape of the recorded
+# responses in data_yahoo_json.py, with prices derived from the symbol so
+# repeated runs agree. Symbols starting with --unknown are left out of the
+# result, as Yahoo does for symbols it does not know.
+###########################################################################
+import sys
+import json
+import time
+import gzip
+import zlib
+import random
+import argparse
+import threading
+try:
+    #Python3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlsplit, parse_qs
+except:
+    #Python2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlsplit, parse_qs
+
+from web.throttle import TokenBucket
+
+PATH = '/v7/finance/quote'
+
+###########################################################################
+def make_quote(symbol):
+    """A quote for symbol, every field a function of the symbol."""
+    price = 1 + zlib.crc32(symbol.encode('utf-8')) % 100000 / 100.0
+    if symbol.endswith('=X'):
+        quote_type, currency = 'CURRENCY', symbol[3:6] or 'USD'
+    elif symbol.startswith('^'):
+        quote_type, currency = 'INDEX', 'GBP'
+    else:
+        quote_type = 'EQUITY'
+        currency = 'GBp' if symbol.endswith('.L') else 'USD'
+    return {
+        'language': 'en-US',
+        'quoteType': quote_type,
+        'currency': currency,
+        'regularMarketPrice': price,
+        'regularMarketPreviousClose': round(price * 0.99, 2),
+        'bid': round(price * 0.999, 2),
+        'ask': round(price * 1.001, 2),
+        'regularMarketVolume': int(price * 1000),
+        'marketState': 'REGULAR',
+        'gmtOffSetMilliseconds': 0,
+        'exchangeTimezoneName': 'Europe/London',
+        'shortName': symbol,
+        'tradeable': True,
+        'symbol': symbol,
+    }
+
+def make_response(symbols, fields=None, unknown='ZZ'):
+    result = []
+    for symbol in symbols:
+        if not symbol or (unknown and symbol.startswith(unknown)):
+            continue
+        quote = make_quote(symbol)
+        if fields:
+            quote = dict((k, v) for (k, v) in quote.items()
+                         if k in fields or k == 'symbol')
+        result.append(quote)
+    return json.dumps({'quoteResponse': {'result': result, 'error': None}},
+                      separators=(',', ':'))
+
+###########################################################################
+class YahooServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server answering Yahoo quote queries.
+
+    Constructor and usage:
+
+    server = YahooServer(port=0, latency=0, jitter=0, error_rate=0,
+                         throttle=None, max_url=None, gzip=True,
+                         unknown='ZZ', seed=None)
+    server.start()
+    yahoo = Yahoo(url_base=server.url_base)
+    ...
+    server.stop()
+
+      latency     seconds before each response, plus up to jitter more.
+      error_rate  fraction of requests answered 500 or 503.
+      throttle    requests per second let through, with bursts of as
+                  many; the rest get 429 with 'Retry-After: 1'. None
+                  for no limit.
+      max_url     longest request line accepted, else 414. None for no
+                  limit.
+      gzip        compress responses for clients that accept gzip.
+
+    Public methods:
+
+    start()        serves on a daemon thread.
+    stop()         shuts down and closes the socket.
+    stats()        returns a dict of counters: requests, symbols, bytes
+                   and one per status code.
+    """
+
+    daemon_threads = True
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, port=0, latency=0, jitter=0, error_rate=0,
+                 throttle=None, max_url=None, gzip=True, unknown='ZZ',
+                 seed=None):
+        HTTPServer.__init__(self, ('127.0.0.1', port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = None
+        if throttle is not None:
+            self.bucket = TokenBucket(throttle, max(1, throttle))
+        self.max_url = max_url
+        self.gzip = gzip
+        self.unknown = unknown
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'symbols': 0, 'bytes': 0}
+        self.thread = None
+        self.url_base = 'http://127.0.0.1:%d%s?' % (self.server_address[1],
+                                                    PATH)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def count(self, status, symbols=0, size=0):
+        with self.lock:
+            self.counts['requests'] += 1
+            self.counts['symbols'] += symbols
+            self.counts['bytes'] += size
+            self.counts[status] = self.counts.get(status, 0) + 1
+
+    def fail(self):
+        # status of an injected failure, or None
+        with self.lock:
+            if self.random.random() < self.error_rate:
+                return self.random.choice([500, 503])
+        return None
+
+    def delay(self):
+        with self.lock:
+            return self.latency + self.jitter * self.random.random()
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        if parts.path != PATH:
+            return self.reply(404)
+        if server.max_url is not None and \
+                len(self.requestline) > server.max_url:
+            return self.reply(414)
+
+        delay = server.delay()
+        if delay > 0:
+            time.sleep(delay)
+        if server.bucket is not None and \
+                server.bucket.reserve(timeout=0) is None:
+            return self.reply(429, headers={'Retry-After': '1'})
+        status = server.fail()
+        if status is not None:
+            return self.reply(status)
+
+        query = parse_qs(parts.query)
+        symbols = ','.join(query.get('symbols', [])).split(',')
+        fields = ','.join(query.get('fields', [])).split(',')
+        body = make_response(symbols, [f for f in fields if f],
+                             server.unknown).encode('utf-8')
+        headers = {'Content-Type': 'application/json;charset=utf-8'}
+        if server.gzip and \
+                'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = _gzip(body)
+            headers['Content-Encoding'] = 'gzip'
+        self.reply(200, body, headers, len(symbols))
+
+    def reply(self, status, body=b'', headers={}, symbols=0):
+        self.server.count(status, symbols, len(body))  #before the client reads
+        self.send_response(status)
+        for key, value in sorted(headers.items()):
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def _gzip(data):
+    try:
+        return gzip.compress(data)
+    except AttributeError:  # Python2
+        import io
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+            f.write(data)
+        return buf.getvalue()
+
+###########################################################################
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Yahoo quote stub server')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle', type=float, default=None)
+    parser.add_argument('--max-url', type=int, default=None)
+    parser.add_argument('--no-gzip', dest='gzip', action='store_false')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = YahooServer(args.port, args.latency, args.jitter,
+                         args.error_rate, args.throttle, args.max_url,
+                         args.gzip, seed=args.seed)
+    print('serving ' + server.url_base)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(server.stats())
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+###########################################################################
@@ -0,0 +1,151 @@
+import unittest
+
+from spreadsheet import CellRange, DataSheet, DataFrame
+from spreadsheet.datasheet import contiguous_runs
+from spreadsheet.api.factory import SpreadsheetAPI
+
+###########################################################################
+class CellDict(SpreadsheetAPI):
+    """Minimal cell by cell backend counting calls."""
+    def __init__(self, cells=None):
+        self.cells = dict(cells or {})
+        self.calls = {}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def read_cell_string(self, sheetname, col, row):
+        self._count('read_cell_string')
+        return str(self.cells.get((sheetname, col, row), ''))
+
+    def clear_cell(self, sheetname, col, row):
+        self._count('clear_cell')
+        self.cells.pop((sheetname, col, row), None)
+
+    def write_cell_numeric(self, sheetname, col, row, value):
+        self._count('write_cell_numeric')
+        self.cells[(sheetname, col, row)] = value
+
+    def write_cell_string(self, sheetname, col, row, value):
+        self._count('write_cell_string')
+        self.cells[(sheetname, col, row)] = value
+
+###########################################################################
+class test_spreadsheetapi_read_range(unittest.TestCase):
+    def test_default_reads_cell_by_cell(self):
+        doc = CellDict({('S', 0, 0): 'BP', ('S', 1, 1): 'VOD'})
+        self.assertEqual(doc.read_range('S', CellRange('A1:B2')),
+                         [['BP', ''], ['', 'VOD']])
+        self.assertEqual(doc.calls['read_cell_string'], 4)
+
+    def test_default_batch_is_noop(self):
+        doc = CellDict()
+        with doc.batch() as d:
+            self.assertIs(d, doc)
+
+###########################################################################
+class test_datasheet_read_column(unittest.TestCase):
+    def setUp(self):
+        self.doc = CellDict({('S', 0, 1): 'BP', ('S', 0, 2): 'VOD',
+                             ('S', 1, 1): 'x'})
+        self.doc.read_range = self.read_range
+        self.reads = []
+
+    def read_range(self, sheetname, cells):
+        self.reads.append(cells)
+        return SpreadsheetAPI.read_range(self.doc, sheetname, cells)
+
+    def test_one_bulk_read(self):
+        col = DataSheet(self.doc, 'S').read_column('A2:B5')
+        self.assertEqual(col.rows(), ['BP', 'VOD', '', ''])
+        self.assertEqual(self.reads, [CellRange('A2:A5')])
+
+    def test_truncate(self):
+        col = DataSheet(self.doc, 'S').read_column('A2:A5', truncate=True)
+        self.assertEqual(col.rows(), ['BP', 'VOD'])
+        self.assertEqual(col.cells(), CellRange('A2:A3'))
+
+###########################################################################
+class test_contiguous_runs(unittest.TestCase):
+    def test_runs(self):
+        self.assertEqual(contiguous_runs([]), [])
+        self.assertEqual(contiguous_runs([False, False]), [])
+        self.assertEqual(contiguous_runs([True, True, False, True]),
+                         [(0, 1), (3, 3)])
+        self.assertEqual(contiguous_runs([False, True, True]), [(1, 2)])
+
+###########################################################################
+class test_datasheet_write_frame(unittest.TestCase):
+    def setUp(self):
+        self.doc = CellDict({('S', 0, 0): 'BP', ('S', 0, 1): 'VOD',
+                             ('S', 0, 2): '', ('S', 0, 3): 'GSK'})
+        self.writes = []
+        self.doc.write_range = self.write_range
+        self.sheet = DataSheet(self.doc, 'S')
+
+    def write_range(self, sheetname, cells, rows):
+        self.writes.append((cells.name(), rows))
+        SpreadsheetAPI.write_range(self.doc, sheetname, cells, rows)
+
+    def test_one_write_per_run(self):
+        keycol = self.sheet.read_column('A1:A4')
+        frame = DataFrame(keycol, {'BP': 1, 'VOD': 1, 'GSK': 1}, ['B', 'C'])
+        frame.update({'BP':  ['1.5', 'GBp'],
+                      'VOD': ['220', 'GBp'],
+                      'GSK': ['n/a', 'GBp'],
+                      '':    []})
+        self.sheet.write_frame(frame)
+        self.assertEqual(self.writes, [
+            ('B1:B2', [[1.5], [220.0]]),
+            ('B4',    [['n/a']]),
+            ('C1:C2', [['GBp'], ['GBp']]),
+            ('C4',    [['GBp']]),
+        ])
+        self.assertEqual(self.doc.cells[('S', 1, 0)], 1.5)
+        self.assertEqual(self.doc.cells[('S', 2, 3)], 'GBp')
+
+###########################################################################
+class test_dataframe_update(unittest.TestCase):
+    def test_fan_out(self):
+        doc = CellDict({('S', 0, 0): 'BP', ('S', 0, 1): 'VOD',
+                        ('S', 0, 2): 'BP', ('S', 0, 3): 'BP'})
+        keycol = DataSheet(doc, 'S').read_column('A1:A4')
+        frame = DataFrame(keycol, {'BP': 1, 'VOD': 1}, ['B', 'C'])
+        self.assertEqual(frame.keyrows(), {'BP': [0, 2, 3], 'VOD': [1]})
+
+        lookups = []
+        class Prices(dict):
+            def __getitem__(self, key):
+                lookups.append(key)
+                return dict.__getitem__(self, key)
+        frame.update(Prices({'BP': ['1.5', 'GBp'], 'VOD': ['220']}))
+        self.assertEqual(lookups, ['BP', 'VOD'])
+        self.assertEqual(frame.columns()[0].rows(), ['1.5', '220', '1.5', '1.5'])
+        self.assertEqual(frame.columns()[1].rows(), ['GBp', '', 'GBp', 'GBp'])
+
+###########################################################################
+class test_datasheet_clear_frame(unittest.TestCase):
+    def test_one_clear_per_run(self):
+        doc = CellDict({('S', 0, 0): 'BP', ('S', 0, 1): 'VOD',
+                        ('S', 0, 2): '',   ('S', 0, 3): 'GSK',
+                        ('S', 1, 0): 1.0,  ('S', 1, 2): 'keep',
+                        ('S', 1, 3): 2.0})
+        clears = []
+        def clear_range(sheetname, cells):
+            clears.append(cells.name())
+            SpreadsheetAPI.clear_range(doc, sheetname, cells)
+        doc.clear_range = clear_range
+        sheet = DataSheet(doc, 'S')
+        frame = DataFrame(sheet.read_column('A1:A4'),
+                          {'BP': 1, 'VOD': 1, 'GSK': 1}, ['B'])
+        sheet.clear_frame(frame)
+        self.assertEqual(clears, ['B1:B2', 'B4'])
+        self.assertEqual(doc.cells.get(('S', 1, 0)), None)
+        self.assertEqual(doc.cells.get(('S', 1, 2)), 'keep')
+        self.assertEqual(doc.cells.get(('S', 1, 3)), None)
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
+
+###########################################################################
@@ -0,0 +1,76 @@
+import unittest
+
+from spreadsheet import CellRange, DataSheet, DataFrame
+from spreadsheet.api.factory import spreadsheet_api
+
+###########################################################################
+class test_memory_cells(unittest.TestCase):
+    def setUp(self):
+        self.doc = spreadsheet_api('memory', sheets={
+            'Sheet1': {'A1': 'BP', 'B1': 1.5, (0, 1): 'VOD'},
+        })
+
+    def test_initial_values(self):
+        self.assertEqual(self.doc.value('Sheet1', 'A1'), 'BP')
+        self.assertEqual(self.doc.value('Sheet1', 'B1'), 1.5)
+        self.assertEqual(self.doc.value('Sheet1', 'A2'), 'VOD')
+        self.assertEqual(self.doc.value('Sheet1', 'Z99'), '')
+        self.assertEqual(self.doc.value('Other', 'A1'), '')
+
+    def test_read_string(self):
+        self.assertEqual(self.doc.read_cell_string('Sheet1', 1, 0), '1.5')
+        self.doc.write_cell_numeric('Sheet1', 1, 0, 2)
+        self.assertEqual(self.doc.read_cell_string('Sheet1', 1, 0), '2')
+
+    def test_write_and_clear(self):
+        self.doc.write_cell_string('Sheet1', 2, 2, 'GBp')
+        self.doc.write_cell_boolean('Sheet1', 3, 2, True)
+        self.assertEqual(self.doc.value('Sheet1', 'C3'), 'GBp')
+        self.assertEqual(self.doc.value('Sheet1', 'D3'), 1.0)
+        self.doc.clear_cell('Sheet1', 2, 2)
+        self.assertEqual(self.doc.value('Sheet1', 'C3'), '')
+
+    def test_sparse(self):
+        self.doc.write_cell_string('Sheet1', 5, 5, '')
+        self.doc.read_range('Sheet1', CellRange('A1:Z100'))
+        self.assertEqual(len(self.doc.cells('Sheet1')), 3)
+
+    def test_ranges(self):
+        self.doc.write_range('Sheet1', CellRange('C1:D2'),
+                             [[1.0, 'a'], ['b', 2.5]])
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('B1:D2')),
+                         [['1.5', '1', 'a'], ['', 'b', '2.5']])
+        self.doc.clear_range('Sheet1', CellRange('A1:C2'))
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('A1:D2')),
+                         [['', '', '', 'a'], ['', '', '', '2.5']])
+
+    def test_show_box(self):
+        self.doc.show_box('Processing finished', 'Status')
+        self.assertEqual(self.doc.messages(),
+                         [('Status', 'Processing finished')])
+
+###########################################################################
+class test_memory_counts(unittest.TestCase):
+    def test_datasheet_round_trips(self):
+        rows = dict(('A%d' % (i+1), 'T%d' % i) for i in range(1000))
+        doc = spreadsheet_api('memory', sheets={'S': rows})
+        sheet = DataSheet(doc, 'S')
+        keycol = sheet.read_column('A1:A2000', truncate=True)
+        frame = DataFrame(keycol, dict((k, 1) for k in keycol.rows()),
+                          ['B', 'C'])
+        frame.update(dict((k, ['1.0', 'GBp']) for k in keycol.rows()))
+        with doc.batch():
+            sheet.clear_frame(frame)
+            sheet.write_frame(frame)
+        self.assertEqual(doc.counts(), {
+            'read_range': 1, 'batch': 1, 'clear_range': 2, 'write_range': 2,
+        })
+        self.assertEqual(doc.value('S', 'C1000'), 'GBp')
+        doc.reset_counts()
+        self.assertEqual(doc.counts(), {})
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
+
+###########################################################################
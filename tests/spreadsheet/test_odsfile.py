@@ -0,0 +1,140 @@
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from spreadsheet import CellRange
+from spreadsheet.api.factory import spreadsheet_api
+
+CONTENT = '''<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content
+ xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+ xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+ xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+ xmlns:of="urn:oasis:names:tc:opendocument:xmlns:of:1.2"
+ office:version="1.2"><office:body><office:spreadsheet>
+<table:table table:name="Other"><table:table-row><table:table-cell office:value-type="string"><text:p>other</text:p></table:table-cell></table:table-row></table:table>
+<table:table table:name="Sheet1">
+<table:table-column table:number-columns-repeated="4"/>
+<table:table-row><table:table-cell office:value-type="string"><text:p>BP.L</text:p></table:table-cell><table:table-cell office:value-type="float" office:value="1.25"><text:p>1.25</text:p></table:table-cell><table:table-cell table:formula="of:=[.B1]*2" office:value-type="float" office:value="2.5"><text:p>2.5</text:p></table:table-cell></table:table-row>
+<table:table-row table:number-rows-repeated="3"><table:table-cell office:value-type="string"><text:p>a<text:s text:c="2"/>b</text:p></table:table-cell><table:table-cell table:number-columns-repeated="3"/></table:table-row>
+</table:table>
+</office:spreadsheet></office:body></office:document-content>
+'''
+
+###########################################################################
+class test_odsfile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'book.ods')
+        with zipfile.ZipFile(self.path, 'w') as zf:
+            zf.writestr('mimetype', 'application/vnd.oasis.opendocument.spreadsheet')
+            zf.writestr('content.xml', CONTENT, zipfile.ZIP_DEFLATED)
+            zf.writestr('styles.xml', '<styles/>', zipfile.ZIP_DEFLATED)
+        self.doc = spreadsheet_api('odsfile', path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def reopen(self):
+        return spreadsheet_api('odsfile', path=self.path)
+
+    def test_bad_path(self):
+        with self.assertRaises(AttributeError):
+            spreadsheet_api('odsfile', path=os.path.join(self.dir, 'none'))
+
+    def test_read(self):
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('A1:D3')), [
+            ['BP.L', '1.25', '2.5', ''],
+            ['a  b', '', '', ''],
+            ['a  b', '', '', ''],
+        ])
+        self.assertEqual(self.doc.read_cell_string('Sheet1', 0, 4), '')
+        self.assertEqual(self.doc.read_cell_string('Other', 0, 0), 'other')
+        self.assertEqual(self.doc.read_cell_string('Missing', 0, 0), '')
+
+    def test_pending(self):
+        self.doc.write_cell_numeric('Sheet1', 1, 2, 3)
+        self.doc.clear_cell('Sheet1', 0, 0)
+        self.assertEqual(self.doc.pending(), 2)
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('A1:B3')),
+                         [['', '1.25'], ['a  b', ''], ['a  b', '3']])
+        self.assertEqual(self.reopen().read_cell_string('Sheet1', 0, 0), 'BP.L')
+
+    def test_save_splits_repeats(self):
+        self.doc.write_range('Sheet1', CellRange('B3:C3'), [[7.5, 'GBp']])
+        self.assertEqual(self.doc.save(), 2)
+        self.assertEqual(self.doc.pending(), 0)
+        self.assertEqual(self.reopen().read_range('Sheet1', CellRange('A2:D4')), [
+            ['a  b', '', '', ''],
+            ['a  b', '7.5', 'GBp', ''],
+            ['a  b', '', '', ''],
+        ])
+
+    def test_save_appends(self):
+        self.doc.write_cell_string('Sheet1', 5, 9, 'far')
+        self.doc.save()
+        doc = self.reopen()
+        self.assertEqual(doc.read_range('Sheet1', CellRange('E10:G10')),
+                         [['', 'far', '']])
+        self.assertEqual(doc.read_cell_string('Sheet1', 0, 3), 'a  b')
+
+    def test_clear_keeps_formula(self):
+        self.doc.clear_range('Sheet1', CellRange('A1:C1'))
+        self.doc.save()
+        self.assertEqual(self.reopen().read_range('Sheet1', CellRange('A1:C1')),
+                         [['', '', '2.5']])
+        self.doc.write_cell_numeric('Sheet1', 2, 0, 4)
+        self.doc.save()
+        with zipfile.ZipFile(self.path) as zf:
+            content = zf.read('content.xml').decode('utf-8')
+        self.assertNotIn('table:formula', content)
+
+    def test_archive(self):
+        self.doc.write_cell_string('Sheet1', 0, 0, 'VOD.L')
+        self.doc.save()
+        with zipfile.ZipFile(self.path) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), ['mimetype', 'content.xml', 'styles.xml'])
+            self.assertEqual(zf.getinfo('mimetype').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.read('styles.xml'), b'<styles/>')
+
+    def test_batch_saves(self):
+        with self.doc.batch():
+            with self.doc.batch():
+                self.doc.write_cell_string('Sheet1', 0, 0, 'VOD.L')
+            self.assertEqual(self.reopen().read_cell_string('Sheet1', 0, 0), 'BP.L')
+        self.assertEqual(self.reopen().read_cell_string('Sheet1', 0, 0), 'VOD.L')
+
+        with self.assertRaises(ValueError):
+            with self.doc.batch():
+                self.doc.write_cell_string('Sheet1', 0, 0, 'BARC.L')
+                raise ValueError()
+        self.assertEqual(self.reopen().read_cell_string('Sheet1', 0, 0), 'VOD.L')
+
+    def test_output(self):
+        output = os.path.join(self.dir, 'out.ods')
+        doc = spreadsheet_api('odsfile', path=self.path, output=output)
+        doc.write_cell_string('Sheet1', 0, 0, 'VOD.L')
+        doc.save()
+        self.assertEqual(self.reopen().read_cell_string('Sheet1', 0, 0), 'BP.L')
+        doc = spreadsheet_api('odsfile', path=output)
+        self.assertEqual(doc.read_cell_string('Sheet1', 0, 0), 'VOD.L')
+
+    def test_save_keeps_mode(self):
+        os.chmod(self.path, 0o644)
+        self.doc.write_cell_string('Sheet1', 0, 0, 'VOD.L')
+        self.doc.save()
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o644)
+
+    def test_unknown_sheet(self):
+        self.doc.write_cell_string('Missing', 0, 0, 'x')
+        with self.assertRaises(KeyError):
+            self.doc.save()
+        self.assertEqual(self.reopen().read_cell_string('Sheet1', 0, 0), 'BP.L')
+        self.assertEqual(os.listdir(self.dir), ['book.ods'])
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+from xml.etree import ElementTree
+
+from spreadsheet import CellRange
+from spreadsheet.api.factory import spreadsheet_api
+from spreadsheet.api.xlsx import ref2posn, posn2ref
+
+MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+PARTS = [
+    ('[Content_Types].xml', '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>'),
+    ('_rels/.rels',
+     '<Relationships xmlns="%s">'
+     '<Relationship Id="rId1" Type="%s/officeDocument" Target="xl/workbook.xml"/>'
+     '</Relationships>' % (PKG, REL)),
+    ('xl/workbook.xml',
+     '<workbook xmlns="%s" xmlns:r="%s"><sheets>'
+     '<sheet name="Sheet1" sheetId="1" r:id="rId1"/>'
+     '<sheet name="Other" sheetId="2" r:id="rId2"/>'
+     '</sheets></workbook>' % (MAIN, REL)),
+    ('xl/_rels/workbook.xml.rels',
+     '<Relationships xmlns="%s">'
+     '<Relationship Id="rId1" Type="%s/worksheet" Target="worksheets/sheet1.xml"/>'
+     '<Relationship Id="rId2" Type="%s/worksheet" Target="/xl/worksheets/sheet2.xml"/>'
+     '<Relationship Id="rId3" Type="%s/sharedStrings" Target="sharedStrings.xml"/>'
+     '<Relationship Id="rId4" Type="%s/calcChain" Target="calcChain.xml"/>'
+     '</Relationships>' % (PKG, REL, REL, REL, REL)),
+    ('xl/calcChain.xml',
+     '<calcChain xmlns="%s"><c r="C1" i="1"/><c r="C2"/></calcChain>' % MAIN),
+    ('xl/worksheets/sheet1.xml',
+     '<worksheet xmlns="%s"><dimension ref="A1:C4"/><sheetData>'
+     '<row r="1" spans="1:3"><c r="A1" t="s"><v>0</v></c><c r="B1" s="2"><v>1.25</v></c>'
+     '<c r="C1"><f>B1*2</f><v>2.5</v></c>'
+     '<c r="E1"><f t="shared" ref="E1:E2" si="0">B1</f><v>1.25</v></c></row>'
+     '<row r="2"><c r="A2" t="s"><v>2</v></c><c r="B2" t="b"><v>1</v></c>'
+     '<c r="C2" t="str"><f>A2</f><v>VOD.L</v></c>'
+     '<c r="E2"><f t="shared" si="0"/><v>1</v></c></row>'
+     '<row r="4"><c r="A4" t="inlineStr"><is><r><t>a </t></r><r><t>b</t></r></is></c>'
+     '<c r="AA4"><v>3</v></c></row>'
+     '</sheetData></worksheet>' % MAIN),
+    ('xl/worksheets/sheet2.xml',
+     '<x:worksheet xmlns:x="%s"><x:sheetData><x:row><x:c><x:v>7</x:v></x:c></x:row>'
+     '</x:sheetData></x:worksheet>' % MAIN),
+    ('xl/sharedStrings.xml',
+     '<sst xmlns="%s"><si><t>BP.L</t></si><si><t>unused</t></si>'
+     '<si><t>VOD.L</t><rPh><t>x</t></rPh></si><si><t>tail</t></si></sst>' % MAIN),
+]
+
+###########################################################################
+class test_xlsx_refs(unittest.TestCase):
+    def test_refs(self):
+        for ref, posn in [('A1', (0, 0)), ('Z3', (25, 2)), ('AA10', (26, 9)),
+                          ('$AB$2', (27, 1)), ('XFD1', (16383, 0))]:
+            self.assertEqual(ref2posn(ref), posn)
+            self.assertEqual(posn2ref(*posn), ref.replace('$', ''))
+
+###########################################################################
+class test_xlsx(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'book.xlsx')
+        with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name, data in PARTS:
+                zf.writestr(name, data)
+        self.doc = spreadsheet_api('xlsx', path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def reopen(self):
+        return spreadsheet_api('xlsx', path=self.path)
+
+    def part(self, name):
+        with zipfile.ZipFile(self.path) as zf:
+            return zf.read(name).decode('utf-8')
+
+    def element(self, name, tag, ref):
+        # attribute order is not kept on Python 2, so compare parsed
+        root = ElementTree.fromstring(self.part(name).encode('utf-8'))
+        for elem in root.iter('{%s}%s' % (MAIN, tag)):
+            if elem.get('r') == ref:
+                return elem
+
+    def test_bad_path(self):
+        with self.assertRaises(AttributeError):
+            spreadsheet_api('xlsx', path=os.path.join(self.dir, 'none'))
+
+    def test_read(self):
+        self.assertEqual(self.doc.read_range('Sheet1', CellRange('A1:C4')), [
+            ['BP.L', '1.25', '2.5'],
+            ['VOD.L', 'TRUE', 'VOD.L'],
+            ['', '', ''],
+            ['a b', '', ''],
+        ])
+        self.assertEqual(self.doc.read_cell_string('Sheet1', 26, 3), '3')
+        self.assertEqual(self.doc.read_cell_string('Other', 0, 0), '7')
+        self.assertEqual(self.doc.read_cell_string('Missing', 0, 0), '')
+
+    def test_write(self):
+        self.doc.write_range('Sheet1', CellRange('A1:B1'), [['BARC.L', 9.5]])
+        self.doc.write_cell_string('Sheet1', 1, 2, ' x ')
+        self.doc.write_cell_numeric('Sheet1', 3, 3, 4)
+        self.doc.write_cell_string('Sheet1', 0, 6, 'end')
+        self.doc.save()
+        doc = self.reopen()
+        self.assertEqual(doc.read_range('Sheet1', CellRange('A1:D4')), [
+            ['BARC.L', '9.5', '2.5', ''],
+            ['VOD.L', 'TRUE', 'VOD.L', ''],
+            ['', ' x ', '', ''],
+            ['a b', '', '', '4'],
+        ])
+        self.assertEqual(doc.read_cell_string('Sheet1', 26, 3), '3')
+        self.assertEqual(doc.read_cell_string('Sheet1', 0, 6), 'end')
+        sheet = self.part('xl/worksheets/sheet1.xml')
+        cell = self.element('xl/worksheets/sheet1.xml', 'c', 'B1')
+        self.assertEqual(cell.attrib, {'r': 'B1', 's': '2'})
+        self.assertEqual([(e.tag, e.text) for e in cell],
+                         [('{%s}v' % MAIN, '9.5')])
+        self.assertLess(sheet.index('r="D4"'), sheet.index('r="AA4"'))
+        self.assertNotIn('spans', sheet)
+        self.assertIn('<dimension ref="A1:D7"', sheet)
+
+    def test_untouched_parts(self):
+        self.doc.write_cell_numeric('Sheet1', 1, 0, 2)
+        self.doc.save()
+        for name, data in PARTS:
+            if name != 'xl/worksheets/sheet1.xml':
+                self.assertEqual(self.part(name), data)
+
+    def test_prefixed_sheet(self):
+        self.doc.write_cell_numeric('Other', 1, 0, 8)
+        self.doc.save()
+        self.assertEqual(self.reopen().read_range('Other', CellRange('A1:B1')),
+                         [['7', '8']])
+        self.assertIn('<x:c r="B1"><x:v>8.0</x:v></x:c>',
+                      self.part('xl/worksheets/sheet2.xml'))
+
+    def test_clear(self):
+        self.doc.clear_range('Sheet1', CellRange('A1:C2'))
+        self.doc.clear_cell('Sheet1', 0, 9)
+        self.doc.save()
+        self.assertEqual(self.reopen().read_range('Sheet1', CellRange('A1:C2')),
+                         [['', '', '2.5'], ['', '', 'VOD.L']])
+        self.assertEqual(self.part('xl/calcChain.xml'), PARTS[4][1])
+        cell = self.element('xl/worksheets/sheet1.xml', 'c', 'B1')
+        self.assertEqual(cell.attrib, {'r': 'B1', 's': '2'})
+        self.assertEqual(list(cell), [])
+        self.assertIsNone(self.element('xl/worksheets/sheet1.xml', 'c', 'A1'))
+
+    def test_formula_overwritten(self):
+        self.doc.write_cell_numeric('Sheet1', 2, 0, 1)
+        self.doc.save()
+        self.assertNotIn('B1*2', self.part('xl/worksheets/sheet1.xml'))
+        calc = self.part('xl/calcChain.xml')
+        self.assertNotIn('"C1"', calc)
+        self.assertEqual(self.element('xl/calcChain.xml', 'c', 'C2').attrib,
+                         {'r': 'C2', 'i': '1'})
+
+    def test_shared_formula(self):
+        self.doc.write_cell_numeric('Sheet1', 4, 1, 2)
+        self.doc.save()
+        master = self.element('xl/worksheets/sheet1.xml', 'c', 'E1')[0]
+        self.assertEqual((master.attrib, master.text),
+                         ({'t': 'shared', 'ref': 'E1:E2', 'si': '0'}, 'B1'))
+        cell = self.element('xl/worksheets/sheet1.xml', 'c', 'E2')
+        self.assertEqual([(e.tag, e.text) for e in cell],
+                         [('{%s}v' % MAIN, '2.0')])
+
+        sheet = self.part('xl/worksheets/sheet1.xml')
+
+        self.doc.write_cell_numeric('Sheet1', 4, 0, 1)
+        with self.assertRaises(ValueError):
+            self.doc.save()
+        self.assertEqual(self.part('xl/worksheets/sheet1.xml'), sheet)
+        self.assertEqual(os.listdir(self.dir), ['book.xlsx'])
+
+    def test_unknown_sheet(self):
+        self.doc.write_cell_string('Missing', 0, 0, 'x')
+        with self.assertRaises(KeyError):
+            self.doc.save()
+        self.assertEqual(os.listdir(self.dir), ['book.xlsx'])
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import sys
+import unittest
+try:
+    import asyncio
+    from web.asyncagent import AsyncHttpAgent, AsyncEngine
+except (ImportError, SyntaxError):
+    #Python2 or Python3 before 3.6
+    pass
+
+from .test_httpagent import ServerTestCase, BODY, gzip_compress
+
+from web.retry import RetryPolicy
+
+NO_ASYNC = sys.version_info < (3, 6)
+
+###########################################################################
+@unittest.skipIf(NO_ASYNC, 'asyncio agent needs Python 3.6+')
+class test_asyncagent_fetch(ServerTestCase):
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        self.agent = AsyncHttpAgent(retry=RetryPolicy(max_tries=1),
+                                    limits=self.limits)
+
+    def fetch(self, url):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.agent.fetch(url))
+        finally:
+            loop.close()
+
+    def test_ok(self):
+        html = self.fetch(self.base + '/quote?symbols=BP')
+        self.assertTrue(self.agent.ok())
+        self.assertEqual(self.agent.status_code(), 200)
+        self.assertEqual(self.agent.info()['Content-Type'], 'application/json')
+        self.assertEqual(html, BODY.decode())
+
+    def test_redirect(self):
+        self.fetch(self.base + '/redirect')
+        self.assertTrue(self.agent.ok())
+        self.assertEqual(self.agent.real_url(), self.base + '/quote')
+
+    def test_http_error(self):
+        self.fetch(self.base + '/missing')
+        self.assertTrue(self.agent.failed())
+        self.assertEqual(self.agent.error(), 'HTTPError: 404')
+
+    def test_gzip(self):
+        self.assertEqual(self.fetch(self.base + '/gzip'), BODY.decode())
+        self.assertEqual(self.agent.wire_bytes(), len(gzip_compress(BODY)))
+        self.assertEqual(self.agent.body_bytes(), len(BODY))
+
+    def test_corrupt_body(self):
+        self.fetch(self.base + '/badgzip')
+        self.assertTrue(self.agent.error().startswith('URLError'))
+
+    def test_connection_refused(self):
+        self.server.server_close()
+        self.fetch(self.base + '/quote')
+        self.assertTrue(self.agent.error().startswith('URLError'))
+
+    def test_invalid_url(self):
+        self.fetch('this is garbage')
+        self.assertTrue(self.agent.failed())
+        self.assertEqual(self.agent.state['tries'], 1)
+
+###########################################################################
+@unittest.skipIf(NO_ASYNC, 'asyncio agent needs Python 3.6+')
+class test_asyncagent_engine(ServerTestCase):
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        self.engine = AsyncEngine(workers=3, retry=RetryPolicy(max_tries=1),
+                                  limits=self.limits)
+
+    def test_fetch_all(self):
+        urls = [self.base + '/quote?n=%d' % i for i in range(10)]
+        agents = self.engine.fetch_all(urls)
+        self.assertEqual([a.url() for a in agents], urls)
+        self.assertTrue(all(a.ok() for a in agents))
+        self.assertEqual(set(a.html() for a in agents), set([BODY.decode()]))
+
+    def test_fail_fast(self):
+        self.engine.workers = 1
+        urls = [self.base + '/missing', self.base + '/quote']
+        agents = self.engine.fetch_all(urls)
+        self.assertEqual(agents[0].error(), 'HTTPError: 404')
+        self.assertEqual(agents[1].error(), 'Cancelled')
+        self.assertTrue(agents[1].failed())
+
+    def test_timeout_cancels(self):
+        agents = self.engine.fetch_all([self.base + '/slow'], timeout=0.1)
+        self.assertEqual(agents[0].error(), 'Cancelled')
+
+    def test_cancel_releases_trial(self):
+        breaker = self.limits.breaker('127.0.0.1')
+        breaker.failure()
+        breaker.opened = breaker.clock() - breaker.reset  #half-open
+        urls = [self.base + '/slow', self.base + '/quote']
+        agents = self.engine.fetch_all(urls)
+        self.assertEqual(agents[0].error(), 'Cancelled')
+        self.assertTrue(agents[1].circuit_open())
+        self.assertFalse(breaker.trial)
+        self.assertTrue(breaker.allow())
+
+    def test_empty(self):
+        self.assertEqual(self.engine.fetch_all([]), [])
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from .test_httpagent import ServerTestCase, BODY
+
+from web.httpagent import HttpAgent
+from web.retry import RetryPolicy
+from web.cassette import Cassette
+
+###########################################################################
+class test_cassette(ServerTestCase):
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'tape.jsonl.gz')
+
+    def tearDown(self):
+        ServerTestCase.tearDown(self)
+        shutil.rmtree(self.dir)
+
+    def tape_agent(self, cassette):
+        return HttpAgent(pool=self.pool, limits=self.limits, cassette=cassette,
+                         retry=RetryPolicy(max_tries=1))
+
+    def record(self, *paths):
+        with Cassette(self.path, Cassette.RECORD) as cassette:
+            agent = self.tape_agent(cassette)
+            for path in paths:
+                agent.fetch(self.base + path)
+        return cassette
+
+    def test_replay_offline(self):
+        self.record('/gzip', '/missing')
+        self.pool.clear()
+        self.server.shutdown()
+        agent = self.tape_agent(Cassette(self.path))
+        self.assertEqual(agent.fetch(self.base + '/gzip'), BODY.decode())
+        self.assertTrue(agent.ok())
+        self.assertEqual(agent.info()['Content-Encoding'], 'gzip')
+        self.assertEqual(agent.body_bytes(), len(BODY))
+        agent.fetch(self.base + '/missing')
+        self.assertEqual(agent.error(), 'HTTPError: 404')
+        self.assertEqual(self.server.paths, ['/gzip', '/missing'])
+
+    def test_not_recorded(self):
+        self.record('/quote')
+        cassette = Cassette(self.path)
+        agent = self.tape_agent(cassette)
+        agent.fetch(self.base + '/other')
+        self.assertTrue(agent.failed())
+        self.assertTrue(agent.error().startswith('Cassette'))
+        self.assertEqual(cassette.stats(),
+                         {'recorded': 1, 'played': 0, 'missed': 1})
+
+    def test_connection_errors_not_recorded(self):
+        self.assertEqual(len(self.record('/quote')), 1)
+        self.pool.clear()
+        self.server.server_close()
+        self.assertEqual(len(self.record('/quote')), 0)
+
+    def test_order_and_latency(self):
+        self.record('/flaky', '/flaky')
+        waits = []
+        cassette = Cassette(self.path, latency=2, sleep=waits.append)
+        agent = self.tape_agent(cassette)
+        agent.fetch(self.base + '/flaky')
+        self.assertEqual(agent.status_code(), 503)
+        for i in range(2):
+            agent.fetch(self.base + '/flaky')
+            self.assertEqual(agent.status_code(), 200)
+        self.assertEqual(len(waits), 3)
+        self.assertTrue(all(w >= 0 for w in waits))
+
+    def test_request_matched(self):
+        self.record('/quote')
+        cassette = Cassette(self.path)
+        url = self.base + '/quote'
+        exchange = cassette.exchanges[0]
+        self.assertEqual((exchange['method'], exchange['url']), ('GET', url))
+        self.assertIn(['Accept-Encoding', 'gzip, deflate'], exchange['request'])
+        self.assertIsNone(cassette.play(url, 'POST', HttpAgent.Header))
+        self.assertIsNone(cassette.play(url, 'GET', dict(HttpAgent.Header,
+                                                         Accept='text/csv')))
+        # hop-by-hop headers are not matched
+        exchange = cassette.play(url, 'GET', dict(HttpAgent.Header,
+                                                  Connection='close'))
+        self.assertEqual(exchange['status'], 200)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(AttributeError):
+            Cassette(self.path, 'rewind')
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import time
+import zlib
+import unittest
+import threading
+try:
+    #Python3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except:
+    #Python2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from web.connpool import ConnectionPool
+from web.httpagent import HttpAgent
+from web.throttle import HostLimits
+
+BODY = b'{"quoteResponse":{"result":[],"error":null}}'
+
+def gzip_compress(data):
+    # gzip.compress is Python 3 only
+    gz = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return gz.compress(data) + gz.flush()
+
+###########################################################################
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  #keep-alive
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if self.path.startswith('/redirect'):
+            self.send_response(302)
+            self.send_header('Location', '/quote')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.startswith('/flaky') and not self.server.hits.pop(0):
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.startswith('/throttle'):
+            self.send_response(429)
+            self.send_header('Retry-After', '3600')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.startswith('/slow'):
+            time.sleep(0.5)
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = BODY
+        encoding = None
+        if self.path.startswith('/gzip'):
+            body, encoding = gzip_compress(BODY), 'gzip'
+        elif self.path.startswith('/deflate'):
+            body, encoding = zlib.compress(BODY), 'deflate'
+        elif self.path.startswith('/rawdeflate'):
+            body, encoding = zlib.compress(BODY)[2:-4], 'deflate'
+        elif self.path.startswith('/badgzip'):
+            body, encoding = b'not gzip at all', 'gzip'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path.startswith('/close'):
+            self.close_connection = True  #without saying so
+
+    def log_message(self, *args):
+        pass
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.server.hits = [False, True]  #'/flaky' fails, then succeeds
+        self.server.paths = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.pool = ConnectionPool()
+        self.limits = HostLimits()
+        self.agent = HttpAgent(pool=self.pool, limits=self.limits)
+        self.agent.MaxTries = 1
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+###########################################################################
+class test_httpagent_fetch(ServerTestCase):
+    def test_ok(self):
+        html = self.agent.fetch(self.base + '/quote?symbols=BP')
+        self.assertTrue(self.agent.ok())
+        self.assertEqual(self.agent.status_code(), 200)
+        self.assertEqual(html, BODY.decode())
+
+    def test_redirect(self):
+        self.agent.fetch(self.base + '/redirect')
+        self.assertTrue(self.agent.ok())
+        self.assertEqual(self.agent.real_url(), self.base + '/quote')
+
+    def test_http_error(self):
+        html = self.agent.fetch(self.base + '/missing')
+        self.assertTrue(self.agent.failed())
+        self.assertEqual(self.agent.status_code(), 404)
+        self.assertEqual(self.agent.error(), 'HTTPError: 404')
+        self.assertEqual(html, HttpAgent.Deft_Html)
+
+    def test_invalid_url(self):
+        self.agent.fetch('this is garbage')
+        self.assertTrue(self.agent.failed())
+        self.agent.fetch(1234)
+        self.assertTrue(self.agent.failed())
+
+###########################################################################
+class test_httpagent_compression(ServerTestCase):
+    def test_accept_encoding_sent(self):
+        self.assertIn('gzip', HttpAgent.Header['Accept-Encoding'])
+
+    def test_identity(self):
+        self.agent.fetch(self.base + '/quote')
+        self.assertEqual(self.agent.wire_bytes(), len(BODY))
+        self.assertEqual(self.agent.body_bytes(), len(BODY))
+
+    def test_gzip(self):
+        self.agent.ChunkSize = 7  #decompress across chunk boundaries
+        html = self.agent.fetch(self.base + '/gzip')
+        self.assertEqual(html, BODY.decode())
+        self.assertEqual(self.agent.wire_bytes(), len(gzip_compress(BODY)))
+        self.assertEqual(self.agent.body_bytes(), len(BODY))
+
+    def test_deflate(self):
+        self.assertEqual(self.agent.fetch(self.base + '/deflate'), BODY.decode())
+        self.assertEqual(self.agent.fetch(self.base + '/rawdeflate'), BODY.decode())
+
+    def test_corrupt_body(self):
+        self.agent.fetch(self.base + '/badgzip')
+        self.assertTrue(self.agent.failed())
+        self.assertTrue(self.agent.error().startswith('URLError'))
+        self.assertEqual(self.pool.stats()['idle'], 0)  #not kept, half read
+
+###########################################################################
+class test_httpagent_keepalive(ServerTestCase):
+    def test_connection_reused(self):
+        for i in range(3):
+            self.agent.fetch(self.base + '/quote')
+            self.assertTrue(self.agent.ok())
+        self.assertEqual(self.pool.stats()['created'], 1)
+        self.assertEqual(self.pool.stats()['reused'], 2)
+
+    def test_reused_across_agents(self):
+        HttpAgent(pool=self.pool).fetch(self.base + '/quote')
+        HttpAgent(pool=self.pool).fetch(self.base + '/quote')
+        self.assertEqual(self.pool.stats()['created'], 1)
+
+    def test_stale_connection_retried(self):
+        self.agent.fetch(self.base + '/quote')
+        for (t, key, conn) in self.pool.idle:
+            conn.sock.close()  #as if closed by the server
+        self.agent.fetch(self.base + '/quote')
+        self.assertTrue(self.agent.ok())
+
+    def test_closed_by_server_retried(self):
+        self.agent.fetch(self.base + '/close')
+        self.agent.fetch(self.base + '/quote')
+        self.assertTrue(self.agent.ok())
+        self.assertEqual(self.pool.stats()['created'], 2)
+
+    def test_timeout_not_retried(self):
+        self.agent.fetch(self.base + '/quote')
+        self.assertRaises(Exception, self.agent._request,
+                          self.base + '/slow', 0.1)
+        self.assertEqual(self.pool.stats()['created'], 1)
+
+    def test_idle_eviction(self):
+        self.pool.idle_timeout = -1
+        self.agent.fetch(self.base + '/quote')
+        self.pool.evict()
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+    def test_max_size(self):
+        self.pool.maxsize = 1
+        conns = [self.pool.acquire('http', '127.0.0.1', 1, 1) for i in range(3)]
+        for conn in conns:
+            self.pool.release(conn)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
+
+###########################################################################
@@ -0,0 +1,95 @@
+import unittest
+
+from .test_httpagent import ServerTestCase
+
+from web.httpagent import HttpAgent
+from web.retry import RetryPolicy, parse_retry_after
+
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+
+###########################################################################
+class test_retry_policy(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(1000)
+        self.policy = RetryPolicy(max_tries=5, deadline=30, backoff=1, cap=4,
+                                  clock=self.clock, sleep=self.clock.sleep,
+                                  rand=lambda: 1.0)
+
+    def test_backoff_capped(self):
+        expires = self.policy.start()
+        self.assertEqual([self.policy.delay(t, expires) for t in range(1, 5)],
+                         [1, 2, 4, 4])
+        self.assertEqual(self.policy.delay(5, expires), None)
+
+    def test_jitter(self):
+        self.policy.rand = lambda: 0.25
+        self.assertEqual(self.policy.delay(3, self.policy.start()), 1)
+
+    def test_retryable(self):
+        for status in [None, 429, 500, 503]:
+            self.assertTrue(self.policy.retryable(status))
+        for status in [400, 401, 404]:
+            self.assertFalse(self.policy.retryable(status))
+        self.assertEqual(self.policy.delay(1, self.policy.start(), 404), None)
+
+    def test_deadline(self):
+        expires = self.policy.start()
+        self.clock.now = expires - 3
+        self.assertEqual(self.policy.timeout(10, expires), 3)
+        self.assertEqual(self.policy.delay(3, expires), None)
+
+    def test_retry_after(self):
+        expires = self.policy.start()
+        self.assertEqual(self.policy.delay(1, expires, 429, 7), 7)
+        self.assertEqual(self.policy.delay(1, expires, 429, 60), None)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(parse_retry_after(
+            'Wed, 21 Oct 2015 07:28:00 GMT', now=1445412470), 10)
+        self.assertEqual(parse_retry_after('soon'), None)
+        self.assertEqual(parse_retry_after(None), None)
+
+###########################################################################
+class test_httpagent_retry(ServerTestCase):
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        self.waits = []
+        self.agent.retry = RetryPolicy(max_tries=3, deadline=30,
+                                       sleep=self.waits.append)
+
+    def test_retry_after_honoured(self):
+        html = self.agent.fetch(self.base + '/flaky')
+        self.assertTrue(self.agent.ok())
+        self.assertEqual(self.agent.state['tries'], 2)
+        self.assertEqual(self.waits, [0])
+
+    def test_no_retry_on_404(self):
+        self.agent.fetch(self.base + '/missing')
+        self.assertEqual(self.agent.state['tries'], 1)
+        self.assertEqual(self.waits, [])
+
+    def test_retry_after_past_deadline(self):
+        self.agent.fetch(self.base + '/throttle')
+        self.assertTrue(self.agent.failed())
+        self.assertEqual(self.agent.status_code(), 429)
+        self.assertEqual(self.agent.state['tries'], 1)
+
+    def test_invalid_url_not_retried(self):
+        self.agent.fetch('this is garbage')
+        self.assertEqual(self.agent.state['tries'], 1)
+
+    def test_default_policy(self):
+        agent = HttpAgent(pool=self.pool)
+        self.assertEqual(agent.policy().max_tries, HttpAgent.MaxTries)
+        self.assertEqual(agent.policy().deadline, RetryPolicy.Deadline)
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import threading
+import unittest
+
+from .test_httpagent import ServerTestCase
+
+from web.httpagent import HttpAgent
+from web.retry import RetryPolicy
+from web.singleflight import SingleFlight, FlightTimeout
+
+###########################################################################
+class test_singleflight(unittest.TestCase):
+    def setUp(self):
+        self.group = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def slow(self, result):
+        def call():
+            self.started.set()
+            self.release.wait(5)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return call
+
+    def follow(self, key, results):
+        thread = threading.Thread(target=lambda: results.append(
+            self.group.do(key, self.slow('again'))))
+        thread.start()
+        return thread
+
+    def test_shared(self):
+        results = []
+        leader = threading.Thread(target=lambda: results.append(
+            self.group.do('url', self.slow('page'))))
+        leader.start()
+        self.started.wait(5)
+        followers = [self.follow('url', results) for i in range(3)]
+        while self.group.stats()['shared'] < 3:
+            pass
+        self.release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        self.assertEqual(sorted(results), [('page', False)] +
+                                          [('page', True)] * 3)
+        self.assertEqual(self.group.in_flight(), 0)
+
+    def test_error_shared(self):
+        flight, mine, theirs = self.group.begin(['a', 'b'])
+        other, rest, waits = self.group.begin(['b', 'c'])
+        self.assertEqual((mine, rest), (['a', 'b'], ['c']))
+        self.assertEqual(waits, {flight: ['b']})
+        self.group.end(flight, error=Warning('down'))
+        with self.assertRaises(Warning):
+            flight.wait()
+        self.group.end(other, {'c': 1})
+        self.assertEqual(self.group.in_flight(), 0)
+
+    def test_leader_interrupted(self):
+        def interrupted():
+            raise KeyboardInterrupt()
+        with self.assertRaises(KeyboardInterrupt):
+            self.group.do('url', interrupted)
+        self.assertEqual(self.group.in_flight(), 0)
+
+        flight, mine, theirs = self.group.begin(['url'])
+        self.group.end(flight, error=KeyboardInterrupt())
+        with self.assertRaises(RuntimeError):
+            flight.wait()
+
+    def test_wait_timeout(self):
+        flight, mine, theirs = self.group.begin(['url'])
+        with self.assertRaises(FlightTimeout):
+            self.group.do('url', lambda: 1, timeout=0.01)
+        self.group.end(flight, 2)
+        self.assertEqual(self.group.do('url', lambda: 1), (1, False))
+
+    def test_not_kept(self):
+        self.assertEqual(self.group.do('url', lambda: 1), (1, False))
+        self.assertEqual(self.group.do('url', lambda: 2), (2, False))
+
+###########################################################################
+class test_httpagent_singleflight(ServerTestCase):
+    def test_one_request(self):
+        flight = SingleFlight()
+        agents = [HttpAgent(pool=self.pool, limits=self.limits, flight=flight)
+                  for i in range(4)]
+        threads = [threading.Thread(target=agent.fetch,
+                                    args=(self.base + '/slow',))
+                   for agent in agents]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertTrue(all(agent.ok() for agent in agents))
+        self.assertGreater(flight.stats()['shared'], 0)
+        self.assertEqual(len(self.server.paths), 4 - flight.stats()['shared'])
+        self.assertEqual(sum(agent.shared() for agent in agents),
+                         flight.stats()['shared'])
+        agents[0].state['status'] = 0  #records are not shared objects
+        self.assertEqual(agents[1].status_code(), 200)
+
+    def test_different_agents_not_shared(self):
+        flight = SingleFlight()
+        url = self.base + '/quote'
+        other = HttpAgent(pool=self.pool, limits=self.limits, flight=flight,
+                          retry=RetryPolicy(max_tries=1))
+        leader, mine, theirs = flight.begin([other._flight_key(url)])
+        agent = HttpAgent(pool=self.pool, limits=self.limits, flight=flight,
+                          retry=RetryPolicy(max_tries=1))
+        agent.fetch(url)
+        flight.end(leader)
+        self.assertTrue(agent.ok())
+        self.assertFalse(agent.shared())
+        self.assertEqual(flight.stats(), {'led': 2, 'shared': 0})
+        self.assertEqual(self.server.paths, ['/quote'])
+
+    def test_wait_bounded_by_deadline(self):
+        flight = SingleFlight()
+        agent = HttpAgent(pool=self.pool, limits=self.limits, flight=flight,
+                          retry=RetryPolicy(deadline=0.05))
+        url = self.base + '/quote'
+        leader, mine, theirs = flight.begin([agent._flight_key(url)])
+        agent.fetch(url)
+        flight.end(leader)
+        self.assertTrue(agent.failed())
+        self.assertTrue(agent.error().startswith('FlightTimeout'))
+        self.assertEqual(self.server.paths, [])
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()
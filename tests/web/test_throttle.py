@@ -0,0 +1,139 @@
+import unittest
+
+from .test_httpagent import ServerTestCase
+
+from web.retry import RetryPolicy
+from web.throttle import TokenBucket, CircuitBreaker, HostLimits
+
+class Clock(object):
+    def __init__(self, now):
+        self.now = now
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += seconds
+
+###########################################################################
+class test_token_bucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(1000)
+        self.bucket = TokenBucket(rate=2, burst=3, clock=self.clock,
+                                  sleep=self.clock.sleep)
+
+    def test_burst_then_rate(self):
+        for i in range(3):
+            self.assertTrue(self.bucket.acquire())
+        self.assertEqual(self.clock.now, 1000)
+        self.assertTrue(self.bucket.acquire())
+        self.assertEqual(self.clock.now, 1000.5)
+
+    def test_timeout(self):
+        for i in range(3):
+            self.bucket.acquire()
+        self.assertFalse(self.bucket.acquire(timeout=0.1))
+        self.assertEqual(self.bucket.wait(), 0.5)
+
+    def test_refill_capped(self):
+        self.clock.now += 3600
+        for i in range(3):
+            self.bucket.acquire()
+        self.assertEqual(self.bucket.wait(), 0.5)
+
+###########################################################################
+class test_circuit_breaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock(1000)
+        self.breaker = CircuitBreaker(failures=2, reset=30, clock=self.clock)
+
+    def test_opens(self):
+        self.breaker.failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state(), 'open')
+        self.assertFalse(self.breaker.allow())
+        self.assertEqual(self.breaker.retry_in(), 30)
+
+    def test_success_resets_count(self):
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state(), 'closed')
+
+    def test_half_open_trial(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.clock.now += 30
+        self.assertEqual(self.breaker.state(), 'half-open')
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())  #one trial at a time
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state(), 'open')
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.success()
+        self.assertEqual(self.breaker.state(), 'closed')
+
+    def test_release_trial(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allow())
+        self.breaker.release()
+        self.assertEqual(self.breaker.state(), 'half-open')
+        self.assertTrue(self.breaker.allow())
+
+###########################################################################
+class test_host_limits(unittest.TestCase):
+    def test_per_host(self):
+        limits = HostLimits()
+        self.assertIs(limits.bucket('a'), limits.bucket('a'))
+        self.assertIsNot(limits.breaker('a'), limits.breaker('b'))
+        self.assertEqual(limits.state('unknown'), 'closed')
+        self.assertEqual(limits.states(), {'a': 'closed', 'b': 'closed'})
+
+###########################################################################
+class test_httpagent_throttle(ServerTestCase):
+    def setUp(self):
+        ServerTestCase.setUp(self)
+        self.limits.failures = 2
+        self.agent.retry = RetryPolicy(max_tries=1)
+
+    def test_circuit_opens(self):
+        for i in range(2):
+            self.agent.fetch(self.base + '/throttle')
+            self.assertFalse(self.agent.circuit_open())
+        self.assertEqual(self.agent.circuit(), 'open')
+        self.agent.fetch(self.base + '/quote')
+        self.assertTrue(self.agent.circuit_open())
+        self.assertTrue(self.agent.failed())
+        self.assertEqual(self.agent.status_code(), None)
+        self.assertEqual(self.limits.states(), {'127.0.0.1': 'open'})
+
+    def test_final_error_keeps_circuit_closed(self):
+        for i in range(3):
+            self.agent.fetch(self.base + '/missing')
+        self.assertEqual(self.agent.circuit(), 'closed')
+
+    def test_rate_limited(self):
+        self.limits.rate, self.limits.burst = 0.001, 1
+        self.agent.fetch(self.base + '/quote')
+        self.assertTrue(self.agent.ok())
+        self.agent.fetch(self.base + '/quote')
+        self.assertTrue(self.agent.failed())
+        self.assertTrue(self.agent.error().startswith('RateLimited'))
+
+    def test_rate_limited_half_open(self):
+        self.limits.rate, self.limits.burst = 0.001, 1
+        self.assertTrue(self.limits.bucket('127.0.0.1').acquire())
+        breaker = self.limits.breaker('127.0.0.1')
+        breaker.failure()
+        breaker.failure()
+        breaker.opened -= breaker.reset
+        self.agent.fetch(self.base + '/quote')
+        self.assertTrue(self.agent.error().startswith('RateLimited'))
+        self.assertFalse(breaker.trial)
+        self.assertTrue(breaker.allow())  #next trial not locked out
+
+###########################################################################
+if __name__ == '__main__':
+    unittest.main()